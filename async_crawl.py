@@ -0,0 +1,119 @@
+"""
+Pipelined catalog crawl: tables are checked as each get_tables page arrives.
+ 
+An asyncio loop orders the work, but boto3 is synchronous, so every API call
+runs on a thread of a pool sized to the rate controller's max_concurrency
+(50 by default). Calls in flight are bounded by that pool, one thread per
+call; the loop only keeps the listing and the checks overlapping and runs
+the result callbacks on a single thread.
+"""
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+ 
+from rate_control import get_controller
+ 
+ 
+class AsyncGlue:
+    """
+    Asyncio wrapper over a shared boto3 Glue client. Each call blocks a thread
+    of a pool of max_threads (the rate controller's max_concurrency by default)
+    behind the shared rate controller, so the event loop itself never blocks.
+    """
+ 
+    def __init__(self, client, controller=None, max_threads=None):
+        self.client = client
+        self.controller = controller or get_controller()
+        self.executor = ThreadPoolExecutor(max_threads or self.controller.max_concurrency)
+ 
+    async def run(self, func, *args, **kwargs):
+        """Run a blocking function on the wrapper's thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+ 
+    async def call(self, operation, **kwargs):
+        """Call a Glue API operation by name under the rate controller."""
+        return await self.run(self.controller.call, getattr(self.client, operation), **kwargs)
+ 
+    async def paginate(self, operation, result_key, **kwargs):
+        """Yield the result list of each page of a NextToken-paginated operation."""
+        next_token = None
+        while True:
+            if next_token:
+                kwargs['NextToken'] = next_token
+            response = await self.call(operation, **kwargs)
+            yield response.get(result_key, [])
+            next_token = response.get('NextToken')
+            if not next_token:
+                break
+ 
+    def close(self):
+        self.executor.shutdown(wait=True)
+ 
+ 
+async def crawl_catalog(glue, check_table, on_table, on_result, on_database=None, max_pending=1000, databases=None,
+                        catalog_filter=None, names_only=False):
+    """
+    Crawl every database and table, checking each table as soon as its get_tables
+    page arrives instead of waiting for the whole listing.
+ 
+    check_table(db, table_name) is a blocking function run on the wrapper's thread
+    pool. on_table(db, table) receives the Table from the get_tables page and
+    returns True if it settled the table itself, e.g. from a cache, to skip the
+    check; on_result(result) receives only the results of checks made, and
+    on_database(db), called once a database has been fully listed, run on the
+    event loop thread so they can write to files without locking. At most
+    max_pending checks are queued at once to keep memory bounded on very large
+    catalogs. If databases is given, only those databases are crawled instead
+    of listing them with get_databases. catalog_filter (a CatalogFilter) drops
+    databases before they are listed and pushes its table patterns down to
+    get_tables. With names_only, get_tables returns only each table's Name and
+    TableType. Returns the names of the databases crawled.
+    """
+    list_kwargs = catalog_filter.get_tables_kwargs() if catalog_filter else {}
+    if names_only:
+        list_kwargs['AttributesToGet'] = ['NAME', 'TABLE_TYPE']
+    pending = asyncio.Semaphore(max_pending)
+ 
+    async def check(database_name, table_name):
+        try:
+            on_result(await glue.run(check_table, database_name, table_name))
+        except Exception as e:
+            logging.error(f"Error processing column statistics for {database_name}.{table_name}: {e}")
+        finally:
+            pending.release()
+ 
+    async def crawl_database(database_name, checks):
+        count = 0
+        try:
+            async for tables in glue.paginate('get_tables', 'TableList', DatabaseName=database_name, **list_kwargs):
+                for table in tables:
+                    if catalog_filter and not catalog_filter.wants_table(table['Name']):
+                        continue
+                    count += 1
+                    if on_table(database_name, table):
+                        continue
+                    await pending.acquire()
+                    task = asyncio.ensure_future(check(database_name, table['Name']))
+                    checks.add(task)
+                    task.add_done_callback(checks.discard)
+            logging.info(f"Total tables fetched for {database_name}: {count}")
+            if on_database:
+                on_database(database_name)
+        except Exception as e:
+            logging.error(f"Error fetching tables for {database_name}: {e}")
+ 
+    if databases is None:
+        databases = []
+        async for page in glue.paginate('get_databases', 'DatabaseList'):
+            databases.extend(db['Name'] for db in page)
+        logging.info(f"Total databases fetched: {len(databases)}")
+    if catalog_filter:
+        databases = catalog_filter.databases(databases)
+ 
+    checks = set()
+    await asyncio.gather(*(crawl_database(db, checks) for db in databases))
+    while checks:
+        await asyncio.gather(*checks)
+    return databases
@@ -0,0 +1,92 @@
+import threading
+ 
+from metrics import get_metrics
+from rate_control import get_controller
+ 
+# Region used when neither the caller nor the AWS config/environment sets one
+default_region = 'us-east-1'
+region_override = None
+ 
+# HTTP connections kept per client; None sizes the pool to the rate controller's
+# concurrency so every in-flight call can reuse a kept-alive connection
+pool_size = None
+max_attempts = 3  # botocore attempts per call, on top of the rate controller's own retries
+ 
+_session = None
+_clients = {}
+_lock = threading.Lock()
+ 
+ 
+def set_region(region_name):
+    """Use this region for every client built from now on."""
+    global region_override
+    region_override = region_name
+ 
+ 
+def get_session():
+    """Return the process-wide boto3 session, importing boto3 on first use and instrumenting its clients."""
+    global _session
+    with _lock:
+        if _session is None:
+            import boto3
+            _session = boto3.session.Session()
+            get_metrics().install(_session)
+        return _session
+ 
+ 
+def client_config():
+    """botocore Config with the connection pool sized to the worker concurrency."""
+    from botocore.config import Config
+    return Config(
+        max_pool_connections=pool_size or get_controller().max_concurrency,
+        tcp_keepalive=True,
+        retries={'mode': 'adaptive', 'max_attempts': max_attempts},
+    )
+ 
+ 
+def get_client(service_name, region_name=None):
+    """Return a shared client for the service, built from the shared session on first use."""
+    session = get_session()
+    region_name = region_override or region_name or session.region_name or default_region
+    key = (service_name, region_name)
+    with _lock:
+        if key not in _clients:
+            _clients[key] = session.client(service_name, region_name=region_name, config=client_config())
+        return _clients[key]
+ 
+ 
+def connection_report():
+    """
+    Summarize requests and new connections per client from the urllib3 pools, so
+    a run shows whether connections were reused or re-established.
+    """
+    lines = []
+    with _lock:
+        clients = list(_clients.items())
+    for (service_name, region_name), client in clients:
+        try:
+            pools = client._endpoint.http_session._manager.pools
+            requests = connections = 0
+            for host in pools.keys():
+                pool = pools[host]
+                requests += pool.num_requests
+                connections += pool.num_connections
+        except AttributeError:
+            continue
+        reused = 100.0 * (requests - connections) / requests if requests else 0.0
+        lines.append(f"{service_name} ({region_name}): {requests} requests over {connections} connections ({reused:.1f}% reused)")
+    return "; ".join(lines) or "No AWS clients were used"
+ 
+ 
+class LazyClient:
+    """
+    Module-level stand-in for a boto3 client. The session and client are only
+    created when an attribute is first used, so importing a script is cheap.
+    """
+ 
+    def __init__(self, service_name, region_name=None):
+        self.service_name = service_name
+        self.region_name = region_name
+ 
+    def __getattr__(self, name):
+        return getattr(get_client(self.service_name, self.region_name), name)
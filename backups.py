@@ -0,0 +1,174 @@
+"""
+Deduplicated, compressed backups of run artifacts with count and age retention.
+ 
+Each file is stored once per distinct content under objects/, named by its
+hash and compressed with zstd when zstandard is installed, else gzip. Every
+backup is a timestamped snapshot directory of hard links to those objects
+plus a manifest.json, so an unchanged multi-GB inventory costs one directory
+entry per run instead of a copy. A file whose size and mtime match the
+previous snapshot is not even read again. Snapshots beyond the newest keep,
+or older than max_age_days, are deleted along with the objects no remaining
+snapshot refers to.
+ 
+    python gluestats.py restore --backup-dir bkp_log                 # list snapshots
+    python gluestats.py restore --backup-dir bkp_log all_table_list.txt restored.txt
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime
+ 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+ 
+# Retention applied after every backup, unless a BackupStore is given its own
+keep = 10
+max_age_days = 30.0
+ 
+CHUNK_SIZE = 1 << 20
+MANIFEST = 'manifest.json'
+ 
+ 
+def file_digest(path):
+    """Content hash of a file, streamed in chunks."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+ 
+ 
+class BackupStore:
+    """Content-addressed snapshots of files in one backup directory."""
+ 
+    def __init__(self, directory, keep_snapshots=None, max_age=None):
+        self.directory = directory
+        self.objects = os.path.join(directory, 'objects')
+        self.keep = keep if keep_snapshots is None else keep_snapshots
+        self.max_age_days = max_age_days if max_age is None else max_age
+        self.extension = '.zst' if zstandard else '.gz'
+ 
+    def snapshots(self):
+        """Snapshot directory names, oldest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name for name in os.listdir(self.directory)
+                      if os.path.exists(os.path.join(self.directory, name, MANIFEST)))
+ 
+    def manifest(self, snapshot):
+        with open(os.path.join(self.directory, snapshot, MANIFEST)) as f:
+            return json.load(f)
+ 
+    def _compress(self, path, object_path):
+        temp_path = f"{object_path}.tmp"
+        with open(path, 'rb') as source:
+            if zstandard:
+                with open(temp_path, 'wb') as out:
+                    zstandard.ZstdCompressor(level=3).copy_stream(source, out)
+            else:
+                with gzip.open(temp_path, 'wb', compresslevel=3) as out:
+                    shutil.copyfileobj(source, out, CHUNK_SIZE)
+        os.replace(temp_path, object_path)
+ 
+    def _object_path(self, digest, extension=None):
+        return os.path.join(self.objects, digest + (extension or self.extension))
+ 
+    def backup(self, paths):
+        """
+        Snapshot the given files that exist and are not empty; returns the
+        snapshot name, or None if there was nothing to back up.
+        """
+        previous = {}
+        snapshots = self.snapshots()
+        if snapshots:
+            previous = {entry['path']: entry for entry in self.manifest(snapshots[-1])['files']}
+        os.makedirs(self.objects, exist_ok=True)
+        snapshot = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        snapshot_dir = os.path.join(self.directory, snapshot)
+        entries = []
+        names = set()
+        for path in paths:
+            path = os.path.abspath(path)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                logging.info(f"File not found for backup: {path}")
+                continue
+            if not stat.st_size:
+                continue
+            entry = previous.get(path)
+            if not (entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns
+                    and os.path.exists(self._object_path(entry['hash'], entry['extension']))):
+                digest = file_digest(path)
+                extension = self.extension
+                # Content stored earlier under another compression is reused as it is
+                for known in ('.zst', '.gz'):
+                    if os.path.exists(self._object_path(digest, known)):
+                        extension = known
+                        break
+                else:
+                    self._compress(path, self._object_path(digest))
+                entry = {'path': path, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                         'hash': digest, 'extension': extension}
+            name = os.path.basename(path)
+            while name in names:
+                name = f"_{name}"
+            names.add(name)
+            entry = dict(entry, name=name)
+            os.makedirs(snapshot_dir, exist_ok=True)
+            link_path = os.path.join(snapshot_dir, name + entry['extension'])
+            try:
+                os.link(self._object_path(entry['hash'], entry['extension']), link_path)
+            except OSError:
+                shutil.copy(self._object_path(entry['hash'], entry['extension']), link_path)
+            entries.append(entry)
+        if not entries:
+            return None
+        with open(os.path.join(snapshot_dir, MANIFEST), 'w') as f:
+            json.dump({'created': time.time(), 'files': entries}, f, indent=1)
+        self.prune()
+        return snapshot
+ 
+    def prune(self):
+        """Apply retention, always keeping the newest snapshot, then delete unreferenced objects."""
+        snapshots = self.snapshots()
+        cutoff = time.time() - self.max_age_days * 86400
+        for i, snapshot in enumerate(reversed(snapshots)):
+            if i == 0:
+                continue
+            if i >= self.keep or self.manifest(snapshot)['created'] < cutoff:
+                shutil.rmtree(os.path.join(self.directory, snapshot))
+                logging.info(f"Removed backup snapshot {snapshot}")
+        referenced = set()
+        for snapshot in self.snapshots():
+            referenced.update(entry['hash'] + entry['extension'] for entry in self.manifest(snapshot)['files'])
+        if os.path.isdir(self.objects):
+            for name in os.listdir(self.objects):
+                if name not in referenced:
+                    os.remove(os.path.join(self.objects, name))
+ 
+    def restore(self, name, destination, snapshot=None):
+        """Decompress a backed-up file, by base name or original path, from a snapshot (default: newest)."""
+        snapshot = snapshot or self.snapshots()[-1]
+        for entry in self.manifest(snapshot)['files']:
+            if name in (entry['name'], entry['path']):
+                break
+        else:
+            raise FileNotFoundError(f"{name} is not in backup snapshot {snapshot}")
+        object_path = self._object_path(entry['hash'], entry['extension'])
+        with open(destination, 'wb') as out:
+            if entry['extension'] == '.zst':
+                if zstandard is None:
+                    raise RuntimeError("Restoring a zstd backup requires zstandard")
+                with open(object_path, 'rb') as source:
+                    zstandard.ZstdDecompressor().copy_stream(source, out)
+            else:
+                with gzip.open(object_path, 'rb') as source:
+                    shutil.copyfileobj(source, out, CHUNK_SIZE)
+        return destination
@@ -0,0 +1,196 @@
+"""
+Offline benchmark for the gluestats commands.
+ 
+Starts a fake Glue/Lake Formation endpoint (fake_glue.py) with the requested
+catalog shape, latency and throttling, runs each command against it in its own
+process and writes one JSON document with wall time, calls/sec, p50/p99 call
+latency and peak RSS per command.
+ 
+    python benchmark.py --databases 20 --tables 200 --skew 1.2 --throttle-rate 0.05 --output bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+ 
+import fake_glue
+ 
+COMMANDS = ('crawl', 'columns', 'create', 'pause', 'resume', 'run', 'export-stats', 'delete-schedule', 'delete-stats')
+ACCOUNT_ID = '123456789012'
+ 
+ 
+def command_argv(command, workdir):
+    """gluestats arguments for command, reading the outputs of the commands before it."""
+    tables = os.path.join(workdir, 'tables')
+    columns = os.path.join(workdir, 'columns')
+    out = os.path.join(workdir, command)
+    for path in (tables, columns, out):
+        os.makedirs(path, exist_ok=True)
+    column_list = os.path.join(columns, 'database_table_columns_list.txt')
+    table_index = os.path.join(columns, 'database_table_list.txt')
+    if command == 'crawl':
+        return ['crawl', '--base-path', tables, '--log-file', os.path.join(tables, 'script_log.txt')]
+    if command == 'columns':
+        return ['columns', '--output', column_list, '--table-index', table_index,
+                '--catalog-index', os.path.join(columns, 'catalog_index.db'),
+                '--log-file', os.path.join(columns, 'fetch_columns.log')]
+    if command == 'create':
+        return ['create', '--base-path', out, '--source', os.path.join(tables, 'missing_glue_stats.txt'),
+                '--existing', os.path.join(tables, 'existing_glue_stats.txt'),
+                '--role-arn', f"arn:aws:iam::{ACCOUNT_ID}:role/benchmark", '--catalog-id', ACCOUNT_ID]
+    if command == 'pause':
+        return ['pause', '--input', os.path.join(tables, 'all_table_list.txt'),
+                '--state-file', os.path.join(workdir, 'pause_state.txt'), '--log-file', os.path.join(out, 'pause.log')]
+    if command == 'resume':
+        return ['resume', '--state-file', os.path.join(workdir, 'pause_state.txt'), '--log-file', os.path.join(out, 'resume.log')]
+    if command == 'run':
+        return ['run', '--input', os.path.join(tables, 'missing_glue_stats.txt'),
+                '--state-file', os.path.join(out, 'stats_runs_state.txt'), '--log-file', os.path.join(out, 'run.log'),
+                '--role-arn', f"arn:aws:iam::{ACCOUNT_ID}:role/benchmark", '--catalog-id', ACCOUNT_ID,
+                '--poll-interval', '0.2']
+    if command == 'export-stats':
+        return ['export-stats', '--input', column_list, '--output', os.path.join(out, 'column_statistics.db'),
+                '--log-file', os.path.join(out, 'export_stats.log'), '--catalog-id', ACCOUNT_ID]
+    if command == 'delete-schedule':
+        return ['delete-schedule', '--base-path', out, '--source', column_list, '--table-index', table_index]
+    if command == 'delete-stats':
+        return ['delete-stats', '--base-path', out, '--source', column_list]
+    raise ValueError(f"Unknown command: {command}")
+ 
+ 
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+ 
+ 
+def measure(gluestats_argv):
+    """Run gluestats in this process, timing every AWS call, and return the measurements."""
+    import aws_clients
+    import gluestats
+    from metrics import get_metrics
+ 
+    latencies = []
+    errors = {}
+    lock = threading.Lock()
+ 
+    def before_call(context, **kwargs):
+        context['benchmark_start'] = time.perf_counter()
+ 
+    def after_call(context, http_response, parsed, **kwargs):
+        elapsed = time.perf_counter() - context['benchmark_start']
+        with lock:
+            latencies.append(elapsed)
+            if http_response.status_code >= 300:
+                code = parsed.get('Error', {}).get('Code', 'Unknown')
+                errors[code] = errors.get(code, 0) + 1
+ 
+    def after_call_error(context, exception, **kwargs):
+        with lock:
+            latencies.append(time.perf_counter() - context['benchmark_start'])
+            name = type(exception).__name__
+            errors[name] = errors.get(name, 0) + 1
+ 
+    # Clients copy the session's handlers when built, so register before any are created
+    events = aws_clients.get_session().events
+    events.register('before-call.*.*', before_call)
+    events.register('after-call.*.*', after_call)
+    events.register('after-call-error.*.*', after_call_error)
+ 
+    start = time.perf_counter()
+    gluestats.main(gluestats_argv)
+    wall = time.perf_counter() - start
+    return {
+        'wall_seconds': round(wall, 3),
+        'calls': len(latencies),
+        'calls_per_second': round(len(latencies) / wall, 1) if wall else None,
+        'p50_ms': round(1000 * percentile(latencies, 0.50), 2) if latencies else None,
+        'p99_ms': round(1000 * percentile(latencies, 0.99), 2) if latencies else None,
+        'errors': errors,
+        'operations': {operation: {k: v for k, v in stats.items() if k not in ('latency_buckets', 'wait_buckets')}
+                       for operation, stats in get_metrics().snapshot()['operations'].items()},
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1),
+    }
+ 
+ 
+def run_command(command, workdir, endpoint_url, server):
+    """Run one command in a fresh interpreter against the fake endpoint and collect its results."""
+    result_path = os.path.join(workdir, f"{command}.result.json")
+    env = dict(os.environ, AWS_ENDPOINT_URL=endpoint_url, AWS_ACCESS_KEY_ID='benchmark',
+               AWS_SECRET_ACCESS_KEY='benchmark', AWS_DEFAULT_REGION='us-east-1')
+    env.pop('AWS_PROFILE', None)
+    requests_before, throttled_before, bytes_before = sum(server.calls.values()), server.throttled, server.response_bytes
+    start = time.perf_counter()
+    # The commands echo their logs to stdout; keep them out of the report
+    with open(os.path.join(workdir, f"{command}.out"), 'w') as out:
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--child', result_path, '--', *command_argv(command, workdir)],
+                       env=env, check=True, cwd=os.path.dirname(os.path.abspath(__file__)), stdout=out, stderr=subprocess.STDOUT)
+    with open(result_path) as f:
+        result = json.load(f)
+    result['process_seconds'] = round(time.perf_counter() - start, 3)
+    # Server-side counts include attempts retried inside botocore
+    result['requests'] = sum(server.calls.values()) - requests_before
+    result['throttled'] = server.throttled - throttled_before
+    result['response_bytes'] = server.response_bytes - bytes_before
+    return result
+ 
+ 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the gluestats commands against a local fake Glue endpoint')
+    fake_glue.add_catalog_arguments(parser)
+    parser.add_argument('--commands', default=','.join(COMMANDS), help='Comma-separated commands to run, in order')
+    parser.add_argument('--workdir', help='Directory for command outputs (default: a new temporary directory)')
+    parser.add_argument('--output', help='Write the JSON results here instead of stdout')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('gluestats_argv', nargs='*', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+ 
+    if args.child:
+        result = measure(args.gluestats_argv)
+        with open(args.child, 'w') as f:
+            json.dump(result, f)
+        return
+ 
+    commands = [command.strip() for command in args.commands.split(',') if command.strip()]
+    unknown = set(commands) - set(COMMANDS)
+    if unknown:
+        parser.error(f"unknown commands: {', '.join(sorted(unknown))}")
+    workdir = args.workdir or tempfile.mkdtemp(prefix='gluestats-bench-')
+    os.makedirs(workdir, exist_ok=True)
+    server = fake_glue.server_from_args(args).start()
+    try:
+        results = {command: run_command(command, workdir, server.endpoint_url, server) for command in commands}
+    finally:
+        server.stop()
+ 
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'catalog': {
+            'databases': len(server.catalog.tables),
+            'tables': sum(len(names) for names in server.catalog.tables.values()),
+            'columns_per_table': len(server.catalog.columns),
+            'skew': args.skew,
+        },
+        'endpoint': {'latency': args.latency, 'jitter': args.jitter, 'throttle_rate': args.throttle_rate},
+        'workdir': workdir,
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+ 
+ 
+if __name__ == '__main__':
+    main()
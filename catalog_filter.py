@@ -0,0 +1,57 @@
+import re
+from fnmatch import fnmatchcase
+ 
+ 
+def glob_to_regex(pattern):
+    """Glob pattern as an anchored regular expression for a Glue Expression filter."""
+    parts = []
+    for char in pattern:
+        if char == '*':
+            parts.append('.*')
+        elif char == '?':
+            parts.append('.')
+        else:
+            parts.append(re.escape(char))
+    return '^' + ''.join(parts) + '$'
+ 
+ 
+class CatalogFilter:
+    """
+    Include and exclude glob patterns for database and table names. Databases
+    are filtered before any of their tables are listed; table includes are
+    pushed down to get_tables as its Expression, and every table name is
+    checked again locally, since Expression cannot exclude.
+    """
+ 
+    def __init__(self, databases=(), exclude_databases=(), tables=(), exclude_tables=()):
+        self.include_databases = list(databases)
+        self.exclude_databases = list(exclude_databases)
+        self.include_tables = list(tables)
+        self.exclude_tables = list(exclude_tables)
+ 
+    def _wants(self, name, include, exclude):
+        return ((not include or any(fnmatchcase(name, pattern) for pattern in include))
+                and not any(fnmatchcase(name, pattern) for pattern in exclude))
+ 
+    @property
+    def filters_databases(self):
+        return bool(self.include_databases or self.exclude_databases)
+ 
+    @property
+    def filters_tables(self):
+        return bool(self.include_tables or self.exclude_tables)
+ 
+    def wants_database(self, name):
+        return self._wants(name, self.include_databases, self.exclude_databases)
+ 
+    def wants_table(self, name):
+        return self._wants(name, self.include_tables, self.exclude_tables)
+ 
+    def databases(self, names):
+        return [name for name in names if self.wants_database(name)]
+ 
+    def get_tables_kwargs(self):
+        """Extra get_tables arguments: an Expression matching any include pattern."""
+        if not self.include_tables:
+            return {}
+        return {'Expression': '|'.join(glob_to_regex(pattern) for pattern in self.include_tables)}
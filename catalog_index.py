@@ -0,0 +1,201 @@
+import glob
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+ 
+# Cached details older than this are fetched again even if the table is unchanged
+DEFAULT_TTL = 7 * 24 * 3600
+# Stats-settings state changes without the table's UpdateTime changing, so it expires sooner
+DEFAULT_STATS_TTL = 24 * 3600
+INDEX_NAME = 'catalog_index.db'
+ 
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS databases (
+    name TEXT PRIMARY KEY,
+    seen_run REAL
+);
+CREATE TABLE IF NOT EXISTS tables (
+    database_name TEXT,
+    table_name TEXT,
+    update_time TEXT,
+    seen_run REAL,
+    stats_state TEXT,
+    stats_checked_at REAL,
+    columns_refreshed_at REAL,
+    PRIMARY KEY (database_name, table_name)
+);
+CREATE TABLE IF NOT EXISTS columns (
+    database_name TEXT,
+    table_name TEXT,
+    position INTEGER,
+    column_name TEXT,
+    PRIMARY KEY (database_name, table_name, position)
+);
+"""
+ 
+ 
+class CatalogIndex:
+    """
+    SQLite-backed local copy of the Glue catalog. Tables are keyed on their Glue
+    UpdateTime: when it changes, the cached column list and stats-settings state
+    for the table are dropped so the next run fetches them again.
+    """
+ 
+    def __init__(self, path, ttl=DEFAULT_TTL, commit_every=1000, stats_ttl=DEFAULT_STATS_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.stats_ttl = stats_ttl
+        self.commit_every = commit_every
+        self.pending_writes = 0
+        self.run = time.time()
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+ 
+    def _write(self, sql, params=()):
+        self.conn.execute(sql, params)
+        self.pending_writes += 1
+        if self.pending_writes >= self.commit_every:
+            self.conn.commit()
+            self.pending_writes = 0
+ 
+    def _fresh(self, refreshed_at, ttl=None):
+        return refreshed_at is not None and self.run - refreshed_at < (self.ttl if ttl is None else ttl)
+ 
+    def observe_database(self, database_name):
+        with self.lock:
+            self._write("INSERT INTO databases (name, seen_run) VALUES (?, ?) "
+                        "ON CONFLICT(name) DO UPDATE SET seen_run = excluded.seen_run",
+                        (database_name, self.run))
+ 
+    def observe_table(self, database_name, table_name, update_time):
+        """
+        Record a table seen in this run. Returns True if the table is new or its
+        UpdateTime changed, in which case its cached details are invalidated.
+        An update_time of None, as names-only listings return, keeps the stored
+        one: the table is only marked seen, and its cached details expire by age.
+        """
+        update_time = str(update_time) if update_time is not None else None
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT update_time FROM tables WHERE database_name = ? AND table_name = ?",
+                (database_name, table_name)).fetchone()
+            if row is not None and (update_time is None or row[0] == update_time):
+                self._write("UPDATE tables SET seen_run = ? WHERE database_name = ? AND table_name = ?",
+                            (self.run, database_name, table_name))
+                return False
+            self._write("INSERT OR REPLACE INTO tables (database_name, table_name, update_time, seen_run) "
+                        "VALUES (?, ?, ?, ?)", (database_name, table_name, update_time, self.run))
+            self._write("DELETE FROM columns WHERE database_name = ? AND table_name = ?",
+                        (database_name, table_name))
+            return True
+ 
+    def cached_stats_state(self, database_name, table_name):
+        """Return the last observed stats-settings state, or None if unknown or expired."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT stats_state, stats_checked_at FROM tables WHERE database_name = ? AND table_name = ?",
+                (database_name, table_name)).fetchone()
+        if row is None or not self._fresh(row[1], self.stats_ttl):
+            return None
+        return row[0]
+ 
+    def save_stats_state(self, database_name, table_name, state):
+        with self.lock:
+            self._write("UPDATE tables SET stats_state = ?, stats_checked_at = ? "
+                        "WHERE database_name = ? AND table_name = ?",
+                        (state, time.time(), database_name, table_name))
+ 
+    def forget_stats_state(self, database_name, table_name):
+        """Drop a table's cached stats-settings state after its schedule was created or changed."""
+        with self.lock:
+            self._write("UPDATE tables SET stats_state = NULL, stats_checked_at = NULL "
+                        "WHERE database_name = ? AND table_name = ?", (database_name, table_name))
+ 
+    def cached_columns(self, database_name, table_name):
+        """Return the cached column names of a table, or None if unknown or expired."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT columns_refreshed_at FROM tables WHERE database_name = ? AND table_name = ?",
+                (database_name, table_name)).fetchone()
+            if row is None or not self._fresh(row[0]):
+                return None
+            rows = self.conn.execute(
+                "SELECT column_name FROM columns WHERE database_name = ? AND table_name = ? ORDER BY position",
+                (database_name, table_name)).fetchall()
+        return [r[0] for r in rows]
+ 
+    def save_columns(self, database_name, table_name, column_names):
+        with self.lock:
+            self._write("DELETE FROM columns WHERE database_name = ? AND table_name = ?",
+                        (database_name, table_name))
+            self.conn.executemany(
+                "INSERT INTO columns (database_name, table_name, position, column_name) VALUES (?, ?, ?, ?)",
+                [(database_name, table_name, i, name) for i, name in enumerate(column_names)])
+            self._write("UPDATE tables SET columns_refreshed_at = ? WHERE database_name = ? AND table_name = ?",
+                        (time.time(), database_name, table_name))
+ 
+    def prune_database(self, database_name):
+        """Forget tables of a fully crawled database that were not seen in this run."""
+        with self.lock:
+            stale = self.conn.execute(
+                "SELECT COUNT(*) FROM tables WHERE database_name = ? AND seen_run < ?",
+                (database_name, self.run)).fetchone()[0]
+            if stale:
+                self._write("DELETE FROM columns WHERE (database_name, table_name) IN "
+                            "(SELECT database_name, table_name FROM tables WHERE database_name = ? AND seen_run < ?)",
+                            (database_name, self.run))
+                self._write("DELETE FROM tables WHERE database_name = ? AND seen_run < ?",
+                            (database_name, self.run))
+                logging.info(f"Removed {stale} dropped tables of {database_name} from the catalog index")
+ 
+    def prune_databases(self):
+        """Forget databases, and their tables, that were not seen in this run."""
+        with self.lock:
+            for sql in ("DELETE FROM columns WHERE database_name IN (SELECT name FROM databases WHERE seen_run < ?)",
+                        "DELETE FROM tables WHERE database_name IN (SELECT name FROM databases WHERE seen_run < ?)",
+                        "DELETE FROM databases WHERE seen_run < ?"):
+                self._write(sql, (self.run,))
+ 
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+ 
+ 
+class IndexGroup:
+    """
+    A crawl's catalog index together with the shard indexes a sharded crawl
+    keeps beside it (catalog_index.db.shardN), so changes made outside the
+    crawl reach whichever index the next crawl reads.
+    """
+ 
+    def __init__(self, indexes):
+        self.indexes = indexes
+ 
+    def forget_stats_state(self, database_name, table_name):
+        for index in self.indexes:
+            index.forget_stats_state(database_name, table_name)
+ 
+    def close(self):
+        for index in self.indexes:
+            index.close()
+ 
+ 
+def open_existing(path):
+    """
+    Open the catalog index at path, or the one in path's directory if path is
+    a list file next to it, along with its shard indexes; returns None if there
+    is no index there.
+    """
+    if path and not path.endswith('.db'):
+        path = os.path.join(os.path.dirname(path), INDEX_NAME)
+    if not path:
+        return None
+    paths = [path] if os.path.exists(path) else []
+    paths += sorted(shard for shard in glob.glob(f"{glob.escape(path)}.shard*") if re.search(r'\.shard\d+$', shard))
+    return IndexGroup([CatalogIndex(index_path) for index_path in paths]) if paths else None
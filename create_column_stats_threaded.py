@@ -1,85 +1,279 @@
-import boto3
-import random
 import os
 import shutil
 import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from botocore.config import Config
+import hashlib
+import heapq
+import itertools
+import re
+from concurrent.futures import ThreadPoolExecutor
+from aws_clients import LazyClient, connection_report
+from backups import BackupStore
+from catalog_index import open_existing
+from lake_formation import grant_missing, granted_tables
+from metrics import get_metrics
+from output_sink import get_sink
+from pipeline import bounded_map, distinct, read_rows
+from rate_control import get_controller
+from schedule_planner import SchedulePlanner, table_cost
+from stats_policy import StatsPolicy
  
 # Paths
 base_path = "/home/ec2-user/glue_stats_creation/"
 backup_path = os.path.join(base_path, "bkp_log/")
 migration_file_path = os.path.join(base_path, "missing_glue_stats.txt")
 source_file_path = "/home/ec2-user/alltablesg/missing_glue_stats.txt"
+existing_file_path = "/home/ec2-user/alltablesg/existing_glue_stats.txt"  # Tables that already have schedules
 log_file_path = os.path.join(base_path, "gluestatlogfile.txt")
+plan_file_path = os.path.join(base_path, "schedule_plan.txt")
+policy_file_path = None  # JSON column and sample size rules (see stats_policy); None covers every column of the full table
+ 
+def set_base_path(path):
+    """Point the working, backup and log files at path."""
+    global base_path, backup_path, migration_file_path, log_file_path, plan_file_path
+    base_path = path
+    backup_path = os.path.join(base_path, "bkp_log/")
+    migration_file_path = os.path.join(base_path, "missing_glue_stats.txt")
+    log_file_path = os.path.join(base_path, "gluestatlogfile.txt")
+    plan_file_path = os.path.join(base_path, "schedule_plan.txt")
  
 # Constants
 role_arn = "arn:aws:iam::"
 catalog_id = ""
+permissions = ["SELECT", "DESCRIBE", "INSERT", "ALTER", "DELETE", "DROP"]
+batch_grants = True  # Read existing grants once and batch only the missing ones; False grants per table
+catalog_index_path = None  # Crawl's catalog index to update; None uses the one next to source_file_path
+max_existing_lookups = 200  # Existing schedules read to estimate their load; the rest are weighted in from these
+plan_batch_size = 1000  # Tables planned at a time; each batch's tasks are created while the next is planned
+max_expression_length = 1000  # Longest get_tables name Expression used to read a batch's tables
+table_source = None  # Optional (database, table) -> Glue Table or None, used instead of reading get_tables pages
  
-# Boto3 clients
-#lakeformation_client = boto3.client("lakeformation", config=config)
-#glue_client = boto3.client("glue", config=config)
- 
-# Boto3 clients
-lakeformation_client = boto3.client("lakeformation")
-glue_client = boto3.client("glue")
+# Boto3 clients, built on first use
+lakeformation_client = LazyClient("lakeformation")
+glue_client = LazyClient("glue")
+controller = get_controller()
+sink = get_sink()
  
 def log(message):
     """Log a message to both the console and the log file."""
-    try:
-        with open(log_file_path, "a") as log_file:
-            log_file.write(f"{datetime.datetime.now()}: {message}\n")
-    except IOError as e:
-        print(f"Failed to write to log file: {e}")
+    sink.write(log_file_path, f"{datetime.datetime.now()}: {message}\n")
     print(message)
  
-def generate_random_cron():
-    """Generate a random cron schedule."""
-    minute = random.randint(0, 59)
-    hour = random.randint(0, 23)
-    day = random.randint(5, 25)
-    return f"cron({minute} {hour} {day} * ? *)"
+def load_policy():
+    return StatsPolicy.from_file(policy_file_path) if policy_file_path else StatsPolicy()
+ 
+def table_detail(database_name, table, policy):
+    """(cost, task_settings) of a Glue Table: the expected stats cost of a run and the policy's settings."""
+    task_settings = policy.settings(database_name, table)
+    columns = len(task_settings['ColumnNameList']) if task_settings and 'ColumnNameList' in task_settings else None
+    sample = (task_settings or {}).get('SampleSize', 100.0) / 100
+    return table_cost(table, columns) * sample, task_settings
+ 
+def name_expressions(names):
+    """get_tables Expressions matching exactly the given names, each at most max_expression_length long."""
+    parts = []
+    length = 0
+    for name in sorted(names):
+        part = re.escape(name)
+        if parts and length + len(part) + 1 > max_expression_length:
+            yield f"^({'|'.join(parts)})$"
+            parts, length = [], 0
+        parts.append(part)
+        length += len(part) + 1
+    if parts:
+        yield f"^({'|'.join(parts)})$"
+ 
+def fetch_table_details(database_name, wanted, policy):
+    """
+    Read the wanted tables of a database with get_tables, filtered to their
+    names, and return {table: (cost, task_settings)}: the expected stats cost
+    of the run and the ColumnNameList/SampleSize the policy chooses (None if
+    it skips the table).
+    """
+    details = {}
+    for expression in name_expressions(wanted):
+        kwargs = {'DatabaseName': database_name, 'Expression': expression}
+        while True:
+            response = controller.call(glue_client.get_tables, **kwargs)
+            for table in response.get('TableList', []):
+                if table['Name'] in wanted:
+                    details[table['Name']] = table_detail(database_name, table, policy)
+            if not response.get('NextToken'):
+                break
+            kwargs['NextToken'] = response['NextToken']
+    return details
  
-def process_entry(database_name, table_name):
-    """Process a single database and table entry."""
+def fetch_source_detail(database_name, table_name, policy):
+    table = table_source(database_name, table_name)
+    return table_detail(database_name, table, policy) if table else None
+ 
+def fetch_details(tables, executor, window, policy):
+    """
+    {(database, table): (cost, task_settings)} for the given tables, reading
+    each database's tables by name, or looking each table up in table_source
+    if one is set. Tables that could not be read are left out.
+    """
+    if table_source:
+        items = ((database_name, table_name, policy) for database_name, table_name in distinct(tables))
+        return {(database_name, table_name): detail
+                for (database_name, table_name, _), detail in bounded_map(
+                    executor, fetch_source_detail, items, window,
+                    lambda item, e: log(f"Failed to read table {item[0]}.{item[1]}: {e}"))
+                if detail}
+    wanted = {}
+    for database_name, table_name in tables:
+        wanted.setdefault(database_name, set()).add(table_name)
+    details = {}
+    for (database_name, _, _), table_details in bounded_map(executor, fetch_table_details,
+                                                            ((db, names, policy) for db, names in wanted.items()), window,
+                                                            lambda item, e: log(f"Failed to read tables of {item[0]}: {e}")):
+        for table_name, detail in (table_details or {}).items():
+            details[(database_name, table_name)] = detail
+    return details
+ 
+def fetch_schedule(database_name, table_name):
+    """Return a table's current column statistics schedule expression, or None."""
     try:
-        log(f"Processing Database: {database_name}, Table: {table_name}")
+        response = controller.call(glue_client.get_column_statistics_task_settings,
+                                   DatabaseName=database_name, TableName=table_name)
+    except glue_client.exceptions.EntityNotFoundException:
+        return None
+    return response['ColumnStatisticsTaskSettings'].get('Schedule', {}).get('ScheduleExpression')
  
-        # Grant SELECT permission
-        lakeformation_client.grant_permissions(
-            Principal={"DataLakePrincipalIdentifier": role_arn},
-            Resource={"Table": {"DatabaseName": database_name, "Name": table_name}},
-            Permissions=["SELECT", "DESCRIBE", "INSERT", "ALTER", "DELETE", "DROP"],
-            PermissionsWithGrantOption=["SELECT", "DESCRIBE", "INSERT", "ALTER", "DELETE", "DROP"]
-        )
-        log(f"Successfully granted SELECT permission for {database_name}.{table_name}")
+def sample_existing(limit):
+    """
+    Return (sample, total): at most limit tables of existing_file_path, chosen
+    by a hash of their names so reruns read the same ones, and the number of
+    rows in the file. The file is streamed, holding only the sample.
+    """
+    if not os.path.exists(existing_file_path):
+        return [], 0
+    total = 0
+ 
+    def counted(rows):
+        nonlocal total
+        for row in rows:
+            total += 1
+            yield row
+ 
+    key = lambda row: hashlib.blake2b(','.join(row).encode(), digest_size=8).digest()
+    # Repeated rows hash alike, so they are adjacent in the sample
+    sample = heapq.nsmallest(limit, counted(read_rows(existing_file_path, 2)), key=key)
+    return list(dict.fromkeys(sample)), total
  
-        # Generate random cron schedule
-        cron_schedule = generate_random_cron()
+def load_existing(planner, executor, window, policy):
+    """
+    Add the load of the tables that are already scheduled to the planner,
+    estimated from at most max_existing_lookups of their schedules, each
+    weighted by the share of existing tables it stands for, so the reads do
+    not grow with the catalog. Returns the number of existing tables.
+    """
+    sample, total = sample_existing(max_existing_lookups)
+    if sample:
+        weight = total / len(sample)
+        existing_costs = {entry: cost for entry, (cost, _) in fetch_details(sample, executor, window, policy).items()}
+        for entry, expression in bounded_map(executor, fetch_schedule, sample, window,
+                                             lambda item, e: log(f"Failed to read the schedule of {'.'.join(item)}: {e}")):
+            if expression:
+                planner.add_existing(expression, existing_costs.get(entry, 1.0) * weight)
+        log(f"Estimated the load of {total} existing schedules from {len(sample)} of them")
+    return total
+ 
+def plan_batch(planner, entries, executor, window, policy):
+    """
+    Choose the task settings of a batch of (database, table) entries with the
+    policy and assign each a cron schedule, spreading the expected stats load
+    evenly around the schedules already in the planner. Returns (schedules,
+    task_settings, skipped): task_settings holds only the entries the policy
+    does not leave at the full default, and entries it skips are counted in
+    skipped and get no schedule. Entries whose table could not be read are
+    logged and skipped too, rather than given a full-table task the policy
+    might not allow; they stay missing, so the next create retries them. The
+    batch's schedules are appended to the plan file.
+    """
+    costs = {}
+    task_settings = {}
+    skipped = 0
+    entries = list(dict.fromkeys(entries))
+    details = fetch_details(entries, executor, window, policy)
+    for entry in entries:
+        if entry not in details:
+            log(f"Could not read table {entry[0]}.{entry[1]}; no column statistics task is created for it")
+            skipped += 1
+            continue
+        cost, settings = details[entry]
+        if settings is None:
+            skipped += 1
+            continue
+        costs[entry] = cost
+        if settings:
+            task_settings[entry] = settings
+    schedules = planner.plan([(database_name, table_name, cost) for (database_name, table_name), cost in costs.items()])
+    with open(plan_file_path, "a") as f:
+        for (database_name, table_name), cron_schedule in sorted(schedules.items()):
+            f.write(f"{database_name},{table_name},{cron_schedule}\n")
+    return schedules, task_settings, skipped
+ 
+def batches(rows, size):
+    """Split rows into lists of at most size rows, reading only one list ahead."""
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+ 
+def grant_all(entries, executor, window, held=None):
+    """
+    Grant the role permissions on every entry it does not already hold; returns
+    the entries that failed. held is the role's granted_tables, read if not given.
+    """
+    missing, failures = grant_missing(lakeformation_client, controller, executor, window, role_arn, entries,
+                                      permissions, permissions, catalog_id or None, held)
+    log(f"{len(entries) - len(missing)} of {len(entries)} tables already granted; "
+        f"granted {len(missing) - len(failures)}, {len(failures)} failed")
+    for (database_name, table_name), error in sorted(failures.items()):
+        log(f"Failed to grant permissions for {database_name}.{table_name}: {error}")
+    return failures
+ 
+def process_entry(database_name, table_name, cron_schedule, grant=True, task_settings=None):
+    """Process a single database and table entry; returns True if its task was created."""
+    try:
+        log(f"Processing Database: {database_name}, Table: {table_name}")
+ 
+        # Grant SELECT permission unless it was granted in bulk
+        if grant:
+            controller.call(
+                lakeformation_client.grant_permissions,
+                Principal={"DataLakePrincipalIdentifier": role_arn},
+                Resource={"Table": {"DatabaseName": database_name, "Name": table_name}},
+                Permissions=permissions,
+                PermissionsWithGrantOption=permissions
+            )
+            log(f"Successfully granted SELECT permission for {database_name}.{table_name}")
  
         # Create column statistics task
-        glue_client.create_column_statistics_task_settings(
+        controller.call(
+            glue_client.create_column_statistics_task_settings,
             DatabaseName=database_name,
             TableName=table_name,
             Role=role_arn,
             Schedule=cron_schedule,
-            CatalogID=catalog_id
+            **({'CatalogID': catalog_id} if catalog_id else {}),
+            **(task_settings or {})
         )
         log(f"Successfully created Glue column statistics task for {database_name}.{table_name} with schedule {cron_schedule}")
+        return True
  
     except Exception as e:
         log(f"Failed to process {database_name}.{table_name}: {e}")
  
 def backup_and_replace_files():
-    """Backup current files and replace the migration file."""
+    """Snapshot the working files into the backup store and replace the migration file."""
     try:
-        if not os.path.exists(backup_path):
-            os.makedirs(backup_path)
- 
-        for file in os.listdir(base_path):
-            if file.endswith(".txt"):
-                shutil.copy(os.path.join(base_path, file), backup_path)
+        files = [os.path.join(base_path, file) for file in sorted(os.listdir(base_path)) if file.endswith(".txt")]
+        snapshot = BackupStore(backup_path).backup(files)
+        if snapshot:
+            log(f"Backed up {len(files)} files to {os.path.join(backup_path, snapshot)}")
  
         if os.path.exists(source_file_path):
             shutil.copy(source_file_path, migration_file_path)
@@ -93,18 +287,54 @@ def backup_and_replace_files():
  
     return True
  
-def main():
-    """Main function to orchestrate the process."""
-    # Clear the log file at the start of the process
+def update_entry(database_name, table_name, task_settings):
+    """Apply policy settings to a table's existing column statistics task."""
     try:
-        with open(log_file_path, "w"):
-            pass
-    except IOError as e:
-        print(f"Failed to clear log file: {e}")
+        controller.call(
+            glue_client.update_column_statistics_task_settings,
+            DatabaseName=database_name,
+            TableName=table_name,
+            **({'CatalogID': catalog_id} if catalog_id else {}),
+            **task_settings
+        )
+        log(f"Updated column statistics task for {database_name}.{table_name}: {task_settings}")
+    except Exception as e:
+        log(f"Failed to update {database_name}.{table_name}: {e}")
+ 
+def apply_policy(dry_run=False):
+    """
+    Apply the policy to the existing tasks of the tables in existing_file_path,
+    reading the tables plan_batch_size at a time. Tables the policy leaves at
+    the full default or skips are not changed.
+    """
+    if not os.path.exists(existing_file_path):
+        log(f"Error: File {existing_file_path} not found!")
         return
+    max_threads = controller.max_concurrency
+    policy = load_policy()
+    counts = {'tables': 0, 'updates': 0}
+    entries = read_rows(existing_file_path, 2, on_invalid=lambda line: log(f"Skipping invalid line: {line}"))
+    with ThreadPoolExecutor(max_threads) as executor:
+        def updates():
+            for batch in batches(entries, plan_batch_size):
+                details = fetch_details(batch, executor, 2 * max_threads, policy)
+                counts['tables'] += len(batch)
+                for database_name, table_name in batch:
+                    task_settings = details.get((database_name, table_name), (1.0, None))[1]
+                    if task_settings:
+                        counts['updates'] += 1
+                        yield database_name, table_name, task_settings
  
-    log(f"Starting process at {datetime.datetime.now()}")
+        if dry_run:
+            for database_name, table_name, task_settings in updates():
+                log(f"Would update {database_name}.{table_name}: {task_settings}")
+        else:
+            for _ in bounded_map(executor, update_entry, updates(), 2 * max_threads):
+                pass
+    log(f"Policy changes {counts['updates']} of {counts['tables']} existing column statistics tasks")
  
+def create_tasks():
+    """Grant permissions and create column statistics tasks for every table in the migration file."""
     # Backup and replace files
     if not backup_and_replace_files():
         log("File preparation failed. Aborting process.")
@@ -115,30 +345,66 @@ def main():
         log(f"Error: File {migration_file_path} not found!")
         return
  
-    entries = []
+    # Plan plan_batch_size tables at a time, creating each batch's tasks while the next is planned
+    max_threads = controller.max_concurrency  # In-flight calls are governed by the rate controller
+    window = 2 * max_threads
+    policy = load_policy()
+    counts = {'planned': 0, 'skipped': 0}
     try:
-        with open(migration_file_path, "r") as db_details_file:
-            for line in db_details_file:
-                try:
-                    database_name, table_name = line.strip().split(",")
-                    if not database_name or not table_name:
-                        log(f"Skipping invalid line: {line.strip()}")
-                        continue
-                    entries.append((database_name, table_name))
-                except ValueError as e:
-                    log(f"Skipping invalid line: {line.strip()} - Error: {e}")
+        open(plan_file_path, "w").close()
+        entries = read_rows(migration_file_path, 2, on_invalid=lambda line: log(f"Skipping invalid line: {line}"))
+        with ThreadPoolExecutor(max_threads) as executor:
+            planner = SchedulePlanner()
+            existing = load_existing(planner, executor, window, policy)
+            held = granted_tables(lakeformation_client, controller, role_arn, permissions, permissions,
+                                  catalog_id or None) if batch_grants else None
+ 
+            def tasks():
+                for batch in batches(entries, plan_batch_size):
+                    schedules, task_settings, skipped = plan_batch(planner, batch, executor, window, policy)
+                    counts['planned'] += len(schedules)
+                    counts['skipped'] += skipped
+                    failed = grant_all(list(schedules), executor, window, held) if batch_grants else {}
+                    for (database_name, table_name), cron_schedule in sorted(schedules.items()):
+                        if (database_name, table_name) not in failed:
+                            yield (database_name, table_name, cron_schedule, not batch_grants,
+                                   task_settings.get((database_name, table_name), {}))
+ 
+            # The crawl would otherwise keep listing created tables as missing until their cached state expires
+            index = open_existing(catalog_index_path or source_file_path)
+            try:
+                for (database_name, table_name, *_), created in bounded_map(executor, process_entry, tasks(), window):
+                    if created and index:
+                        index.forget_stats_state(database_name, table_name)
+            finally:
+                if index:
+                    index.close()
+            log(f"Planned {counts['planned']} schedules around {existing} existing ones; "
+                f"busiest slot is {planner.peak_ratio():.2f}x the mean load")
+            if counts['skipped']:
+                log(f"Skipped {counts['skipped']} tables the policy excludes or that could not be read")
     except IOError as e:
         log(f"Error reading {migration_file_path}: {e}")
-        return
  
-    # Use ThreadPoolExecutor to process entries in parallel
-    max_threads = 5  # Adjust this based on your system resources
-    with ThreadPoolExecutor(max_threads) as executor:
-        futures = [executor.submit(process_entry, db, table) for db, table in entries]
-        for future in as_completed(futures):
-            # Process results (if needed) or just wait for completion
+def main(action='create', dry_run=False):
+    """Main function to orchestrate the process."""
+    # Clear the log file at the start of the process
+    try:
+        with open(log_file_path, "w"):
             pass
+    except IOError as e:
+        print(f"Failed to clear log file: {e}")
+        return
+ 
+    log(f"Starting process at {datetime.datetime.now()}")
+ 
+    if action == 'apply-policy':
+        apply_policy(dry_run)
+    else:
+        create_tasks()
  
+    log(connection_report())
+    log(get_metrics().summary())
     log(f"Process completed at {datetime.datetime.now()}")
  
 if __name__ == "__main__":
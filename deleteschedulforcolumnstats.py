@@ -1,44 +1,60 @@
-import boto3
 import datetime
 import os
-import shutil
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 from botocore.exceptions import BotoCoreError, ClientError
+from aws_clients import LazyClient, connection_report
+from backups import BackupStore
+from catalog_index import open_existing
+from metrics import get_metrics
+from output_sink import get_sink
+from pipeline import bounded_map, distinct, read_rows
+from rate_control import get_controller
  
 # Paths
 base_path = "/home/ec2-user/deletecolumnstat/"
 backup_path = os.path.join(base_path, "bkp_log/")
 #source_file_path = "/home/ec2-user/alltablesg/database_table_columns_list.txt"
 source_file_path = "/home/ec2-user/columnname/database_table_columns_list.txt"
+table_index_path = "/home/ec2-user/columnname/database_table_list.txt"  # Written by listallgluecolumn
+catalog_index_path = None  # Crawl's catalog index to update; None uses the one next to source_file_path
+table_index_given = False  # Set when the index was named explicitly, so it is used even if older than the source
 log_file_path = os.path.join(base_path, "gluestatlogfile.txt")
  
+def set_base_path(path):
+    """Point the backup and log files at path."""
+    global base_path, backup_path, log_file_path
+    base_path = path
+    backup_path = os.path.join(base_path, "bkp_log/")
+    log_file_path = os.path.join(base_path, "gluestatlogfile.txt")
+ 
 # Constants
 catalog_id = ""
  
-# Boto3 clients
-glue_client = boto3.client("glue")
+# Boto3 clients, built on first use
+glue_client = LazyClient("glue")
+controller = get_controller()
+sink = get_sink()
  
 def log(message):
     """Log a message to both the console and the log file."""
-    try:
-        with open(log_file_path, "a") as log_file:
-            log_file.write(f"{datetime.datetime.now()}: {message}\n")
-    except IOError as e:
-        print(f"Failed to write to log file: {e}")
+    sink.write(log_file_path, f"{datetime.datetime.now()}: {message}\n")
     print(message)
  
 def delete_column_statistics_schedule(database_name, table_name):
     """
     Delete the column statistics schedule for the given database and table.
+    Returns True if it was stopped.
     """
     try:
         log(f"Deleting column statistics schedule for {database_name}.{table_name}")
-        glue_client.stop_column_statistics_task_run_schedule(
+        controller.call(
+            glue_client.stop_column_statistics_task_run_schedule,
 #            CatalogId=catalog_id,
             DatabaseName=database_name,
             TableName=table_name
         )
         log(f"Successfully deleted column statistics schedule for {database_name}.{table_name}")
+        return True
     except glue_client.exceptions.EntityNotFoundException:
         log(f"Column statistics schedule not found for {database_name}.{table_name}. Skipping.")
     except (BotoCoreError, ClientError) as e:
@@ -46,46 +62,67 @@ def delete_column_statistics_schedule(database_name, table_name):
  
 def backup_file(file_path, backup_folder):
     """
-    Backup the given file to the backup folder.
+    Snapshot the given file into the backup store in the backup folder.
     """
     try:
-        if not os.path.exists(backup_folder):
-            os.makedirs(backup_folder)
-        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_file_path = os.path.join(backup_folder, f"{os.path.basename(file_path)}_{timestamp}.bak")
-        shutil.copy(file_path, backup_file_path)
-        log(f"Backed up file {file_path} to {backup_file_path}")
+        snapshot = BackupStore(backup_folder).backup([file_path])
+        if snapshot:
+            log(f"Backed up file {file_path} to {os.path.join(backup_folder, snapshot)}")
     except IOError as e:
         log(f"Failed to backup file {file_path}: {e}")
  
-def process_file(file_path, max_threads=20):
+def process_tables(tables, max_threads=None):
     """
-    Process the file and delete column statistics schedules for each entry.
+    Delete column statistics schedules for a stream of (database, table) pairs.
     """
-    entries = []
+    max_threads = max_threads or controller.max_concurrency
+    index = open_existing(catalog_index_path or source_file_path)
+    # Process entries with a sliding window; in-flight calls are governed by the rate controller
     try:
-        with open(file_path, "r") as f:
-            for line in f:
-                try:
-                    database_name, table_name, _ = line.strip().split(",")  # Ignore column_name
-                    if database_name and table_name:
-                        entries.append((database_name, table_name))
-                    else:
-                        log(f"Skipping invalid line: {line.strip()}")
-                except ValueError:
-                    log(f"Skipping invalid line: {line.strip()}")
+        with ThreadPoolExecutor(max_threads) as executor:
+            for (database_name, table_name), stopped in bounded_map(
+                    executor, delete_column_statistics_schedule, tables, 2 * max_threads,
+                    on_error=lambda entry, e: log(f"Error in processing entry: {e}")):
+                if stopped and index:
+                    index.forget_stats_state(database_name, table_name)
+    finally:
+        if index:
+            index.close()
+ 
+def process_file(file_path, max_threads=None):
+    """
+    Process the column list file and delete column statistics schedules for each table.
+    """
+    rows = read_rows(file_path, 3, on_invalid=lambda line: log(f"Skipping invalid line: {line}"),
+                     header="DatabaseName,TableName,ColumnName")
+    tables = distinct((database_name, table_name) for database_name, table_name, _ in rows)  # Ignore column_name
+    try:
+        process_tables(tables, max_threads)
     except IOError as e:
         log(f"Error reading file {file_path}: {e}")
-        return
  
-    # Process entries with a thread pool
-    with ThreadPoolExecutor(max_threads) as executor:
-        futures = [executor.submit(delete_column_statistics_schedule, db, table) for db, table in set(entries)]
-        for future in as_completed(futures):
-            try:
-                future.result()
-            except Exception as e:
-                log(f"Error in processing entry: {e}")
+def process_table_index(file_path, max_threads=None):
+    """
+    Delete column statistics schedules for each table of the sorted table index.
+    """
+    tables = read_rows(file_path, 2, on_invalid=lambda line: log(f"Skipping invalid line: {line}"),
+                       header="DatabaseName,TableName")
+    try:
+        process_tables(tables, max_threads)
+    except IOError as e:
+        log(f"Error reading file {file_path}: {e}")
+ 
+def use_table_index():
+    """
+    Whether to read the table index instead of the column list: only if it was
+    named explicitly, or is at least as new as the column list it was derived
+    from, so a narrowed --source is never overridden by an older full index.
+    """
+    if not os.path.exists(table_index_path):
+        return False
+    if table_index_given or not os.path.exists(source_file_path):
+        return True
+    return os.path.getmtime(table_index_path) >= os.path.getmtime(source_file_path)
  
 def main():
     """Main function to orchestrate the process."""
@@ -102,13 +139,17 @@ def main():
     # Backup the source file
     backup_file(source_file_path, backup_path)
  
-    # Process the file
-    if not os.path.exists(source_file_path):
+    # Prefer the table index, which has one row per table instead of one per column
+    if use_table_index():
+        process_table_index(table_index_path)
+    elif os.path.exists(source_file_path):
+        process_file(source_file_path)
+    else:
         log(f"Error: File {source_file_path} not found!")
         return
  
-    process_file(source_file_path, max_threads=20)  # Adjust max_threads based on system capacity
- 
+    log(connection_report())
+    log(get_metrics().summary())
     log(f"Process completed at {datetime.datetime.now()}")
  
 if __name__ == "__main__":
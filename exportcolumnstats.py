@@ -0,0 +1,125 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from aws_clients import LazyClient, connection_report
+from metrics import get_metrics
+from pipeline import bounded_map, read_rows
+from rate_control import get_controller
+from stats_store import StatisticsStore
+ 
+# Setup logging
+log_file = 'export_stats.log'
+ 
+def setup_logging():
+    logging.basicConfig(
+        filename=log_file,
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        filemode='w',
+        force=True
+    )
+ 
+# Initialize Glue client, built on first use
+glue_client = LazyClient('glue')
+controller = get_controller()
+ 
+# Column list written by listallgluecolumn, grouped by table
+input_file = 'database_table_columns_list.txt'
+column_header = "DatabaseName,TableName,ColumnName"
+ 
+# SQLite store of the exported statistics, and an optional Parquet copy of it
+output_file = 'column_statistics.db'
+parquet_file = None
+ 
+catalog_id = ""
+full_export = False  # Fetch every table again, not only those analyzed since the last export
+max_columns_per_lookup = 100  # get_column_statistics_for_table accepts at most 100 column names
+ 
+def read_tables(file_path):
+    """Yield (database, table, columns) from a column list whose rows are grouped by table."""
+    rows = read_rows(file_path, 3, on_invalid=lambda line: logging.warning(f"Skipping invalid line: {line}"),
+                     header=column_header)
+    for (database_name, table_name), group in groupby(rows, key=lambda row: row[:2]):
+        yield database_name, table_name, [row[2] for row in group]
+ 
+def get_statistics(database_name, table_name, column_names):
+    kwargs = {'CatalogId': catalog_id} if catalog_id else {}
+    response = controller.call(
+        glue_client.get_column_statistics_for_table,
+        DatabaseName=database_name,
+        TableName=table_name,
+        ColumnNames=column_names,
+        **kwargs
+    )
+    return response.get('ColumnStatisticsList', [])
+ 
+def fetch_table(database_name, table_name, column_names, previous):
+    """
+    Fetch a table's column statistics in batches of 100 columns. Returns None
+    if the table has not been analyzed since the last export: for a table
+    needing more than one batch, the column analyzed last time is looked up
+    first, and if its AnalyzedTime is unchanged the other batches are skipped.
+    """
+    if previous and previous[1] in column_names and len(column_names) > max_columns_per_lookup and not full_export:
+        probe = get_statistics(database_name, table_name, [previous[1]])
+        if probe and probe[0].get('AnalyzedTime') and probe[0]['AnalyzedTime'].timestamp() == previous[0]:
+            return None
+    statistics = []
+    for i in range(0, len(column_names), max_columns_per_lookup):
+        statistics.extend(get_statistics(database_name, table_name, column_names[i:i + max_columns_per_lookup]))
+    return statistics
+ 
+def export_statistics(file_path, max_threads=None):
+    """
+    Export the column statistics of every table in the column list into the
+    SQLite store, fetching tables concurrently and writing results as they
+    arrive. Tables no longer in the list are removed from the store.
+    """
+    max_threads = max_threads or controller.max_concurrency
+    store = StatisticsStore(output_file)
+    previous = store.exported_tables()
+    seen = set()
+    counts = {'exported': 0, 'unchanged': 0, 'failed': 0, 'columns': 0}
+ 
+    def tables():
+        for database_name, table_name, column_names in read_tables(file_path):
+            seen.add((database_name, table_name))
+            yield database_name, table_name, column_names, previous.get((database_name, table_name))
+ 
+    def on_error(item, e):
+        counts['failed'] += 1
+        logging.error(f"Error exporting column statistics for {item[0]}.{item[1]}: {e}")
+ 
+    try:
+        with ThreadPoolExecutor(max_threads) as executor:
+            for (database_name, table_name, column_names, _), statistics in bounded_map(
+                    executor, fetch_table, tables(), 2 * max_threads, on_error):
+                if statistics is None:
+                    if (database_name, table_name) in previous:
+                        store.touch_table(database_name, table_name)
+                        counts['unchanged'] += 1
+                    continue
+                store.save_table(database_name, table_name, len(column_names), statistics)
+                counts['exported'] += 1
+                counts['columns'] += len(statistics)
+        removed = store.prune(seen)
+        if removed:
+            logging.info(f"Removed {removed} tables no longer in {file_path} from {output_file}")
+        if parquet_file:
+            logging.info(f"Wrote {store.write_parquet(parquet_file)} rows to {parquet_file}")
+    except FileNotFoundError:
+        logging.error(f"Input file not found: {file_path}")
+    finally:
+        store.close()
+    logging.info(f"Export results: {counts}")
+ 
+def main():
+    logging.info("Starting column statistics export")
+    export_statistics(input_file)
+    logging.info(connection_report())
+    logging.info(get_metrics().summary())
+    logging.info("Processing complete")
+ 
+if __name__ == '__main__':
+    setup_logging()
+    main()
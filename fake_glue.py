@@ -0,0 +1,332 @@
+"""
+Local stand-in for the Glue and Lake Formation APIs used by these scripts.
+ 
+Serves a synthetic catalog over HTTP with configurable latency, throttling and
+shape, so runs can be measured without touching a real account. Point boto3 at
+it with AWS_ENDPOINT_URL=http://127.0.0.1:<port>.
+ 
+    python fake_glue.py --port 8111 --databases 20 --tables 500 --columns 30 --skew 1.0
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+ 
+PAGE_SIZE = 100
+ 
+ 
+class FakeCatalog:
+    """Synthetic catalog; databases get tables in proportion to 1 / (rank + 1) ** skew."""
+ 
+    def __init__(self, databases=10, tables=100, columns=20, skew=0.0, scheduled_fraction=0.5,
+                 stats_fraction=0.3, granted_fraction=0.0, entry_failure_rate=0.0, seed=0, run_seconds=1.0,
+                 max_runs=None):
+        rng = random.Random(seed)
+        weights = [1.0 / (rank + 1) ** skew for rank in range(databases)]
+        total = tables * databases
+        self.tables = {}
+        for rank, weight in enumerate(weights):
+            database_name = f"db_{rank:04d}"
+            count = max(1, round(total * weight / sum(weights)))
+            self.tables[database_name] = [f"table_{i:06d}" for i in range(count)]
+        self.columns = [f"col_{i:04d}" for i in range(columns)]
+        self.update_time = 1700000000
+        self.schedules = {}
+        self.task_settings = {}
+        self.stats = {}
+        self.grants = set()
+        self.entry_failure_rate = entry_failure_rate  # Share of batch entries failed with a transient error
+        self.runs = {}
+        self.run_seconds = run_seconds  # Mean duration of an on-demand column statistics run
+        self.max_runs = max_runs  # Concurrent runs allowed before ResourceNumberLimitExceededException
+        for database_name, table_names in self.tables.items():
+            for table_name in table_names:
+                key = (database_name, table_name)
+                if rng.random() < scheduled_fraction:
+                    self.schedules[key] = 'SCHEDULED'
+                self.stats[key] = {column for column in self.columns if rng.random() < stats_fraction}
+                if rng.random() < granted_fraction:
+                    self.grants.add(key)
+        self.lock = threading.Lock()
+ 
+    def table(self, database_name, table_name):
+        location = f"s3://bucket/{database_name}/{table_name}/"
+        return {
+            'Name': table_name,
+            'DatabaseName': database_name,
+            'Owner': 'hadoop',
+            'CreateTime': self.update_time,
+            'UpdateTime': self.update_time,
+            'Retention': 0,
+            'TableType': 'EXTERNAL_TABLE',
+            'StorageDescriptor': {
+                'Columns': [{'Name': column, 'Type': 'string'} for column in self.columns],
+                'Location': location,
+                'InputFormat': 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat',
+                'OutputFormat': 'org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat',
+                'Compressed': False,
+                'NumberOfBuckets': -1,
+                'SerdeInfo': {'SerializationLibrary': 'org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe',
+                              'Parameters': {'serialization.format': '1'}},
+                'Parameters': {'classification': 'parquet', 'compressionType': 'none', 'typeOfData': 'file'},
+                'StoredAsSubDirectories': False,
+            },
+            'PartitionKeys': [],
+            'Parameters': {'classification': 'parquet', 'EXTERNAL': 'TRUE', 'CrawlerSchemaSerializerVersion': '1.0',
+                           'CrawlerSchemaDeserializerVersion': '1.0', 'averageRecordSize': '100',
+                           'objectCount': '10', 'recordCount': '1000', 'sizeKey': '100000'},
+            'CreatedBy': 'arn:aws:sts::123456789012:assumed-role/crawler/AWS-Crawler',
+            'IsRegisteredWithLakeFormation': False,
+            'CatalogId': '123456789012',
+            'VersionId': '1',
+        }
+ 
+    def run_status(self, run):
+        """Advance a run by the time since it started; on success its table gets statistics for every column."""
+        elapsed = time.time() - run['StartTime']
+        if run['Status'] in ('STARTING', 'RUNNING') and elapsed >= run['duration']:
+            run['Status'] = 'SUCCEEDED'
+            run['EndTime'] = run['StartTime'] + run['duration']
+            self.stats[(run['DatabaseName'], run['TableName'])] = set(self.columns)
+        elif run['Status'] == 'STARTING' and elapsed >= run['duration'] / 4:
+            run['Status'] = 'RUNNING'
+        return {k: v for k, v in run.items() if k != 'duration'}
+ 
+ 
+class ApiError(Exception):
+    def __init__(self, code, message='', status=400):
+        super().__init__(message)
+        self.code = code
+        self.status = status
+ 
+ 
+def page(items, token, size=PAGE_SIZE):
+    start = int(token or 0)
+    end = start + size
+    return items[start:end], (str(end) if end < len(items) else None)
+ 
+ 
+def glue_operation(catalog, operation, body):
+    database_name = body.get('DatabaseName')
+    table_name = body.get('TableName') or body.get('Name')
+    key = (database_name, table_name)
+    if operation == 'GetColumnStatisticsTaskRun':
+        with catalog.lock:
+            if body.get('ColumnStatisticsTaskRunId') not in catalog.runs:
+                raise ApiError('EntityNotFoundException', 'No such column statistics task run')
+            return {'ColumnStatisticsTaskRun': catalog.run_status(catalog.runs[body['ColumnStatisticsTaskRunId']])}
+    if operation == 'GetDatabases':
+        names, token = page(sorted(catalog.tables), body.get('NextToken'))
+        return {'DatabaseList': [{'Name': name} for name in names], 'NextToken': token}
+    if database_name is not None and database_name not in catalog.tables:
+        raise ApiError('EntityNotFoundException', f"Database {database_name} not found")
+    if operation == 'GetTables':
+        names = catalog.tables[database_name]
+        if body.get('Expression'):
+            names = [name for name in names if re.search(body['Expression'], name)]
+        names, token = page(names, body.get('NextToken'), body.get('MaxResults') or PAGE_SIZE)
+        tables = [catalog.table(database_name, name) for name in names]
+        if body.get('AttributesToGet'):
+            keys = {{'NAME': 'Name', 'TABLE_TYPE': 'TableType'}[attribute] for attribute in body['AttributesToGet']}
+            tables = [{key: value for key, value in table.items() if key in keys} for table in tables]
+        return {'TableList': tables, 'NextToken': token}
+    if table_name is not None and table_name not in catalog.tables[database_name]:
+        raise ApiError('EntityNotFoundException', f"Table {database_name}.{table_name} not found")
+    if operation == 'GetTable':
+        return {'Table': catalog.table(database_name, table_name)}
+    if operation == 'GetColumnStatisticsTaskSettings':
+        if key not in catalog.schedules:
+            raise ApiError('EntityNotFoundException', 'No column statistics task settings')
+        return {'ColumnStatisticsTaskSettings': {
+            'DatabaseName': database_name, 'TableName': table_name,
+            'Schedule': {'ScheduleExpression': 'cron(0 0 5 * ? *)', 'State': catalog.schedules[key]}}}
+    if operation == 'CreateColumnStatisticsTaskSettings':
+        with catalog.lock:
+            catalog.schedules[key] = 'SCHEDULED'
+            catalog.task_settings[key] = {k: body[k] for k in ('ColumnNameList', 'SampleSize') if k in body}
+        return {}
+    if operation == 'UpdateColumnStatisticsTaskSettings':
+        if key not in catalog.schedules:
+            raise ApiError('EntityNotFoundException', 'No column statistics task settings')
+        with catalog.lock:
+            catalog.task_settings.setdefault(key, {}).update({k: body[k] for k in ('ColumnNameList', 'SampleSize') if k in body})
+        return {}
+    if operation in ('StopColumnStatisticsTaskRunSchedule', 'StartColumnStatisticsTaskRunSchedule'):
+        if key not in catalog.schedules:
+            raise ApiError('EntityNotFoundException', 'No column statistics task settings')
+        with catalog.lock:
+            catalog.schedules[key] = 'NOT_SCHEDULED' if operation.startswith('Stop') else 'SCHEDULED'
+        return {}
+    if operation == 'StartColumnStatisticsTaskRun':
+        with catalog.lock:
+            active = [run for run in catalog.runs.values()
+                      if catalog.run_status(run)['Status'] in ('STARTING', 'RUNNING')]
+            if any((run['DatabaseName'], run['TableName']) == key for run in active):
+                raise ApiError('ColumnStatisticsTaskRunningException', f"A run is already in progress for {database_name}.{table_name}")
+            if catalog.max_runs is not None and len(active) >= catalog.max_runs:
+                raise ApiError('ResourceNumberLimitExceededException', 'Too many concurrent column statistics task runs')
+            run_id = f"run-{len(catalog.runs) + 1:08d}"
+            catalog.runs[run_id] = {
+                'ColumnStatisticsTaskRunId': run_id, 'DatabaseName': database_name, 'TableName': table_name,
+                'Role': body.get('Role'), 'Status': 'STARTING', 'StartTime': time.time(),
+                'duration': max(0.0, random.gauss(catalog.run_seconds, catalog.run_seconds / 4)),
+            }
+        return {'ColumnStatisticsTaskRunId': run_id}
+    if operation == 'GetColumnStatisticsTaskRuns':
+        with catalog.lock:
+            runs = [catalog.run_status(run) for run in catalog.runs.values()
+                    if (run['DatabaseName'], run['TableName']) == key]
+        runs, token = page(runs[::-1], body.get('NextToken'), body.get('MaxResults') or PAGE_SIZE)
+        return {'ColumnStatisticsTaskRuns': runs, 'NextToken': token}
+    if operation == 'GetColumnStatisticsForTable':
+        found = [name for name in body.get('ColumnNames', []) if name in catalog.stats[key]]
+        return {
+            'ColumnStatisticsList': [{'ColumnName': name, 'ColumnType': 'string', 'AnalyzedTime': catalog.update_time,
+                                      'StatisticsData': {'Type': 'STRING', 'StringColumnStatisticsData': {
+                                          'MaximumLength': 10, 'AverageLength': 5.0,
+                                          'NumberOfNulls': 0, 'NumberOfDistinctValues': 10}}}
+                                     for name in found],
+            'Errors': [],
+        }
+    if operation == 'DeleteColumnStatisticsForTable':
+        with catalog.lock:
+            if body.get('ColumnName') not in catalog.stats[key]:
+                raise ApiError('EntityNotFoundException', 'No statistics for column')
+            catalog.stats[key].discard(body.get('ColumnName'))
+        return {}
+    raise ApiError('InvalidInputException', f"{operation} is not supported by the fake endpoint")
+ 
+ 
+def lakeformation_operation(catalog, operation, body):
+    if operation == 'GrantPermissions':
+        resource = body.get('Resource', {}).get('Table', {})
+        with catalog.lock:
+            catalog.grants.add((resource.get('DatabaseName'), resource.get('Name')))
+        return {}
+    if operation == 'BatchGrantPermissions':
+        failures = []
+        for entry in body.get('Entries', []):
+            resource = entry.get('Resource', {}).get('Table', {})
+            if random.random() < catalog.entry_failure_rate:
+                failures.append({'RequestEntry': {'Id': entry['Id']},
+                                 'Error': {'ErrorCode': 'ConcurrentModificationException', 'ErrorMessage': 'Try again'}})
+                continue
+            with catalog.lock:
+                catalog.grants.add((resource.get('DatabaseName'), resource.get('Name')))
+        return {'Failures': failures}
+    if operation == 'ListPermissions':
+        with catalog.lock:
+            grants = sorted(catalog.grants)
+        permissions = ['SELECT', 'DESCRIBE', 'INSERT', 'ALTER', 'DELETE', 'DROP']
+        principal = body.get('Principal', {})
+        grants, token = page(grants, body.get('NextToken'), body.get('MaxResults') or PAGE_SIZE)
+        return {'PrincipalResourcePermissions': [
+            {'Principal': principal, 'Resource': {'Table': {'DatabaseName': database_name, 'Name': table_name}},
+             'Permissions': permissions, 'PermissionsWithGrantOption': permissions}
+            for database_name, table_name in grants], 'NextToken': token}
+    raise ApiError('InvalidInputException', f"{operation} is not supported by the fake endpoint")
+ 
+ 
+class FakeGlueServer(ThreadingHTTPServer):
+    """HTTP server answering Glue (awsJson) and Lake Formation (restJson) calls."""
+ 
+    daemon_threads = True
+ 
+    def __init__(self, port=0, catalog=None, latency=0.02, jitter=0.01, throttle_rate=0.0):
+        super().__init__(('127.0.0.1', port), FakeGlueHandler)
+        self.catalog = catalog or FakeCatalog()
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.calls = {}
+        self.throttled = 0
+        self.response_bytes = 0
+        self.calls_lock = threading.Lock()
+ 
+    @property
+    def endpoint_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+ 
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name='fake-glue', daemon=True)
+        thread.start()
+        return self
+ 
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+ 
+ 
+class FakeGlueHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # Headers and body are separate writes; avoid delayed-ACK stalls
+ 
+    def log_message(self, format, *args):
+        pass
+ 
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        target = self.headers.get('X-Amz-Target')
+        if target:
+            operation, handler = target.split('.', 1)[1], glue_operation
+        else:
+            operation, handler = self.path.strip('/').split('?')[0], lakeformation_operation
+        with server.calls_lock:
+            server.calls[operation] = server.calls.get(operation, 0) + 1
+        time.sleep(max(0.0, random.gauss(server.latency, server.jitter)))
+        try:
+            if random.random() < server.throttle_rate:
+                with server.calls_lock:
+                    server.throttled += 1
+                raise ApiError('ThrottlingException', 'Rate exceeded')
+            status, payload = 200, handler(server.catalog, operation, body)
+            payload = {k: v for k, v in payload.items() if v is not None}
+        except ApiError as e:
+            status, payload = e.status, {'__type': e.code, 'message': str(e)}
+        data = json.dumps(payload).encode()
+        with server.calls_lock:
+            server.response_bytes += len(data)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/x-amz-json-1.1')
+        if status != 200:
+            self.send_header('x-amzn-ErrorType', payload['__type'])
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+ 
+ 
+def add_catalog_arguments(parser):
+    parser.add_argument('--databases', type=int, default=10)
+    parser.add_argument('--tables', type=int, default=100, help='Average tables per database')
+    parser.add_argument('--columns', type=int, default=20, help='Columns per table')
+    parser.add_argument('--skew', type=float, default=0.0, help='Zipf exponent for tables per database; 0 is uniform')
+    parser.add_argument('--scheduled-fraction', type=float, default=0.5)
+    parser.add_argument('--stats-fraction', type=float, default=0.3, help='Fraction of columns with statistics')
+    parser.add_argument('--granted-fraction', type=float, default=0.0, help='Fraction of tables with Lake Formation grants already in place')
+    parser.add_argument('--run-seconds', type=float, default=1.0, help='Mean duration of an on-demand statistics run')
+    parser.add_argument('--max-runs', type=int, help='Concurrent statistics runs allowed before the endpoint refuses more')
+    parser.add_argument('--latency', type=float, default=0.02, help='Mean seconds per call')
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of calls answered with ThrottlingException')
+ 
+ 
+def server_from_args(args, port=0):
+    catalog = FakeCatalog(args.databases, args.tables, args.columns, args.skew, args.scheduled_fraction,
+                          args.stats_fraction, args.granted_fraction, args.throttle_rate,
+                          run_seconds=args.run_seconds, max_runs=args.max_runs)
+    return FakeGlueServer(port, catalog, args.latency, args.jitter, args.throttle_rate)
+ 
+ 
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local Glue and Lake Formation stand-in')
+    parser.add_argument('--port', type=int, default=8111)
+    add_catalog_arguments(parser)
+    args = parser.parse_args()
+    server = server_from_args(args, args.port)
+    print(f"Serving fake Glue at {server.endpoint_url}")
+    server.serve_forever()
@@ -0,0 +1,388 @@
+"""
+Single entry point for the Glue column statistics scripts.
+ 
+    python gluestats.py [--region REGION] <command> [options] [+ <command> [options] ...]
+ 
+Commands: crawl, columns, create, apply-policy, pause, resume, run,
+export-stats, delete-schedule, delete-stats, convert, restore, daemon, submit.
+Each command imports only the script it runs, and AWS clients are built on
+first use from one shared session, so several commands joined with "+" run
+in one process without paying session setup again. A per-API call summary
+is printed to stderr at the end, and --metrics-json and --metrics-textfile
+also write it to files. Backups of earlier outputs are kept deduplicated
+under each command's bkp_log directory; --backup-keep and
+--backup-max-age-days set their retention. API call rates start from --rate
+and grow up to --max-rate while nothing is throttled, halving when Glue
+throttles. daemon keeps one such process running and serves jobs on a Unix
+socket; submit runs a command in it for a few tables without paying startup
+or a crawl (see job_daemon).
+"""
+import argparse
+import json
+import logging
+import sys
+ 
+import aws_clients
+import backups
+from metrics import get_metrics
+ 
+ 
+def catalog_filter(args):
+    from catalog_filter import CatalogFilter
+    return CatalogFilter(args.databases, args.exclude_databases, args.tables, args.exclude_tables)
+ 
+ 
+def add_filter_arguments(parser):
+    parser.add_argument('--database', dest='databases', action='append', default=[],
+                        help='Only databases matching this glob pattern; may be repeated')
+    parser.add_argument('--exclude-database', dest='exclude_databases', action='append', default=[],
+                        help='Skip databases matching this glob pattern; may be repeated')
+    parser.add_argument('--table', dest='tables', action='append', default=[],
+                        help='Only tables matching this glob pattern, filtered by Glue; may be repeated')
+    parser.add_argument('--exclude-table', dest='exclude_tables', action='append', default=[],
+                        help='Skip tables matching this glob pattern; may be repeated')
+ 
+ 
+def run_crawl(args):
+    import listallgluetables
+    # Resolved before logging starts, so the log goes to the base path unless --log-file is given
+    listallgluetables.set_base_path(args.base_path or listallgluetables.base_path)
+    if args.log_file:
+        listallgluetables.log_file = args.log_file
+    listallgluetables.catalog_filter = catalog_filter(args)
+    listallgluetables.names_only = args.names_only
+    listallgluetables.setup_logging()
+    listallgluetables.main(shards=args.shards)
+ 
+ 
+def run_columns(args):
+    import listallgluecolumn
+    for name in ('output_file', 'table_index_file', 'index_file', 'log_file'):
+        if getattr(args, name):
+            setattr(listallgluecolumn, name, getattr(args, name))
+    listallgluecolumn.catalog_filter = catalog_filter(args)
+    listallgluecolumn.setup_logging()
+    listallgluecolumn.main(max_workers=args.workers, snapshot=not args.per_table, shards=args.shards)
+ 
+ 
+def run_create(args):
+    import create_column_stats_threaded
+    if args.base_path:
+        create_column_stats_threaded.set_base_path(args.base_path)
+    for name in ('source_file_path', 'existing_file_path', 'role_arn', 'catalog_id', 'policy_file_path',
+                 'catalog_index_path'):
+        if getattr(args, name, None):
+            setattr(create_column_stats_threaded, name, getattr(args, name))
+    if getattr(args, 'per_table_grants', False):
+        create_column_stats_threaded.batch_grants = False
+    create_column_stats_threaded.main(action=args.command, dry_run=getattr(args, 'dry_run', False))
+ 
+ 
+def run_pause(args):
+    import pausegluecolumnstats
+    if args.base_path:
+        pausegluecolumnstats.set_base_path(args.base_path)
+    for name in ('input_file', 'state_file', 'log_file', 'catalog_index_path'):
+        if getattr(args, name, None):
+            setattr(pausegluecolumnstats, name, getattr(args, name))
+    pausegluecolumnstats.setup_logging()
+    pausegluecolumnstats.main(action=args.command)
+ 
+ 
+def run_stats_runs(args):
+    import runcolumnstats
+    for name in ('input_file', 'state_file', 'log_file', 'role_arn', 'catalog_id', 'concurrency', 'poll_interval'):
+        if getattr(args, name) is not None:
+            setattr(runcolumnstats, name, getattr(args, name))
+    runcolumnstats.setup_logging()
+    runcolumnstats.main()
+ 
+ 
+def run_export_stats(args):
+    import exportcolumnstats
+    for name in ('input_file', 'output_file', 'parquet_file', 'log_file', 'catalog_id'):
+        if getattr(args, name) is not None:
+            setattr(exportcolumnstats, name, getattr(args, name))
+    exportcolumnstats.full_export = args.full
+    exportcolumnstats.setup_logging()
+    exportcolumnstats.main()
+ 
+ 
+def run_delete_schedule(args):
+    import deleteschedulforcolumnstats
+    if args.base_path:
+        deleteschedulforcolumnstats.set_base_path(args.base_path)
+    for name in ('source_file_path', 'table_index_path', 'catalog_index_path'):
+        if getattr(args, name):
+            setattr(deleteschedulforcolumnstats, name, getattr(args, name))
+    deleteschedulforcolumnstats.table_index_given = bool(args.table_index_path)
+    deleteschedulforcolumnstats.main()
+ 
+ 
+def run_delete_stats(args):
+    import remove_table_column_statistics
+    if args.base_path:
+        remove_table_column_statistics.set_base_path(args.base_path)
+    for name in ('source_file_path', 'catalog_id'):
+        if getattr(args, name):
+            setattr(remove_table_column_statistics, name, getattr(args, name))
+    remove_table_column_statistics.main()
+ 
+ 
+def run_convert(args):
+    import inventory
+    rows = inventory.convert(args.source, args.destination,
+                             on_invalid=lambda line: print(f"Skipping invalid line: {line}", file=sys.stderr))
+    print(f"Wrote {rows} rows to {args.destination}", file=sys.stderr)
+ 
+ 
+def run_restore(args):
+    store = backups.BackupStore(args.backup_dir)
+    if not args.name:
+        for snapshot in store.snapshots():
+            files = store.manifest(snapshot)['files']
+            print(f"{snapshot}: " + ", ".join(f"{entry['name']} ({entry['size']} bytes)" for entry in files))
+        return
+    store.restore(args.name, args.destination or args.name, args.snapshot)
+    print(f"Restored {args.name} to {args.destination or args.name}", file=sys.stderr)
+ 
+ 
+def run_daemon(args):
+    import job_daemon
+    for name in ('cache_ttl', 'keep_jobs'):
+        if getattr(args, name) is not None:
+            setattr(job_daemon, name, getattr(args, name))
+    job_daemon.JobDaemon(args.socket, args.work_dir).serve_forever()
+ 
+ 
+def run_submit(args):
+    import job_daemon
+    from pipeline import read_rows
+    if args.job_command == 'status':
+        for event in job_daemon.submit(args.socket, {'command': 'status'}):
+            print(json.dumps(event, indent=1))
+        return
+    tables = list(args.targets)
+    if args.tables_file:
+        tables += [f"{database_name}.{table_name}" for database_name, table_name in read_rows(
+            args.tables_file, 2, on_invalid=lambda line: print(f"Skipping invalid line: {line}", file=sys.stderr))]
+    request = {'command': args.job_command, 'tables': tables, 'args': args.job_args, 'refresh': args.refresh}
+    if args.follow:
+        request = {'follow': args.follow}
+    state = None
+    for event in job_daemon.submit(args.socket, request):
+        if event['event'] == 'progress':
+            print(event['message'])
+        elif event['event'] == 'queued':
+            print(f"Job {event['job']} queued with {event['ahead']} ahead of it", file=sys.stderr)
+        elif event['event'] == 'done':
+            state = event['state']
+            calls = sum(event['calls'].values())
+            print(f"Job {event['job']} {state} in {event['seconds']:.3f}s with {calls} AWS calls"
+                  + (f": {event['error']}" if event.get('error') else ''), file=sys.stderr)
+        elif event['event'] == 'error':
+            print(f"Daemon refused the job: {event['error']}", file=sys.stderr)
+    if state != 'succeeded':
+        sys.exit(1)
+ 
+ 
+def parse_rate(value):
+    """(api, (rate, burst)) from API=RATE; the burst is twice the rate."""
+    operation, _, rate = value.partition('=')
+    try:
+        rate = float(rate)
+    except ValueError:
+        rate = 0
+    if not operation or rate <= 0:
+        raise argparse.ArgumentTypeError(f"expected API=RATE with a positive rate, got {value!r}")
+    return operation, (rate, 2 * rate)
+ 
+ 
+def build_parser():
+    parser = argparse.ArgumentParser(prog='gluestats', description='Glue column statistics tools')
+    parser.add_argument('--region', help='AWS region for every client (default: AWS_DEFAULT_REGION or the AWS config, then us-east-1)')
+    parser.add_argument('--metrics-json', help='Write per-API call metrics to this JSON file at the end of the run')
+    parser.add_argument('--metrics-textfile', help='Write per-API call metrics in Prometheus text format, e.g. for the node exporter')
+    parser.add_argument('--backup-keep', type=int, help='Backup snapshots to keep (default: 10)')
+    parser.add_argument('--backup-max-age-days', type=float, help='Delete backup snapshots older than this (default: 30)')
+    parser.add_argument('--rate', dest='rates', action='append', default=[], type=parse_rate, metavar='API=RATE',
+                        help='Starting calls per second for an API, e.g. get_tables=30, or default=50 for every '
+                             'API not listed; may be repeated')
+    parser.add_argument('--max-rate', type=float,
+                        help='Calls per second each API rate may grow to while nothing is throttled '
+                             '(default: 200; 0 keeps the starting rates fixed)')
+    commands = parser.add_subparsers(dest='command', required=True)
+ 
+    crawl = commands.add_parser('crawl', help='List all tables and check their column statistics schedules')
+    crawl.add_argument('--base-path', help='Directory for all_table_list.txt and the missing/existing stats lists')
+    crawl.add_argument('--log-file')
+    crawl.add_argument('--shards', type=int, default=1, help='Processes to hash-shard databases across')
+    crawl.add_argument('--names-only', action='store_true',
+                       help='List only table names and types instead of full Table definitions')
+    add_filter_arguments(crawl)
+    crawl.set_defaults(func=run_crawl)
+ 
+    columns = commands.add_parser('columns', help='List every column of every table')
+    columns.add_argument('--output', dest='output_file', help='Column list to write')
+    columns.add_argument('--table-index', dest='table_index_file', help='Sorted table list to write')
+    columns.add_argument('--catalog-index', dest='index_file', help='SQLite catalog index')
+    columns.add_argument('--log-file')
+    columns.add_argument('--workers', type=int, help='Worker threads shared by all databases (default: rate controller concurrency)')
+    columns.add_argument('--shards', type=int, default=1, help='Processes to hash-shard databases across')
+    columns.add_argument('--per-table', action='store_true', help='Call get_table for each table instead of reading get_tables pages')
+    add_filter_arguments(columns)
+    columns.set_defaults(func=run_columns)
+ 
+    create = commands.add_parser('create', help='Grant permissions and create column statistics task settings')
+    create.add_argument('--base-path', help='Working directory for the migration file, backups and log')
+    create.add_argument('--source', dest='source_file_path', help='missing_glue_stats.txt produced by crawl')
+    create.add_argument('--existing', dest='existing_file_path', help='existing_glue_stats.txt produced by crawl, to plan around')
+    create.add_argument('--role-arn')
+    create.add_argument('--catalog-id')
+    create.add_argument('--policy', dest='policy_file_path', help='JSON rules choosing columns and sample size per table')
+    create.add_argument('--catalog-index', dest='catalog_index_path',
+                        help='Catalog index of the crawl, whose cached schedule state is dropped for the tables changed (default: next to the input list)')
+    create.add_argument('--per-table-grants', action='store_true',
+                        help='Call grant_permissions for every table instead of batching only missing grants')
+    create.set_defaults(func=run_create)
+ 
+    apply_policy = commands.add_parser('apply-policy', help='Update existing column statistics tasks to match a policy')
+    apply_policy.add_argument('--policy', dest='policy_file_path', required=True, help='JSON rules choosing columns and sample size per table')
+    apply_policy.add_argument('--base-path', help='Directory for the log')
+    apply_policy.add_argument('--existing', dest='existing_file_path', help='existing_glue_stats.txt produced by crawl')
+    apply_policy.add_argument('--catalog-id')
+    apply_policy.add_argument('--dry-run', action='store_true', help='Log the changes without making them')
+    apply_policy.set_defaults(func=run_create)
+ 
+    pause = commands.add_parser('pause', help='Stop active column statistics task run schedules, recording their state')
+    pause.add_argument('--base-path', help='Directory of the crawl, whose all_table_list.txt is paused by default')
+    pause.add_argument('--input', dest='input_file', help='Table list with database,table rows')
+    pause.add_argument('--state-file', help='File recording each table\'s schedule state before the pause')
+    pause.add_argument('--log-file')
+    pause.add_argument('--catalog-index', dest='catalog_index_path',
+                       help='Catalog index of the crawl, whose cached schedule state is dropped for the tables changed (default: next to the input list)')
+    pause.set_defaults(func=run_pause)
+ 
+    resume = commands.add_parser('resume', help='Restart the schedules a pause stopped')
+    resume.add_argument('--base-path', help='Directory of the crawl, whose catalog index is updated by default')
+    resume.add_argument('--state-file', help='State file written by pause')
+    resume.add_argument('--log-file')
+    resume.add_argument('--catalog-index', dest='catalog_index_path',
+                        help='Catalog index of the crawl, whose cached schedule state is dropped for the tables changed (default: next to the input list)')
+    resume.set_defaults(func=run_pause)
+ 
+    run = commands.add_parser('run', help='Run column statistics now for every listed table, a bounded number at a time')
+    run.add_argument('--input', dest='input_file', help='Table list with database,table rows, e.g. missing_glue_stats.txt')
+    run.add_argument('--state-file', help='File recording every run, so a restart continues where it stopped')
+    run.add_argument('--log-file')
+    run.add_argument('--role-arn')
+    run.add_argument('--catalog-id')
+    run.add_argument('--concurrency', type=int, help='Runs kept in progress (default: 10)')
+    run.add_argument('--poll-interval', type=float, help='Seconds between polls of the runs in progress (default: 30)')
+    run.set_defaults(func=run_stats_runs)
+ 
+    export_stats = commands.add_parser('export-stats', help='Export the computed column statistics of every listed column to SQLite')
+    export_stats.add_argument('--input', dest='input_file', help='Column list produced by columns')
+    export_stats.add_argument('--output', dest='output_file', help='SQLite file to create or update (default: column_statistics.db)')
+    export_stats.add_argument('--parquet', dest='parquet_file', help='Also write every exported row to this Parquet file (needs pyarrow)')
+    export_stats.add_argument('--log-file')
+    export_stats.add_argument('--catalog-id')
+    export_stats.add_argument('--full', action='store_true', help='Fetch every table, not only those analyzed since the last export')
+    export_stats.set_defaults(func=run_export_stats)
+ 
+    delete_schedule = commands.add_parser('delete-schedule', help='Stop column statistics schedules for every listed table')
+    delete_schedule.add_argument('--base-path', help='Directory for backups and the log')
+    delete_schedule.add_argument('--source', dest='source_file_path', help='Column list produced by columns')
+    delete_schedule.add_argument('--table-index', dest='table_index_path', help='Table list produced by columns')
+    delete_schedule.add_argument('--catalog-index', dest='catalog_index_path',
+                                 help='Catalog index of the crawl, whose cached schedule state is dropped for the tables changed (default: next to the input list)')
+    delete_schedule.set_defaults(func=run_delete_schedule)
+ 
+    delete_stats = commands.add_parser('delete-stats', help='Delete column statistics for every listed column')
+    delete_stats.add_argument('--base-path', help='Directory for the log and resume journal')
+    delete_stats.add_argument('--source', dest='source_file_path', help='Column list with database,table,column rows')
+    delete_stats.add_argument('--catalog-id')
+    delete_stats.set_defaults(func=run_delete_stats)
+ 
+    convert = commands.add_parser('convert', help='Convert a table or column list between text, compact and Parquet forms')
+    convert.add_argument('source', help='Text, compact or Parquet list; every command reads all three')
+    convert.add_argument('destination', help='.csv or .txt for text, .parquet for Parquet (needs pyarrow), anything else compact')
+    convert.set_defaults(func=run_convert)
+ 
+    restore = commands.add_parser('restore', help='List backup snapshots, or restore a file from one')
+    restore.add_argument('--backup-dir', required=True, help='bkp_log directory of the command that made the backup')
+    restore.add_argument('--snapshot', help='Snapshot to restore from (default: the newest)')
+    restore.add_argument('name', nargs='?', help='File name or original path to restore; omit to list the snapshots')
+    restore.add_argument('destination', nargs='?', help='Where to write the file (default: its name)')
+    restore.set_defaults(func=run_restore)
+ 
+    daemon = commands.add_parser('daemon', help='Serve jobs on a Unix socket, keeping clients and a table cache warm')
+    daemon.add_argument('--socket', default='gluestats.sock', help='Unix socket to listen on (default: gluestats.sock)')
+    daemon.add_argument('--work-dir', default='gluestats_jobs', help='Directory for job inputs, outputs and logs')
+    daemon.add_argument('--cache-ttl', type=float, help='Seconds a cached table definition is used (default: 300)')
+    daemon.add_argument('--keep-jobs', type=int, help='Finished jobs and job directories to keep (default: 100)')
+    daemon.set_defaults(func=run_daemon)
+ 
+    submit = commands.add_parser('submit', help='Run a command in a running daemon and stream its progress')
+    submit.add_argument('--socket', default='gluestats.sock', help='Unix socket of the daemon (default: gluestats.sock)')
+    submit.add_argument('--target', dest='targets', action='append', default=[], metavar='DATABASE.TABLE',
+                        help='Table to run the command for; may be repeated')
+    submit.add_argument('--tables-file', help='Table list with database,table rows to run the command for')
+    submit.add_argument('--refresh', action='store_true', help='Fetch the tables again instead of using the cache')
+    submit.add_argument('--follow', metavar='JOB', help='Stream the progress of a job already submitted')
+    submit.add_argument('job_command', help='gluestats command to run, or status to list the daemon\'s jobs')
+    submit.add_argument('job_args', nargs=argparse.REMAINDER, help='Options of the command')
+    submit.set_defaults(func=run_submit)
+ 
+    return parser
+ 
+ 
+def split_commands(argv):
+    """Split argv on '+' into one argument list per command; global options stay with the first."""
+    commands = [[]]
+    for arg in argv:
+        if arg == '+':
+            commands.append([])
+        else:
+            commands[-1].append(arg)
+    return [command for command in commands if command]
+ 
+ 
+def report_metrics(parsed):
+    """Print the per-API summary for every command run and write the requested metrics files."""
+    metrics = get_metrics()
+    print(metrics.summary(), file=sys.stderr)
+    json_path = next((args.metrics_json for args in parsed if args.metrics_json), None)
+    textfile_path = next((args.metrics_textfile for args in parsed if args.metrics_textfile), None)
+    if json_path:
+        metrics.write_json(json_path)
+    if textfile_path:
+        metrics.write_prometheus(textfile_path)
+ 
+ 
+def main(argv=None):
+    parser = build_parser()
+    command_argvs = split_commands(sys.argv[1:] if argv is None else argv)
+    if not command_argvs:
+        parser.error('a command is required')
+    parsed = [parser.parse_args(command_argv) for command_argv in command_argvs]
+    region = next((args.region for args in parsed if args.region), None)
+    if region:
+        aws_clients.set_region(region)
+    rates = dict(rate for args in parsed for rate in args.rates)
+    max_rate = next((args.max_rate for args in parsed if args.max_rate is not None), None)
+    if rates or max_rate is not None:
+        from rate_control import get_controller
+        get_controller().configure(rates, max_rate)
+    backups.keep = next((args.backup_keep for args in parsed if args.backup_keep is not None), backups.keep)
+    backups.max_age_days = next((args.backup_max_age_days for args in parsed if args.backup_max_age_days is not None),
+                                backups.max_age_days)
+    for args in parsed:
+        args.func(args)
+    if any(args.func not in (run_daemon, run_submit) for args in parsed):
+        report_metrics(parsed)
+    logging.shutdown()
+ 
+ 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+"""
+Compact files for the catalog inventory lists (all_table_list.txt,
+missing_glue_stats.txt, existing_glue_stats.txt, database_table_columns_list.txt).
+ 
+Each field is dictionary-encoded: its distinct values are stored once, sorted
+and zlib-compressed, and every row holds only their ids in fixed-width arrays
+of 1, 2 or 4 bytes. Rows are sorted and distinct, so the rows of a database
+are contiguous. The id arrays are read through mmap, and rows whose ids fail a
+filter are skipped without building any Python strings for them. With
+pyarrow installed, a .parquet path gets a dictionary-encoded Parquet file
+instead.
+ 
+    python gluestats.py convert database_table_columns_list.txt columns.inv
+    python gluestats.py convert columns.inv columns.csv
+"""
+import json
+import mmap
+import os
+import struct
+import zlib
+from array import array
+from itertools import compress
+ 
+MAGIC = b'GSINV\x00\x01\x00'
+PARQUET_MAGIC = b'PAR1'
+DEFAULT_FIELDS = ('DatabaseName', 'TableName', 'ColumnName')
+CHUNK_ROWS = 65536  # Rows decoded per read from the id arrays
+ 
+ 
+def inventory_format(path):
+    """'compact' or 'parquet' for an inventory file, None for plain text or a missing file."""
+    try:
+        with open(path, 'rb') as f:
+            start = f.read(len(MAGIC))
+    except OSError:
+        return None
+    if start == MAGIC:
+        return 'compact'
+    if start.startswith(PARQUET_MAGIC):
+        return 'parquet'
+    return None
+ 
+ 
+def _typecode(size):
+    return 'B' if size <= 1 << 8 else 'H' if size <= 1 << 16 else 'I'
+ 
+ 
+def _test(condition):
+    """A filter given as a predicate or as a collection of allowed values."""
+    if callable(condition):
+        return condition
+    allowed = {condition} if isinstance(condition, str) else set(condition)
+    return allowed.__contains__
+ 
+ 
+def write_compact(path, rows, fields, header=False):
+    """
+    Write (field, ...) rows to a compact inventory file. header records whether
+    the text form has a header line, so export reproduces it.
+    """
+    lookups = [{} for _ in fields]
+    ids = [array('I') for _ in fields]
+    for row in rows:
+        for lookup, column, value in zip(lookups, ids, row):
+            column.append(lookup.setdefault(value, len(lookup)))
+    # Renumber each dictionary in sorted order, so sorting ids sorts the rows
+    values, remaps, sizes = [], [], []
+    for lookup in lookups:
+        ordered = sorted(lookup)
+        remap = array('I', bytes(4 * len(ordered)))
+        for new_id, value in enumerate(ordered):
+            remap[lookup[value]] = new_id
+        values.append(ordered)
+        remaps.append(remap)
+        sizes.append(max(1, len(ordered)))
+    # One mixed-radix integer per row sorts and deduplicates far cheaper than tuples
+    keys = set()
+    for row_ids in zip(*ids):
+        key = 0
+        for size, remap, row_id in zip(sizes, remaps, row_ids):
+            key = key * size + remap[row_id]
+        keys.add(key)
+    del ids
+    keys = sorted(keys)
+    columns = [array(_typecode(size)) for size in sizes]
+    for key in keys:
+        for column, size in zip(reversed(columns), reversed(sizes)):
+            key, row_id = divmod(key, size)
+            column.append(row_id)
+ 
+    # Offsets are relative to the end of the metadata
+    blocks = [zlib.compress('\0'.join(field_values).encode()) for field_values in values]
+    meta = {'fields': list(fields), 'rows': len(keys), 'header': header, 'dictionaries': [], 'ids': []}
+    offset = 0
+    for block, field_values in zip(blocks, values):
+        meta['dictionaries'].append({'offset': offset, 'length': len(block), 'count': len(field_values)})
+        offset += len(block)
+    for column in columns:
+        meta['ids'].append({'offset': offset, 'typecode': column.typecode})
+        offset += len(column) * column.itemsize
+    encoded = json.dumps(meta).encode()
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(MAGIC + struct.pack('<I', len(encoded)) + encoded)
+        for block in blocks:
+            f.write(block)
+        for column in columns:
+            f.write(column.tobytes())
+    os.replace(temp_path, path)
+    return len(keys)
+ 
+ 
+class CompactInventory:
+    """Reader for a compact inventory file; the id arrays stay in the page cache rather than on the heap."""
+ 
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a compact inventory file")
+        (length,) = struct.unpack_from('<I', self.map, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.meta = json.loads(self.map[start:start + length])
+        self.data = start + length
+        self.fields = tuple(self.meta['fields'])
+        self.count = self.meta['rows']
+        self.header = self.meta['header']
+        self._values = [None] * len(self.fields)
+ 
+    def __enter__(self):
+        return self
+ 
+    def __exit__(self, *exc):
+        self.close()
+ 
+    def __len__(self):
+        return self.count
+ 
+    def close(self):
+        self.map.close()
+        self.file.close()
+ 
+    def values(self, field):
+        """Sorted distinct values of a field, by index or name; decompressed on first use."""
+        i = field if isinstance(field, int) else self.fields.index(field)
+        if self._values[i] is None:
+            block = self.meta['dictionaries'][i]
+            offset = self.data + block['offset']
+            data = zlib.decompress(self.map[offset:offset + block['length']]).decode()
+            self._values[i] = data.split('\0') if block['count'] else []
+        return self._values[i]
+ 
+    def _ids(self, i, start, stop):
+        layout = self.meta['ids'][i]
+        itemsize = array(layout['typecode']).itemsize
+        offset = self.data + layout['offset']
+        return array(layout['typecode'], self.map[offset + start * itemsize:offset + stop * itemsize])
+ 
+    def _search(self, value_id, right=False):
+        """First row whose first-field id is >= value_id (> with right), binary searched over the mmap."""
+        layout = self.meta['ids'][0]
+        fmt = '=' + layout['typecode']
+        itemsize = struct.calcsize(fmt)
+        offset = self.data + layout['offset']
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            found = struct.unpack_from(fmt, self.map, offset + mid * itemsize)[0]
+            if found < value_id or (right and found == value_id):
+                low = mid + 1
+            else:
+                high = mid
+        return low
+ 
+    def rows(self, where=None):
+        """
+        Yield rows as tuples of str. where maps fields (index or name) to a
+        value, a collection of values or a predicate; each distinct value is
+        tested once and rows are then filtered on ids. A filter on the first
+        field binary searches its contiguous row ranges instead of scanning.
+        """
+        allowed = {}
+        for field, condition in (where or {}).items():
+            i = field if isinstance(field, int) else self.fields.index(field)
+            test = _test(condition)
+            allowed[i] = {value_id for value_id, value in enumerate(self.values(i)) if test(value)}
+        ranges = [(0, self.count)]
+        if 0 in allowed:
+            ranges = [(self._search(value_id), self._search(value_id, right=True))
+                      for value_id in sorted(allowed.pop(0))]
+        values = [self.values(i) for i in range(len(self.fields))]
+        for start, stop in ranges:
+            for chunk_start in range(start, stop, CHUNK_ROWS):
+                chunk_stop = min(stop, chunk_start + CHUNK_ROWS)
+                columns = [self._ids(i, chunk_start, chunk_stop) for i in range(len(self.fields))]
+                yield from _decode(values, columns, allowed)
+ 
+ 
+def _decode(values, columns, allowed):
+    """Rows of value tuples for columns of ids, keeping those whose ids are all in allowed[field]."""
+    rows = zip(*(map(field_values.__getitem__, ids) for field_values, ids in zip(values, columns)))
+    if not allowed:
+        return rows
+    keep = map(all, zip(*(map(ids.__contains__, columns[i]) for i, ids in allowed.items())))
+    return compress(rows, keep)
+ 
+ 
+def _pyarrow(action):
+    """Import pyarrow on first use, so compact and text inventories load without it."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError(f"{action} Parquet inventory files requires pyarrow") from None
+    return pyarrow
+ 
+ 
+def write_parquet(path, rows, fields, header=False):
+    """Write rows to a dictionary-encoded, zstd-compressed Parquet file; requires pyarrow."""
+    pyarrow = _pyarrow("Writing")
+    rows = sorted(set(rows))
+    columns = [pyarrow.array([row[i] for row in rows], pyarrow.string()).dictionary_encode() for i in range(len(fields))]
+    table = pyarrow.Table.from_arrays(columns, names=list(fields))
+    table = table.replace_schema_metadata({b'gluestats_header': b'1' if header else b'0'})
+    pyarrow.parquet.write_table(table, path, compression='zstd', use_dictionary=True)
+    return len(rows)
+ 
+ 
+def _parquet_rows(path, where=None):
+    pyarrow = _pyarrow("Reading")
+    parquet = pyarrow.parquet.ParquetFile(path)
+    fields = parquet.schema_arrow.names
+    parquet = pyarrow.parquet.ParquetFile(path, read_dictionary=fields)
+    tests = {(field if isinstance(field, int) else fields.index(field)): _test(condition)
+             for field, condition in (where or {}).items()}
+    for batch in parquet.iter_batches(batch_size=CHUNK_ROWS):
+        values = [column.dictionary.to_pylist() for column in batch.columns]
+        columns = [column.indices.to_pylist() for column in batch.columns]
+        allowed = {i: {value_id for value_id, value in enumerate(values[i]) if test(value)} for i, test in tests.items()}
+        yield from _decode(values, columns, allowed)
+ 
+ 
+def read_inventory(path, where=None):
+    """Yield the rows of a compact or Parquet inventory file; see CompactInventory.rows for where."""
+    if inventory_format(path) == 'parquet':
+        yield from _parquet_rows(path, where)
+        return
+    with CompactInventory(path) as inventory:
+        yield from inventory.rows(where)
+ 
+ 
+def inventory_fields(path):
+    """(field names, header) of a compact or Parquet inventory file."""
+    if inventory_format(path) == 'parquet':
+        pyarrow = _pyarrow("Reading")
+        schema = pyarrow.parquet.read_schema(path)
+        return tuple(schema.names), (schema.metadata or {}).get(b'gluestats_header') == b'1'
+    with CompactInventory(path) as inventory:
+        return inventory.fields, inventory.header
+ 
+ 
+def convert(source, destination, on_invalid=None):
+    """
+    Convert an inventory file between text, compact and Parquet forms; the
+    destination form follows its extension: .csv or .txt for text, .parquet
+    for Parquet, anything else compact. Returns the number of rows written.
+    """
+    from pipeline import read_rows
+ 
+    if inventory_format(source):
+        fields, header = inventory_fields(source)
+        rows = read_inventory(source)
+    else:
+        with open(source, 'r') as f:
+            first = f.readline().strip()
+        names = tuple(first.split(','))
+        header = set(names) <= set(DEFAULT_FIELDS)
+        fields = names if header else tuple(DEFAULT_FIELDS[i] if i < len(DEFAULT_FIELDS) else f"Field{i + 1}"
+                                            for i in range(len(names)))
+        rows = read_rows(source, len(fields), on_invalid, header=','.join(fields) if header else None)
+    extension = os.path.splitext(destination)[1].lower()
+    if extension in ('.csv', '.txt'):
+        count = 0
+        with open(destination, 'w') as f:
+            if header:
+                f.write(','.join(fields) + '\n')
+            for row in rows:
+                f.write(','.join(row) + '\n')
+                count += 1
+        return count
+    if extension == '.parquet':
+        return write_parquet(destination, rows, fields, header)
+    return write_compact(destination, rows, fields, header)
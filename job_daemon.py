@@ -0,0 +1,478 @@
+"""
+Long-running gluestats process that keeps its AWS clients, connection pools,
+rate controller state and a cache of table definitions warm between jobs.
+ 
+A job is one JSON line sent to the daemon's Unix domain socket:
+ 
+    {"command": "pause", "tables": ["sales.orders", "sales.items"], "args": ["--state-file", "pause_state.txt"]}
+ 
+command is a gluestats command and args are its options. The listed tables
+are written to the command's input files under the job's directory. Commands
+that take a column list get the column names from the cache, with get_table
+calls only for tables that are not cached; crawl and columns get the tables
+as --database/--table filters. create jobs plan their schedules without
+reading the existing ones unless they pass --existing. Each log line of the
+script comes back as a JSON line as it is written, followed by a final
+"done" line. Jobs run one at a time, in the order they arrive, because the
+scripts keep their settings in module globals. Those globals are restored to
+their defaults before every job.
+ 
+    python gluestats.py daemon --socket /tmp/gluestats.sock --work-dir /var/tmp/gluestats
+    python gluestats.py submit --socket /tmp/gluestats.sock --target sales.orders pause
+"""
+import contextlib
+import importlib
+import inspect
+import itertools
+import json
+import logging
+import os
+import queue
+import shutil
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+ 
+from aws_clients import LazyClient, get_client
+from metrics import get_metrics
+from output_sink import get_sink
+from pipeline import bounded_map, distinct
+from rate_control import get_controller
+ 
+# Scripts whose module globals are reset to their defaults before every job
+SCRIPT_MODULES = ('listallgluetables', 'listallgluecolumn', 'create_column_stats_threaded', 'pausegluecolumnstats',
+                  'runcolumnstats', 'exportcolumnstats', 'deleteschedulforcolumnstats', 'remove_table_column_statistics')
+ 
+# gluestats commands a job can run, and those of them that take a table list
+JOB_COMMANDS = ('crawl', 'columns', 'create', 'apply-policy', 'pause', 'resume', 'run', 'export-stats',
+                'delete-schedule', 'delete-stats', 'convert')
+TABLE_COMMANDS = ('crawl', 'columns', 'create', 'apply-policy', 'pause', 'run', 'export-stats',
+                  'delete-schedule', 'delete-stats')
+ 
+cache_ttl = 300.0  # Seconds a cached table definition is used before get_table is called again
+keep_jobs = 100  # Finished jobs, and their directories, kept for status requests
+ 
+logger = logging.getLogger('gluestats.daemon')
+ 
+ 
+def parse_table(value):
+    """(database, table) from 'database.table' or a [database, table] pair."""
+    if isinstance(value, str):
+        database_name, _, table_name = value.partition('.')
+    else:
+        database_name, table_name = value
+    if not database_name or not table_name:
+        raise ValueError(f"Expected database.table, got {value!r}")
+    return database_name, table_name
+ 
+ 
+class CatalogCache:
+    """
+    Glue Table definitions read with get_table and kept in memory for ttl
+    seconds. Tables that do not exist are cached as None.
+    """
+ 
+    def __init__(self, ttl=None):
+        self.ttl = cache_ttl if ttl is None else ttl
+        self.glue_client = LazyClient('glue')
+        self.controller = get_controller()
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+ 
+    def __len__(self):
+        return len(self.entries)
+ 
+    def table(self, database_name, table_name):
+        """The Glue Table, or None if it does not exist."""
+        key = (database_name, table_name)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and time.monotonic() - entry[0] < self.ttl:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        try:
+            table = self.controller.call(self.glue_client.get_table, DatabaseName=database_name,
+                                         Name=table_name)['Table']
+        except self.glue_client.exceptions.EntityNotFoundException:
+            table = None
+        with self.lock:
+            self.entries[key] = (time.monotonic(), table)
+        return table
+ 
+    def load(self, tables, max_threads=None):
+        """{(database, table): Table or None} for the given tables, fetching those not cached concurrently."""
+        max_threads = max_threads or self.controller.max_concurrency
+        with ThreadPoolExecutor(max_threads) as executor:
+            return dict(bounded_map(executor, self.table, tables, 2 * max_threads,
+                                    lambda item, e: logging.error(f"Failed to read table {item[0]}.{item[1]}: {e}")))
+ 
+    def invalidate(self, tables):
+        with self.lock:
+            for key in tables:
+                self.entries.pop(key, None)
+ 
+ 
+class Job:
+    """One command run by the daemon, with the events a client follows."""
+ 
+    def __init__(self, job_id, command, tables, args, refresh=False):
+        self.id = job_id
+        self.command = command
+        self.tables = tables
+        self.args = args
+        self.refresh = refresh
+        self.state = 'queued'
+        self.seconds = None
+        self.events = []
+        self.dropped = 0  # Events trimmed from the front once the job finished
+        self.condition = threading.Condition()
+ 
+    def emit(self, event, **fields):
+        with self.condition:
+            self.events.append(dict(fields, event=event, job=self.id))
+            self.condition.notify_all()
+ 
+    def finish(self, state, seconds, **fields):
+        self.state = state
+        self.seconds = seconds
+        self.emit('done', state=state, seconds=round(seconds, 3), **fields)
+        with self.condition:
+            if len(self.events) > 1000:
+                self.dropped += len(self.events) - 1000
+                self.events = self.events[-1000:]
+ 
+    def follow(self):
+        """Yield the job's events as they are emitted, ending with its done event."""
+        position = 0
+        while True:
+            with self.condition:
+                while position >= self.dropped + len(self.events):
+                    self.condition.wait()
+                events = self.events[max(0, position - self.dropped):]
+                position = self.dropped + len(self.events)
+            for event in events:
+                yield event
+                if event['event'] == 'done':
+                    return
+ 
+    def describe(self):
+        return {'job': self.id, 'command': self.command, 'tables': len(self.tables), 'state': self.state,
+                'seconds': round(self.seconds, 3) if self.seconds is not None else None}
+ 
+ 
+class _ProgressStream:
+    """Stand-in for stdout and stderr during a job: every complete line printed becomes a progress event."""
+ 
+    def __init__(self, progress):
+        self.progress = progress
+        self.partial = {}
+        self.lock = threading.Lock()
+ 
+    def write(self, text):
+        # Lines are assembled per thread, so concurrent prints are not interleaved
+        thread_id = threading.get_ident()
+        with self.lock:
+            *lines, rest = (self.partial.pop(thread_id, '') + text).split('\n')
+            if rest:
+                self.partial[thread_id] = rest
+        for line in lines:
+            if line:
+                self.progress(line)
+        return len(text)
+ 
+    def flush(self):
+        pass
+ 
+ 
+class _Handler(socketserver.StreamRequestHandler):
+    def send(self, event):
+        self.wfile.write((json.dumps(event, default=str) + '\n').encode())
+        self.wfile.flush()
+ 
+    def handle(self):
+        daemon = self.server.job_daemon
+        try:
+            request = json.loads(self.rfile.readline())
+            if request.get('command') == 'status':
+                self.send(daemon.status())
+                return
+            job = daemon.job(request['follow']) if 'follow' in request else daemon.submit(request)
+        except (ValueError, KeyError, TypeError) as e:
+            self.send({'event': 'error', 'error': str(e)})
+            return
+        try:
+            for event in job.follow():
+                self.send(event)
+        except OSError:
+            logger.info(f"Client stopped following job {job.id}; the job continues")
+ 
+ 
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+ 
+ 
+class JobDaemon:
+    """Accepts jobs on a Unix domain socket and runs them one at a time in this process."""
+ 
+    def __init__(self, socket_path, work_dir, ttl=None):
+        self.socket_path = os.path.abspath(socket_path)
+        self.work_dir = os.path.abspath(work_dir)
+        self.cache = CatalogCache(ttl)
+        self.queue = queue.Queue()
+        self.jobs = {}
+        self.current = None
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.defaults = {}
+        self.stream = _ProgressStream(self.progress)
+ 
+    # Progress
+ 
+    def progress(self, message, level='INFO'):
+        job = self.current
+        if job is not None:
+            job.emit('progress', level=level, message=message)
+ 
+    def _install_record_factory(self):
+        """
+        Turn log records into progress events as they are created. The scripts
+        replace the root logger's handlers when they set up logging, so a
+        handler would not survive, but the record factory does.
+        """
+        previous = logging.getLogRecordFactory()
+ 
+        def factory(*args, **kwargs):
+            record = previous(*args, **kwargs)
+            if self.current is not None and record.name != logger.name:
+                try:
+                    self.progress(record.getMessage(), record.levelname)
+                except Exception:
+                    pass
+            return record
+ 
+        logging.setLogRecordFactory(factory)
+ 
+    # Warm state
+ 
+    def warm(self):
+        """Import every script, remember its default settings, and build and connect its clients."""
+        clients = set()
+        for name in SCRIPT_MODULES:
+            module = importlib.import_module(name)
+            self.defaults[name] = {key: value for key, value in vars(module).items()
+                                   if not key.startswith('_') and not inspect.ismodule(value)
+                                   and not inspect.isfunction(value) and not inspect.isclass(value)}
+            clients.update((value.service_name, value.region_name) for value in vars(module).values()
+                           if isinstance(value, LazyClient))
+        controller = get_controller()
+        for service_name, region_name in sorted(clients, key=str):
+            client = get_client(service_name, region_name)
+            if service_name == 'glue':
+                try:
+                    controller.call(client.get_databases, MaxResults=1)
+                except Exception as e:
+                    logger.warning(f"Warm-up call to {service_name} failed: {e}")
+        logger.info(f"Warmed {len(SCRIPT_MODULES)} scripts and {len(clients)} clients")
+ 
+    def _reset_scripts(self):
+        for name, defaults in self.defaults.items():
+            module = sys.modules[name]
+            for key, value in defaults.items():
+                setattr(module, key, value)
+        sys.modules['create_column_stats_threaded'].table_source = self.cache.table
+ 
+    # Jobs
+ 
+    def submit(self, request):
+        """Validate a job request and queue it; returns the Job."""
+        command = request['command']
+        if command not in JOB_COMMANDS:
+            raise ValueError(f"Unknown command: {command}")
+        args = request.get('args') or []
+        if not isinstance(args, list) or not all(isinstance(arg, str) for arg in args):
+            raise ValueError("args must be a list of strings")
+        tables = list(distinct(parse_table(value) for value in request.get('tables') or []))
+        if tables and command not in TABLE_COMMANDS:
+            raise ValueError(f"{command} does not take a table list")
+        with self.lock:
+            job_id = f"{datetime.now():%Y%m%d_%H%M%S}_{next(self.ids):04d}"
+            job = self.jobs[job_id] = Job(job_id, command, tables, args, bool(request.get('refresh')))
+            finished = [key for key, old in self.jobs.items() if old.state in ('succeeded', 'failed')]
+            for key in finished[:max(0, len(finished) - keep_jobs)]:
+                del self.jobs[key]
+        job.emit('queued', command=command, tables=len(tables), ahead=self.queue.qsize() + (self.current is not None))
+        self.queue.put(job)
+        return job
+ 
+    def job(self, job_id):
+        with self.lock:
+            if job_id not in self.jobs:
+                raise KeyError(f"No job {job_id}")
+            return self.jobs[job_id]
+ 
+    def status(self):
+        with self.lock:
+            jobs = [job.describe() for job in self.jobs.values()]
+        return {'event': 'status', 'uptime_seconds': round(time.monotonic() - self.started, 1), 'jobs': jobs,
+                'cached_tables': len(self.cache), 'cache_hits': self.cache.hits, 'cache_misses': self.cache.misses}
+ 
+    def _write_rows(self, path, rows):
+        with open(path, 'w') as f:
+            for row in rows:
+                f.write(','.join(row) + '\n')
+        return path
+ 
+    def _column_rows(self, job):
+        """database,table,column rows of the job's tables, from the cache."""
+        tables = self.cache.load(job.tables)
+        for database_name, table_name in job.tables:
+            table = tables.get((database_name, table_name))
+            if table is None:
+                self.progress(f"Table {database_name}.{table_name} not found; skipping it", 'WARNING')
+                continue
+            for column_name in sys.modules['listallgluecolumn'].table_columns(table):
+                yield database_name, table_name, column_name
+ 
+    def job_arguments(self, job, job_dir):
+        """
+        Options pointing the command at the job's directory and tables. They
+        come before the job's own args, so options the job gives win.
+        """
+        command = job.command
+        argv = []
+        if command in ('crawl', 'create', 'apply-policy', 'delete-schedule', 'delete-stats'):
+            argv += ['--base-path', job_dir]
+        if command in ('crawl', 'columns', 'pause', 'resume', 'run', 'export-stats'):
+            argv += ['--log-file', os.path.join(job_dir, f"{command}.log")]
+        if command == 'create':
+            # Plan around no existing schedules unless the job names an --existing list; the host's
+            # full crawl output would cost a get_table and a settings call per scheduled table
+            argv += ['--existing', os.path.join(job_dir, 'existing_glue_stats.txt')]
+        if command == 'columns':
+            argv += ['--output', os.path.join(job_dir, 'database_table_columns_list.txt'),
+                     '--table-index', os.path.join(job_dir, 'database_table_list.txt'),
+                     '--catalog-index', os.path.join(job_dir, 'catalog_index.db')]
+        if not job.tables:
+            return argv
+        if command in ('crawl', 'columns'):
+            # Filters match every listed database against every listed table name
+            for database_name in sorted({database_name for database_name, _ in job.tables}):
+                argv += ['--database', database_name]
+            for table_name in sorted({table_name for _, table_name in job.tables}):
+                argv += ['--table', table_name]
+        elif command in ('create', 'apply-policy', 'pause', 'run', 'delete-schedule'):
+            table_list = self._write_rows(os.path.join(job_dir, 'table_list.txt'), job.tables)
+            option = {'create': ['--source'], 'apply-policy': ['--existing'], 'pause': ['--input'],
+                      'run': ['--input'], 'delete-schedule': ['--table-index', '--source']}[command]
+            for name in option:
+                argv += [name, table_list]
+        else:
+            column_list = self._write_rows(os.path.join(job_dir, 'database_table_columns_list.txt'),
+                                           self._column_rows(job))
+            argv += ['--input' if command == 'export-stats' else '--source', column_list]
+        return argv
+ 
+    def run_job(self, job):
+        import gluestats
+        job_dir = os.path.join(self.work_dir, 'jobs', job.id)
+        os.makedirs(job_dir, exist_ok=True)
+        self._reset_scripts()
+        get_metrics().reset()
+        job.state = 'running'
+        self.current = job
+        job.emit('started', directory=job_dir)
+        started = time.monotonic()
+        state, error = 'succeeded', None
+        try:
+            with contextlib.redirect_stdout(self.stream), contextlib.redirect_stderr(self.stream):
+                if job.refresh:
+                    self.cache.invalidate(job.tables)
+                args = gluestats.build_parser().parse_args([job.command] + self.job_arguments(job, job_dir) + job.args)
+                args.func(args)
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                state, error = 'failed', f"Exited with status {e.code}"
+        except Exception as e:
+            state, error = 'failed', f"{type(e).__name__}: {e}"
+            logger.exception(f"Job {job.id} failed")
+        finally:
+            # The job's files are not written again, and must be closed for pruning to free them
+            get_sink().release(job_dir)
+            self._close_log_files(job_dir)
+            self.current = None
+        calls = {operation: stats['calls'] for operation, stats in get_metrics().snapshot()['operations'].items()}
+        job.finish(state, time.monotonic() - started, error=error, calls=calls)
+        logger.info(f"Job {job.id} ({job.command}, {len(job.tables)} tables) {state} "
+                    f"in {job.seconds:.3f}s with {sum(calls.values())} AWS calls")
+ 
+    def _close_log_files(self, job_dir):
+        """Close the logging file handlers the job's script opened under job_dir."""
+        directory = os.path.join(os.path.abspath(job_dir), '')
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            if isinstance(handler, logging.FileHandler) and handler.baseFilename.startswith(directory):
+                root.removeHandler(handler)
+                handler.close()
+ 
+    def _prune_job_dirs(self):
+        jobs_dir = os.path.join(self.work_dir, 'jobs')
+        for name in sorted(os.listdir(jobs_dir))[:-keep_jobs]:
+            shutil.rmtree(os.path.join(jobs_dir, name), ignore_errors=True)
+ 
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            self.run_job(job)
+            self._prune_job_dirs()
+ 
+    def serve_forever(self):
+        """Warm up, then serve jobs until interrupted or terminated."""
+        if not logger.handlers:
+            handler = logging.StreamHandler(sys.stderr)
+            handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+        os.makedirs(os.path.join(self.work_dir, 'jobs'), exist_ok=True)
+        self.warm()
+        get_metrics().reset()
+        self._install_record_factory()
+        threading.Thread(target=self._work, name='job-worker', daemon=True).start()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        previous_umask = os.umask(0o077)  # Only this user can connect
+        try:
+            server = _Server(self.socket_path, _Handler)
+        finally:
+            os.umask(previous_umask)
+        server.job_daemon = self
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        logger.info(f"Listening on {self.socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            logger.info("Stopped")
+ 
+ 
+def submit(socket_path, request):
+    """Send a request to a running daemon and yield the events it streams back."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall((json.dumps(request) + '\n').encode())
+        with client.makefile('r') as stream:
+            for line in stream:
+                yield json.loads(line)
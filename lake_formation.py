@@ -0,0 +1,106 @@
+import logging
+ 
+from pipeline import bounded_map
+from rate_control import RETRYABLE_CODES, THROTTLE_CODES
+ 
+# batch_grant_permissions accepts at most 20 entries per call
+MAX_BATCH_ENTRIES = 20
+ 
+ 
+def covers(granted, wanted):
+    """True if a granted permission list includes every wanted permission."""
+    return 'ALL' in granted or set(wanted) <= set(granted)
+ 
+ 
+def granted_tables(client, controller, principal, permissions, grantable=(), catalog_id=None):
+    """
+    Bulk-read the principal's table grants with list_permissions and return
+    (tables, databases): the (database, table) pairs and the databases (via a
+    table wildcard) on which it already holds permissions, with grantable ones
+    also held with grant option.
+    """
+    tables, databases = set(), set()
+    kwargs = {'Principal': {'DataLakePrincipalIdentifier': principal}, 'ResourceType': 'TABLE', 'MaxResults': 1000}
+    if catalog_id:
+        kwargs['CatalogId'] = catalog_id
+    while True:
+        response = controller.call(client.list_permissions, **kwargs)
+        for grant in response.get('PrincipalResourcePermissions', []):
+            table = grant.get('Resource', {}).get('Table')
+            if not table:
+                continue
+            if not covers(grant.get('Permissions', []), permissions):
+                continue
+            if not covers(grant.get('PermissionsWithGrantOption', []), grantable):
+                continue
+            if 'TableWildcard' in table:
+                databases.add(table['DatabaseName'])
+            else:
+                tables.add((table['DatabaseName'], table['Name']))
+        if not response.get('NextToken'):
+            return tables, databases
+        kwargs['NextToken'] = response['NextToken']
+ 
+ 
+def grant_batch(client, controller, principal, tables, permissions, grantable=(), catalog_id=None, tries=3):
+    """
+    Grant permissions on up to MAX_BATCH_ENTRIES tables in one call. Entries
+    that fail with a throttling or transient error are resent, up to tries
+    times; returns {(database, table): error} for the entries that still failed.
+    """
+    failures = {}
+    pending = list(tables)
+    for attempt in range(tries):
+        entries = []
+        for i, (database_name, table_name) in enumerate(pending):
+            resource = {'Table': {'DatabaseName': database_name, 'Name': table_name}}
+            if catalog_id:
+                resource['Table']['CatalogId'] = catalog_id
+            entries.append({
+                'Id': str(i),
+                'Principal': {'DataLakePrincipalIdentifier': principal},
+                'Resource': resource,
+                'Permissions': list(permissions),
+                'PermissionsWithGrantOption': list(grantable),
+            })
+        kwargs = {'Entries': entries, 'CatalogId': catalog_id} if catalog_id else {'Entries': entries}
+        response = controller.call(client.batch_grant_permissions, **kwargs)
+        retry = []
+        for failure in response.get('Failures', []):
+            table = pending[int(failure['RequestEntry']['Id'])]
+            error = failure.get('Error', {})
+            if error.get('ErrorCode') in THROTTLE_CODES | RETRYABLE_CODES and attempt < tries - 1:
+                retry.append(table)
+            else:
+                failures[table] = f"{error.get('ErrorCode')}: {error.get('ErrorMessage')}"
+        if not retry:
+            break
+        logging.warning(f"Resending {len(retry)} of {len(pending)} grant entries after transient failures")
+        pending = retry
+    return failures
+ 
+ 
+def grant_missing(client, controller, executor, window, principal, tables, permissions, grantable=(), catalog_id=None,
+                  held=None):
+    """
+    Grant permissions on every (database, table) in tables that the principal
+    does not already hold, batching the grants. Returns (missing, failures):
+    the tables that needed a grant, and {(database, table): error} for those
+    that could not be granted. held is the granted_tables result to check
+    against, for callers granting in several rounds; it is read if not given.
+    """
+    held_tables, held_databases = held or granted_tables(client, controller, principal, permissions, grantable, catalog_id)
+    missing = [table for table in tables if table not in held_tables and table[0] not in held_databases]
+    chunks = [(missing[i:i + MAX_BATCH_ENTRIES],) for i in range(0, len(missing), MAX_BATCH_ENTRIES)]
+    failures = {}
+ 
+    def grant(chunk):
+        return grant_batch(client, controller, principal, chunk, permissions, grantable, catalog_id)
+ 
+    def on_error(item, e):
+        for table in item[0]:
+            failures[table] = str(e)
+ 
+    for _, chunk_failures in bounded_map(executor, grant, chunks, window, on_error):
+        failures.update(chunk_failures or {})
+    return missing, failures
@@ -1,88 +1,137 @@
-import boto3
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from botocore.exceptions import BotoCoreError, ClientError
+import aws_clients
+from aws_clients import LazyClient, connection_report
+from catalog_filter import CatalogFilter
+from catalog_index import CatalogIndex
+from metrics import get_metrics
+from output_sink import get_sink
+from pipeline import FairScheduler
+from rate_control import get_controller
+from sharded_crawl import merge_shards, run_shards, shard_path
  
 # Setup logging
 log_file = 'fetch_columns.log'
-logging.basicConfig(
-    filename=log_file,
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    filemode='w'
-)
  
-# Initialize Glue client
-glue_client = boto3.client('glue', region_name='us-east-1')
+def setup_logging():
+    logging.basicConfig(
+        filename=log_file,
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        filemode='w',
+        force=True
+    )
+ 
+# Initialize Glue client, built on first use
+glue_client = LazyClient('glue')
+controller = get_controller()
+sink = get_sink()
  
 # File to store the results
 output_file = 'database_table_columns_list.txt'
+column_header = "DatabaseName,TableName,ColumnName"
+ 
+# Sorted, one row per table, so table-level jobs do not have to re-read every column row
+table_index_file = 'database_table_list.txt'
+table_index_header = "DatabaseName,TableName"
+ 
+# Local catalog index; unchanged tables reuse their cached columns instead of calling get_table
+index_file = 'catalog_index.db'
+ 
+# Read columns from the get_tables pages instead of calling get_table once per table
+snapshot_mode = True
+ 
+# Databases and tables to list; table include patterns are pushed down to get_tables
+catalog_filter = CatalogFilter()
+ 
+def table_columns(table):
+    """
+    Return the column names of a Glue Table, including partition keys.
+    """
+    storage_descriptor = table.get('StorageDescriptor', {})
+    columns = storage_descriptor.get('Columns', []) + table.get('PartitionKeys', [])
+    return [col['Name'] for col in columns]
+ 
+def write_columns(database_name, table_name, column_names):
+    sink.write(output_file, ''.join(f"{database_name},{table_name},{column_name}\n" for column_name in column_names))
  
-def fetch_columns(database_name, table_name):
+def fetch_columns(database_name, table_name, index=None):
     """
     Fetch column names for a given database and table and log them.
     """
     try:
-        response = glue_client.get_table(DatabaseName=database_name, Name=table_name)
-        columns = response['Table']['StorageDescriptor']['Columns']
-        column_names = [col['Name'] for col in columns]
+        response = controller.call(glue_client.get_table, DatabaseName=database_name, Name=table_name)
+        column_names = table_columns(response['Table'])
+        if index:
+            index.save_columns(database_name, table_name, column_names)
  
-        with open(output_file, 'a') as f:
-            for column_name in column_names:
-                f.write(f"{database_name},{table_name},{column_name}\n")
+        write_columns(database_name, table_name, column_names)
  
         logging.info(f"Fetched {len(column_names)} columns for {database_name}.{table_name}")
-    except boto3.exceptions.Boto3Error as e:
+    except (BotoCoreError, ClientError) as e:
         logging.error(f"Error fetching columns for {database_name}.{table_name}: {e}")
  
-def fetch_tables_and_columns(database_name):
+def process_tables_page(scheduler, index, table_pairs, database_name, snapshot, next_token=None):
     """
-    Fetch tables for a database and initiate fetching columns for each table.
+    Fetch one get_tables page of a database and queue the work it leads to: in
+    snapshot mode the page's columns are written directly, otherwise a get_table
+    task is queued for each table whose cached columns are missing or stale.
+    The next page is queued once this page is done, and the last page prunes
+    dropped tables of the database from the index.
     """
-    logging.info(f"Fetching tables for database: {database_name}")
-    next_token = None
-    all_tables = []
- 
+    kwargs = catalog_filter.get_tables_kwargs()
+    if next_token:
+        kwargs['NextToken'] = next_token
     try:
-        while True:
-            response = glue_client.get_tables(DatabaseName=database_name, NextToken=next_token) if next_token else glue_client.get_tables(DatabaseName=database_name)
-            tables = [table['Name'] for table in response.get('TableList', [])]
-            all_tables.extend(tables)
-            next_token = response.get('NextToken')
-            if not next_token:
-                break
- 
-        logging.info(f"Total tables fetched for {database_name}: {len(all_tables)}")
-        return all_tables
-    except boto3.exceptions.Boto3Error as e:
+        response = controller.call(glue_client.get_tables, DatabaseName=database_name, **kwargs)
+    except (BotoCoreError, ClientError) as e:
         logging.error(f"Error fetching tables for database {database_name}: {e}")
-        return []
+        return
  
-def process_database(database_name, max_workers=10):
+    lines = []
+    for table in response.get('TableList', []):
+        table_name = table['Name']
+        if not catalog_filter.wants_table(table_name):
+            continue
+        table_pairs.append((database_name, table_name))
+        index.observe_table(database_name, table_name, table.get('UpdateTime'))
+        if snapshot:
+            column_names = table_columns(table)
+            index.save_columns(database_name, table_name, column_names)
+        else:
+            column_names = index.cached_columns(database_name, table_name)
+            if column_names is None:
+                scheduler.submit(database_name, fetch_columns, database_name, table_name, index)
+                continue
+        lines.extend(f"{database_name},{table_name},{column_name}\n" for column_name in column_names)
+    if lines:
+        sink.write(output_file, ''.join(lines))
+ 
+    next_token = response.get('NextToken')
+    if next_token:
+        scheduler.submit(database_name, process_tables_page, scheduler, index, table_pairs, database_name, snapshot, next_token)
+    else:
+        logging.info(f"Listed all tables for database {database_name}")
+        # A filtered listing sees only some tables, so it must not prune the rest from the index
+        if not catalog_filter.filters_tables:
+            index.prune_database(database_name)
+ 
+def write_table_index(table_pairs):
     """
-    Fetch tables and columns for a database using multithreading.
+    Write the sorted (database, table) pairs next to the column list.
     """
-    tables = fetch_tables_and_columns(database_name)
- 
-    if not tables:
-        logging.warning(f"No tables found for database {database_name}. Skipping.")
-        return
- 
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {
-            executor.submit(fetch_columns, database_name, table): table
-            for table in tables
-        }
- 
-        for future in as_completed(futures):
-            table_name = futures[future]
-            try:
-                future.result()
-            except Exception as e:
-                logging.error(f"Error processing table {database_name}.{table_name}: {e}")
- 
-def fetch_all_databases_and_columns(max_workers=5):
+    try:
+        with open(table_index_file, 'w') as f:
+            f.write(f"{table_index_header}\n")
+            for database_name, table_name in sorted(table_pairs):
+                f.write(f"{database_name},{table_name}\n")
+        logging.info(f"Wrote {len(table_pairs)} tables to {table_index_file}")
+    except IOError as e:
+        logging.error(f"Error writing table index {table_index_file}: {e}")
+ 
+def fetch_databases():
     """
-    Fetch all databases and initiate processing for each database.
+    Fetch the names of all databases, or None on error.
     """
     logging.info("Fetching list of databases...")
     next_token = None
@@ -90,7 +139,7 @@ def fetch_all_databases_and_columns(max_workers=5):
  
     try:
         while True:
-            response = glue_client.get_databases(NextToken=next_token) if next_token else glue_client.get_databases()
+            response = controller.call(glue_client.get_databases, NextToken=next_token) if next_token else controller.call(glue_client.get_databases)
             db_list = [db['Name'] for db in response.get('DatabaseList', [])]
             databases.extend(db_list)
             next_token = response.get('NextToken')
@@ -98,27 +147,87 @@ def fetch_all_databases_and_columns(max_workers=5):
                 break
  
         logging.info(f"Total databases fetched: {len(databases)}")
-    except boto3.exceptions.Boto3Error as e:
+        return databases
+    except (BotoCoreError, ClientError) as e:
         logging.error(f"Error fetching databases: {e}")
-        return
- 
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {
-            executor.submit(process_database, database): database
-            for database in databases
-        }
- 
-        for future in as_completed(futures):
-            database_name = futures[future]
-            try:
-                future.result()
-            except Exception as e:
-                logging.error(f"Error processing database {database_name}: {e}")
+        return None
  
-if __name__ == '__main__':
+def fetch_all_databases_and_columns(max_workers=None, snapshot=snapshot_mode, index_path=index_file, databases=None):
+    """
+    Fetch all databases, or only the given ones, and process their tables on one
+    fixed pool of workers shared fairly across databases.
+    """
+    if databases is None:
+        databases = fetch_databases()
+        if databases is None:
+            return
+        databases = catalog_filter.databases(databases)
+ 
+    index = CatalogIndex(index_path)
+    table_pairs = []
+    try:
+        scheduler = FairScheduler(max_workers or controller.max_concurrency,
+                                  on_error=lambda args, e: logging.error(f"Error processing {args}: {e}"))
+        for database_name in databases:
+            scheduler.submit(database_name, process_tables_page, scheduler, index, table_pairs, database_name, snapshot)
+        scheduler.join()
+ 
+        for database_name in databases:
+            index.observe_database(database_name)
+        if not catalog_filter.filters_databases:
+            index.prune_databases()
+    finally:
+        index.close()
+        sink.flush()
+    write_table_index(table_pairs)
+ 
+def columns_shard(shard, databases, paths, region=None, rate_scale=1.0, max_workers=None, snapshot=snapshot_mode,
+                  table_filter=None, rate_settings=None):
+    """
+    Process entry point for a sharded crawl: list the columns of only the given
+    databases into the shard files of paths (columns, table index, index and log).
+    """
+    global output_file, table_index_file, index_file, log_file, catalog_filter
+    output_file, table_index_file, index_file, log_file = (shard_path(path, shard) for path in paths)
+    # Spawned shard processes do not inherit the parent's settings
+    catalog_filter = table_filter or CatalogFilter()
+    setup_logging()
+    if region:
+        aws_clients.set_region(region)
+    if rate_settings:
+        controller.configure(**rate_settings)
+    controller.scale_rates(rate_scale)
+    open(output_file, 'w').close()
+    fetch_all_databases_and_columns(max_workers=max_workers, snapshot=snapshot, index_path=index_file, databases=databases)
+    logging.info(f"Shard {shard}: {get_metrics().summary()}")
+    return get_metrics().snapshot()
+ 
+def main(max_workers=None, snapshot=snapshot_mode, shards=1):
     logging.info("Starting the process to fetch databases, tables, and columns")
     # Initialize the output file
     with open(output_file, 'w') as f:
-        f.write("DatabaseName,TableName,ColumnName\n")
-    fetch_all_databases_and_columns(max_workers=5)  # Adjust max_workers based on system capacity
+        f.write(f"{column_header}\n")
+    if shards > 1:
+        # Each process gets a hash shard of the databases and an equal share of the starting API rates
+        databases = fetch_databases()
+        if databases is not None:
+            paths = (output_file, table_index_file, index_file, log_file)
+            # Shard processes count their own calls; add them to this process's report
+            for shard_metrics in run_shards(columns_shard, catalog_filter.databases(databases), shards, paths,
+                                            aws_clients.region_override, 1.0 / shards, max_workers, snapshot,
+                                            catalog_filter, controller.settings()):
+                get_metrics().merge(shard_metrics)
+            merge_shards(output_file, shards)
+            with open(table_index_file, 'w') as f:
+                f.write(f"{table_index_header}\n")
+            merge_shards(table_index_file, shards, header=table_index_header, sort=True)
+            merge_shards(log_file, shards)
+    else:
+        fetch_all_databases_and_columns(max_workers=max_workers, snapshot=snapshot, index_path=index_file)
+    logging.info(connection_report())
+    logging.info(get_metrics().summary())
     logging.info("Process completed")
+ 
+if __name__ == '__main__':
+    setup_logging()
+    main()  # Pass max_workers to cap the worker threads shared by all databases
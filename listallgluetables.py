@@ -1,66 +1,75 @@
-import boto3
+import asyncio
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from datetime import datetime
 import os
 import tempfile
-from time import sleep
+import aws_clients
+from async_crawl import AsyncGlue, crawl_catalog
+from aws_clients import LazyClient, connection_report
+from backups import BackupStore
+from catalog_filter import CatalogFilter
+from catalog_index import CatalogIndex
+from metrics import get_metrics
+from rate_control import get_controller, retry
+from sharded_crawl import merge_shards, run_shards, shard_path
  
 # Setup logging
-log_file = '/home/ec2-user/alltablesg/script_log.txt'
-logging.basicConfig(
-    filename=log_file,
-    level=logging.INFO,
-    #level=logging.DEBUG,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    filemode='w'
-)
- 
-# Initialize Glue client
-glue_client = boto3.client('glue', region_name='us-east-1')
+def setup_logging():
+    logging.basicConfig(
+        filename=log_file,
+        level=logging.INFO,
+        #level=logging.DEBUG,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        filemode='w',
+        force=True
+    )
+ 
+# Initialize Glue client, built on first use
+glue_client = LazyClient('glue')
+controller = get_controller()
  
 # File paths
 base_path = "/home/ec2-user/alltablesg"
-if not os.path.exists(base_path) or not os.access(base_path, os.W_OK):
-    logging.warning(f"Base path unavailable or not writable: {base_path}. Using temporary directory.")
-    base_path = tempfile.mkdtemp()
- 
+log_file = f"{base_path}/script_log.txt"
 output_file = f"{base_path}/missing_glue_stats.txt"
 existing_file = f"{base_path}/existing_glue_stats.txt"
 all_tables_file = f"{base_path}/all_table_list.txt"
- 
-# Retry decorator
-def retry(exception_to_check, tries=3, delay=2):
-    def decorator(func):
-        def wrapper(*args, **kwargs):
-            for attempt in range(tries):
-                try:
-                    return func(*args, **kwargs)
-                except exception_to_check as e:
-                    logging.warning(f"Retry {attempt + 1}/{tries} for {func.__name__}: {e}")
-                    sleep(delay)
-            logging.error(f"Operation {func.__name__} failed after {tries} retries.")
-            raise
-        return wrapper
-    return decorator
- 
-# Backup previous files with a timestamp
+index_file = f"{base_path}/catalog_index.db"
+backup_path = f"{base_path}/bkp_log"
+ 
+# Databases and tables to crawl; table include patterns are pushed down to get_tables
+catalog_filter = CatalogFilter()
+# List only table names and types instead of full Table definitions
+names_only = False
+ 
+def set_base_path(path):
+    """
+    Point the output files, and the log file unless it was set elsewhere, at
+    path, or at a temporary directory if path is not writable.
+    """
+    global base_path, output_file, existing_file, all_tables_file, index_file, backup_path, log_file
+    default_log = log_file == f"{base_path}/script_log.txt"
+    if not os.path.exists(path) or not os.access(path, os.W_OK):
+        logging.warning(f"Base path unavailable or not writable: {path}. Using temporary directory.")
+        path = tempfile.mkdtemp()
+    base_path = path
+    output_file = f"{base_path}/missing_glue_stats.txt"
+    existing_file = f"{base_path}/existing_glue_stats.txt"
+    all_tables_file = f"{base_path}/all_table_list.txt"
+    index_file = f"{base_path}/catalog_index.db"
+    backup_path = f"{base_path}/bkp_log"
+    if default_log:
+        log_file = f"{base_path}/script_log.txt"
+ 
+# Snapshot the previous run's files into the deduplicated, compressed backup store
 @retry(Exception)
 def backup_files(file_paths):
-    for file_path in file_paths:
-        try:
-            with open(file_path, 'r') as f:
-                content = f.read()
-            if content:
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                backup_file = f"{file_path}.{timestamp}.bak"
-                with open(backup_file, 'w') as f:
-                    f.write(content)
-        except FileNotFoundError:
-            logging.info(f"File not found for backup: {file_path}")
-        except IOError as e:
-            logging.error(f"Error backing up file {file_path}: {e}")
-            raise
+    try:
+        snapshot = BackupStore(backup_path).backup(file_paths)
+        if snapshot:
+            logging.info(f"Backed up previous files to {os.path.join(backup_path, snapshot)}")
+    except IOError as e:
+        logging.error(f"Error backing up files to {backup_path}: {e}")
+        raise
  
 # Initialize and clear output files
 @retry(Exception)
@@ -80,7 +89,7 @@ def fetch_databases():
  
     try:
         while True:
-            response = glue_client.get_databases(NextToken=next_token) if next_token else glue_client.get_databases()
+            response = controller.call(glue_client.get_databases, NextToken=next_token) if next_token else controller.call(glue_client.get_databases)
             databases = [db['Name'] for db in response.get('DatabaseList', [])]
             all_databases.extend(databases)
             logging.info(f"Fetched {len(databases)} databases in this page.")
@@ -92,29 +101,10 @@ def fetch_databases():
         logging.error(f"Error fetching databases: {e}")
     return all_databases
  
-def fetch_tables(database_name):
-    """Fetch all tables for a given database with pagination."""
-    logging.info(f"Fetching tables for database: {database_name}")
-    all_tables = []
-    next_token = None
- 
-    try:
-        while True:
-            response = glue_client.get_tables(DatabaseName=database_name, NextToken=next_token) if next_token else glue_client.get_tables(DatabaseName=database_name)
-            tables = [table['Name'] for table in response.get('TableList', [])]
-            all_tables.extend(tables)
-            next_token = response.get('NextToken')
-            if not next_token:
-                break
-        logging.info(f"Total tables fetched for {database_name}: {len(all_tables)}")
-    except Exception as e:
-        logging.error(f"Error fetching tables for {database_name}: {e}")
-    return all_tables
- 
 def check_column_statistics(database_name, table_name):
     """Check if column statistics schedule exists for the given table."""
     try:
-        response = glue_client.get_column_statistics_task_settings(DatabaseName=database_name, TableName=table_name)
+        response = controller.call(glue_client.get_column_statistics_task_settings, DatabaseName=database_name, TableName=table_name)
         if 'SCHEDULED' in response['ColumnStatisticsTaskSettings']['Schedule']['State']:
             logging.info(f"Column statistics schedule exists for {database_name}.{table_name}")
             return database_name, table_name, 'existing'
@@ -126,59 +116,106 @@ def check_column_statistics(database_name, table_name):
         return database_name, table_name, 'missing'
     except Exception as e:
         logging.error(f"Error checking column stats for {database_name}.{table_name}: {e}")
-        return database_name, table_name, 'missing'
- 
-def process_databases():
-    """Process databases to get tables and check column statistics."""
-    databases = fetch_databases()
- 
-    if not databases:
-        logging.error("No databases found. Exiting.")
-        return
- 
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        table_futures = {executor.submit(fetch_tables, db): db for db in databases}
-        tables_per_db = {}
- 
-        for future in as_completed(table_futures):
-            db_name = table_futures[future]
-            try:
-                tables_per_db[db_name] = future.result()
-            except Exception as e:
-                logging.error(f"Error fetching tables for database {db_name}: {e}")
- 
-        try:
-            with open(all_tables_file, 'w') as f:
-                for db_name, tables in tables_per_db.items():
-                    for table in tables:
-                        f.write(f"{db_name},{table}\n")
-        except IOError as e:
-            logging.error(f"Error writing to all_tables_file: {e}")
- 
-        column_futures = []
-        for db_name, tables in tables_per_db.items():
-            for table in tables:
-                column_futures.append(executor.submit(check_column_statistics, db_name, table))
- 
-        try:
-            with open(output_file, 'a') as missing_file, open(existing_file, 'a') as existing_file1:
-                for future in as_completed(column_futures):
-                    try:
-                        db_name, table_name, status = future.result()
-                        if status == 'existing':
-                            existing_file1.write(f"{db_name},{table_name}\n")
-                        else:
-                            missing_file.write(f"{db_name},{table_name}\n")
-                    except Exception as e:
-                        logging.error(f"Error processing column statistics: {e}")
-        except IOError as e:
-            logging.error(f"Error writing to output or existing files: {e}")
+        return database_name, table_name, 'error'
+ 
+def process_databases(databases=None):
+    """
+    Crawl databases and tables, checking column statistics as each page of tables
+    arrives. Crawls only the given databases if a list is passed.
+    """
+    glue = AsyncGlue(glue_client, controller)
+    index = CatalogIndex(index_file)
+    try:
+        with open(all_tables_file, 'w') as all_tables, open(output_file, 'a') as missing_file, open(existing_file, 'a') as existing_file1:
+            def write_status(db_name, table_name, status):
+                if status == 'existing':
+                    existing_file1.write(f"{db_name},{table_name}\n")
+                else:
+                    missing_file.write(f"{db_name},{table_name}\n")
+ 
+            def on_table(db_name, table):
+                all_tables.write(f"{db_name},{table['Name']}\n")
+                # Unchanged tables reuse the stats state from the last run until it expires;
+                # it is not saved again, so its checked time stays that of the last real check
+                index.observe_table(db_name, table['Name'], table.get('UpdateTime'))
+                status = index.cached_stats_state(db_name, table['Name'])
+                if status is None:
+                    return False
+                write_status(db_name, table['Name'], status)
+                return True
+ 
+            def on_result(result):
+                db_name, table_name, status = result
+                # Errors are reported as missing but not cached, so the next run checks again
+                if status != 'error':
+                    index.save_stats_state(db_name, table_name, status)
+                write_status(db_name, table_name, status)
+ 
+            # A filtered crawl sees only part of the catalog, so it must not prune the rest from the index
+            on_database = None if catalog_filter.filters_tables else index.prune_database
+            databases = asyncio.run(crawl_catalog(glue, check_column_statistics, on_table, on_result, on_database,
+                                                  databases=databases, catalog_filter=catalog_filter, names_only=names_only))
+            if not databases:
+                logging.error("No databases found. Exiting.")
+                return
+            for db_name in databases:
+                index.observe_database(db_name)
+            if not catalog_filter.filters_databases:
+                index.prune_databases()
+    except IOError as e:
+        logging.error(f"Error writing to output files: {e}")
+    except Exception as e:
+        logging.error(f"Error fetching databases: {e}")
+    finally:
+        glue.close()
+        index.close()
  
     logging.info("Script execution completed.")
  
-if __name__ == "__main__":
+def crawl_shard(shard, databases, paths, region=None, rate_scale=1.0, table_filter=None, list_names_only=False,
+                rate_settings=None):
+    """
+    Process entry point for a sharded crawl: crawl only the given databases into
+    the shard files of paths (missing, existing, all tables, index and log files).
+    """
+    global output_file, existing_file, all_tables_file, index_file, log_file, catalog_filter, names_only
+    output_file, existing_file, all_tables_file, index_file, log_file = (shard_path(path, shard) for path in paths)
+    # Spawned shard processes do not inherit the parent's settings
+    catalog_filter = table_filter or CatalogFilter()
+    names_only = list_names_only
+    setup_logging()
+    if region:
+        aws_clients.set_region(region)
+    if rate_settings:
+        controller.configure(**rate_settings)
+    controller.scale_rates(rate_scale)
+    initialize_files([output_file, existing_file, all_tables_file])
+    process_databases(databases)
+    logging.info(f"Shard {shard}: {get_metrics().summary()}")
+    return get_metrics().snapshot()
+ 
+def main(shards=1):
     logging.info("Starting process")
+    set_base_path(base_path)
     backup_files([output_file, existing_file, all_tables_file, log_file])
     initialize_files([output_file, existing_file, all_tables_file])
-    process_databases()
+    if shards > 1:
+        # Each process gets a hash shard of the databases and an equal share of the starting API rates
+        databases = catalog_filter.databases(fetch_databases())
+        paths = (output_file, existing_file, all_tables_file, index_file, log_file)
+        # Shard processes count their own calls; add them to this process's report
+        for snapshot in run_shards(crawl_shard, databases, shards, paths, aws_clients.region_override, 1.0 / shards,
+                                   catalog_filter, names_only, controller.settings()):
+            get_metrics().merge(snapshot)
+        for path in (output_file, existing_file, all_tables_file, log_file):
+            merge_shards(path, shards)
+    else:
+        process_databases()
+    logging.info(connection_report())
+    logging.info(get_metrics().summary())
     logging.info("Process completed")
+ 
+if __name__ == "__main__":
+    set_base_path(base_path)
+    setup_logging()
+    main()
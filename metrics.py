@@ -0,0 +1,272 @@
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+ 
+# Upper bounds in seconds of the call latency and rate-limit wait histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ 
+ 
+class Histogram:
+    """Fixed-bucket histogram; quantiles are interpolated within a bucket, as Prometheus does."""
+ 
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # The last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+ 
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+ 
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for i, n in enumerate(self.counts):
+            if n and cumulative + n >= rank:
+                lower = self.bounds[i - 1] if i else 0.0
+                if i == len(self.bounds):
+                    return lower
+                return lower + (self.bounds[i] - lower) * (rank - cumulative) / n
+            cumulative += n
+        return self.bounds[-1]
+ 
+ 
+class OperationStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = {}
+        self.throttles = 0    # Throttled responses, whichever layer retried them
+        self.retries = 0      # Retried by the rate controller
+        self.sdk_retries = 0  # Retried inside botocore
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.latency = Histogram()
+        self.wait = Histogram()
+ 
+ 
+class Metrics:
+    """
+    Per-operation call counts, latency and rate-limit wait histograms, error
+    codes, throttles, retries and in-flight gauges for one process. Operations
+    are keyed by their boto3 method name, e.g. get_tables.
+    """
+ 
+    def __init__(self):
+        self.operations = {}
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+ 
+    def reset(self):
+        """Start counting afresh, e.g. for each job of a long-running process."""
+        with self.lock:
+            self.operations = {}
+            self.started = time.monotonic()
+ 
+    def _stats(self, operation):
+        if operation not in self.operations:
+            self.operations[operation] = OperationStats()
+        return self.operations[operation]
+ 
+    def call_started(self, operation):
+        with self.lock:
+            stats = self._stats(operation)
+            stats.in_flight += 1
+            stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+ 
+    def call_finished(self, operation, seconds, error=None, sdk_retries=0):
+        with self.lock:
+            stats = self._stats(operation)
+            stats.in_flight -= 1
+            stats.calls += 1
+            stats.sdk_retries += sdk_retries
+            stats.latency.observe(seconds)
+            if error:
+                stats.errors[error] = stats.errors.get(error, 0) + 1
+ 
+    def record_wait(self, operation, seconds):
+        """Time a call spent waiting for a rate limit token and a concurrency slot."""
+        with self.lock:
+            self._stats(operation).wait.observe(seconds)
+ 
+    def record_retry(self, operation):
+        with self.lock:
+            self._stats(operation).retries += 1
+ 
+    def record_throttle(self, operation):
+        with self.lock:
+            self._stats(operation).throttles += 1
+ 
+    def install(self, session):
+        """Time every call made by clients built from this boto3 session from now on."""
+        from botocore import xform_name
+        from rate_control import THROTTLE_CODES
+ 
+        def before_call(model, context, **kwargs):
+            context['metrics_operation'] = operation = xform_name(model.name)
+            context['metrics_start'] = time.perf_counter()
+            self.call_started(operation)
+ 
+        def after_call(http_response, parsed, context, **kwargs):
+            error = parsed.get('Error', {}).get('Code', 'Unknown') if http_response.status_code >= 300 else None
+            retries = parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+            self.call_finished(context['metrics_operation'], time.perf_counter() - context['metrics_start'], error, retries)
+ 
+        def after_call_error(exception, context, **kwargs):
+            self.call_finished(context['metrics_operation'], time.perf_counter() - context['metrics_start'],
+                               type(exception).__name__)
+ 
+        def needs_retry(response, operation, **kwargs):
+            # Sees every attempt, so throttles botocore retried itself are counted too
+            if response and response[1].get('Error', {}).get('Code') in THROTTLE_CODES:
+                self.record_throttle(xform_name(operation.name))
+ 
+        session.events.register('before-call.*.*', before_call)
+        session.events.register('after-call.*.*', after_call)
+        session.events.register('after-call-error.*.*', after_call_error)
+        session.events.register('needs-retry.*.*', needs_retry)
+ 
+    def snapshot(self):
+        """Plain dict of everything recorded so far, suitable for JSON."""
+        def ms(seconds):
+            return None if seconds is None else round(1000 * seconds, 2)
+ 
+        with self.lock:
+            elapsed = time.monotonic() - self.started
+            operations = {}
+            for operation, stats in sorted(self.operations.items()):
+                operations[operation] = {
+                    'calls': stats.calls,
+                    'calls_per_second': round(stats.calls / elapsed, 2) if elapsed else None,
+                    'errors': dict(stats.errors),
+                    'throttles': stats.throttles,
+                    'retries': stats.retries,
+                    'sdk_retries': stats.sdk_retries,
+                    'in_flight': stats.in_flight,
+                    'peak_in_flight': stats.peak_in_flight,
+                    'latency_p50_ms': ms(stats.latency.quantile(0.5)),
+                    'latency_p99_ms': ms(stats.latency.quantile(0.99)),
+                    'latency_mean_ms': ms(stats.latency.sum / stats.latency.count) if stats.latency.count else None,
+                    'wait_p50_ms': ms(stats.wait.quantile(0.5)),
+                    'wait_p99_ms': ms(stats.wait.quantile(0.99)),
+                    'latency_sum_seconds': round(stats.latency.sum, 6),
+                    'wait_sum_seconds': round(stats.wait.sum, 6),
+                    'latency_buckets': dict(zip([str(b) for b in stats.latency.bounds] + ['+Inf'], stats.latency.counts)),
+                    'wait_buckets': dict(zip([str(b) for b in stats.wait.bounds] + ['+Inf'], stats.wait.counts)),
+                }
+        return {'elapsed_seconds': round(elapsed, 3), 'operations': operations}
+ 
+    def merge(self, snapshot):
+        """
+        Add the calls recorded by another process, given as its snapshot(), to
+        this one's, e.g. those of the shard processes of a crawl. Peaks add up,
+        since the processes ran side by side.
+        """
+        with self.lock:
+            for operation, other in snapshot['operations'].items():
+                stats = self._stats(operation)
+                stats.calls += other['calls']
+                for code, n in other['errors'].items():
+                    stats.errors[code] = stats.errors.get(code, 0) + n
+                stats.throttles += other['throttles']
+                stats.retries += other['retries']
+                stats.sdk_retries += other['sdk_retries']
+                stats.peak_in_flight += other['peak_in_flight']
+                for histogram, buckets, total in ((stats.latency, other['latency_buckets'], other['latency_sum_seconds']),
+                                                  (stats.wait, other['wait_buckets'], other['wait_sum_seconds'])):
+                    for i, n in enumerate(buckets.values()):
+                        histogram.counts[i] += n
+                    histogram.count += sum(buckets.values())
+                    histogram.sum += total
+ 
+    def summary(self):
+        """Human-readable end-of-run table, one line per operation."""
+        snapshot = self.snapshot()
+        if not snapshot['operations']:
+            return "No AWS calls were made"
+        lines = [f"API calls over {snapshot['elapsed_seconds']:.1f}s:",
+                 f"{'operation':<40} {'calls':>7} {'errors':>7} {'throttles':>9} {'retries':>7} "
+                 f"{'p50 ms':>8} {'p99 ms':>8} {'wait p99':>8} {'peak':>5}"]
+        for operation, stats in snapshot['operations'].items():
+            lines.append(
+                f"{operation:<40} {stats['calls']:>7} {sum(stats['errors'].values()):>7} {stats['throttles']:>9} "
+                f"{stats['retries'] + stats['sdk_retries']:>7} {stats['latency_p50_ms'] or 0:>8.1f} "
+                f"{stats['latency_p99_ms'] or 0:>8.1f} {stats['wait_p99_ms'] or 0:>8.1f} {stats['peak_in_flight']:>5}")
+            if stats['errors']:
+                lines.append("    errors: " + ", ".join(f"{code}={n}" for code, n in sorted(stats['errors'].items())))
+        return "\n".join(lines)
+ 
+    def prometheus_text(self, prefix='gluestats'):
+        """Metrics in the Prometheus text exposition format, for the node exporter textfile collector."""
+        lines = []
+        with self.lock:
+            operations = sorted(self.operations.items())
+            for name, kind, help_text in (
+                    ('api_calls_total', 'counter', 'AWS API calls by operation'),
+                    ('api_throttles_total', 'counter', 'Throttled responses from the service'),
+                    ('api_retries_total', 'counter', 'Retries by the rate controller and botocore'),
+                    ('api_in_flight', 'gauge', 'Calls currently in flight'),
+                    ('api_in_flight_peak', 'gauge', 'Most calls in flight at once')):
+                lines += [f"# HELP {prefix}_{name} {help_text}", f"# TYPE {prefix}_{name} {kind}"]
+                for operation, stats in operations:
+                    value = {'api_calls_total': stats.calls, 'api_throttles_total': stats.throttles,
+                             'api_retries_total': stats.retries + stats.sdk_retries,
+                             'api_in_flight': stats.in_flight, 'api_in_flight_peak': stats.peak_in_flight}[name]
+                    lines.append(f'{prefix}_{name}{{operation="{operation}"}} {value}')
+            lines += [f"# HELP {prefix}_api_errors_total Failed AWS API calls by operation and error code",
+                      f"# TYPE {prefix}_api_errors_total counter"]
+            for operation, stats in operations:
+                for code, n in sorted(stats.errors.items()):
+                    lines.append(f'{prefix}_api_errors_total{{operation="{operation}",code="{code}"}} {n}')
+            for name, attribute, help_text in (
+                    ('api_call_duration_seconds', 'latency', 'AWS API call latency'),
+                    ('api_wait_duration_seconds', 'wait', 'Time spent waiting for the rate limiter')):
+                lines += [f"# HELP {prefix}_{name} {help_text}", f"# TYPE {prefix}_{name} histogram"]
+                for operation, stats in operations:
+                    histogram = getattr(stats, attribute)
+                    cumulative = 0
+                    for bound, n in zip(list(histogram.bounds) + ['+Inf'], histogram.counts):
+                        cumulative += n
+                        lines.append(f'{prefix}_{name}_bucket{{operation="{operation}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{prefix}_{name}_sum{{operation="{operation}"}} {histogram.sum:.6f}')
+                    lines.append(f'{prefix}_{name}_count{{operation="{operation}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+ 
+    def write_json(self, path):
+        _write_atomic(path, json.dumps(self.snapshot(), indent=2) + "\n")
+ 
+    def write_prometheus(self, path):
+        _write_atomic(path, self.prometheus_text())
+ 
+ 
+def _write_atomic(path, text):
+    """Write through a temporary file and rename, so a scraper never reads a partial file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.metrics-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+ 
+ 
+_metrics = None
+_metrics_lock = threading.Lock()
+ 
+ 
+def get_metrics():
+    """Return the process-wide Metrics shared by all scripts."""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = Metrics()
+        return _metrics
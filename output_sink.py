@@ -0,0 +1,104 @@
+import atexit
+import os
+import queue
+import threading
+import time
+ 
+ 
+class OutputSink:
+    """
+    Single writer thread for log and result files. Callers on any thread enqueue
+    text; the writer keeps each file open, batches lines and flushes when
+    max_lines are buffered or flush_interval seconds have passed, so lines from
+    concurrent workers are never interleaved mid-line.
+    """
+ 
+    def __init__(self, max_lines=1000, flush_interval=1.0):
+        self.max_lines = max_lines
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.files = {}
+        self.buffers = {}
+        self.buffered = 0
+        self.thread = threading.Thread(target=self._run, name='output-sink', daemon=True)
+        self.thread.start()
+ 
+    def write(self, path, text):
+        self.queue.put((path, text))
+ 
+    def flush(self):
+        """Block until everything written so far is on disk."""
+        done = threading.Event()
+        self.queue.put((None, done))
+        done.wait()
+ 
+    def release(self, directory):
+        """
+        Block until everything written so far is on disk, then close the open
+        files under directory, e.g. once a job that wrote there has finished.
+        """
+        done = threading.Event()
+        self.queue.put((None, (os.path.join(os.path.abspath(directory), ''), done)))
+        done.wait()
+ 
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put((None, None))
+            self.thread.join()
+ 
+    def _flush_buffers(self):
+        for path, lines in self.buffers.items():
+            if not lines:
+                continue
+            try:
+                if path not in self.files:
+                    self.files[path] = open(path, 'a')
+                self.files[path].write(''.join(lines))
+                self.files[path].flush()
+            except IOError as e:
+                print(f"Failed to write to {path}: {e}")
+            lines.clear()
+        self.buffered = 0
+ 
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                path, item = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                path, item = None, False
+            if path is not None:
+                self.buffers.setdefault(path, []).append(item)
+                self.buffered += 1
+            release = item if path is None and isinstance(item, tuple) else None
+            if (item is None or isinstance(item, threading.Event) or release or self.buffered >= self.max_lines
+                    or time.monotonic() - last_flush >= self.flush_interval):
+                self._flush_buffers()
+                last_flush = time.monotonic()
+            if isinstance(item, threading.Event):
+                item.set()
+            elif release:
+                directory, done = release
+                for file_path in [file_path for file_path in self.files if os.path.abspath(file_path).startswith(directory)]:
+                    self.files.pop(file_path).close()
+                    self.buffers.pop(file_path, None)
+                done.set()
+            elif path is None and item is None:
+                for f in self.files.values():
+                    f.close()
+                self.files.clear()
+                return
+ 
+ 
+_sink = None
+_sink_lock = threading.Lock()
+ 
+ 
+def get_sink():
+    """Return the process-wide OutputSink, flushed and closed at interpreter exit."""
+    global _sink
+    with _sink_lock:
+        if _sink is None:
+            _sink = OutputSink()
+            atexit.register(_sink.close)
+        return _sink
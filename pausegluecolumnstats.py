@@ -1,59 +1,237 @@
-import boto3
+import datetime
 import logging
-from time import sleep
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from aws_clients import LazyClient, connection_report
+from catalog_index import open_existing
+from metrics import get_metrics
+from pipeline import bounded_map, distinct, read_rows
+from rate_control import get_controller
  
 # Setup logging
 log_file = 'pausstats.log'
-logging.basicConfig(
-    filename=log_file,
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    filemode='w'
-)
  
-# Initialize Glue client
-glue_client = boto3.client('glue', region_name='us-east-1')
+def setup_logging():
+    logging.basicConfig(
+        filename=log_file,
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        filemode='w',
+        force=True
+    )
  
-# File containing the list of databases and tables
-#input_file = 'all_table_list.txt'
-input_file = "/home/ec2-user/alltablesglue/all_table_list.txt"
+# Initialize Glue client, built on first use
+glue_client = LazyClient('glue')
+controller = get_controller()
+ 
+# File containing the list of databases and tables, written by the crawl into its base path
+base_path = "/home/ec2-user/alltablesg"
+input_file = f"{base_path}/all_table_list.txt"
+ 
+def set_base_path(path):
+    """Read the table list from the crawl's base path."""
+    global base_path, input_file
+    base_path = path
+    input_file = f"{base_path}/all_table_list.txt"
+ 
+# Schedule state of each table before it was paused; resume restarts only the tables it stopped
+state_file = 'pause_state.txt'
+state_header = "DatabaseName,TableName,PriorState,Action"
+catalog_index_path = None  # Crawl's catalog index to update; None uses the one next to input_file
+ 
+def schedule_state(database_name, table_name):
+    """Return the table's column statistics schedule state, or None if it has no task settings."""
+    try:
+        response = controller.call(
+            glue_client.get_column_statistics_task_settings,
+            DatabaseName=database_name,
+            TableName=table_name
+        )
+    except glue_client.exceptions.EntityNotFoundException:
+        return None
+    return response['ColumnStatisticsTaskSettings'].get('Schedule', {}).get('State')
  
 def stop_column_statistics(database_name, table_name):
     """
     Stops the column statistics task schedule for a given database and table.
+    Returns True if the schedule was stopped.
     """
     try:
-        glue_client.stop_column_statistics_task_run_schedule(
+        controller.call(
+            glue_client.stop_column_statistics_task_run_schedule,
             DatabaseName=database_name,
             TableName=table_name
         )
         logging.info(f"Stopped column statistics schedule for {database_name}.{table_name}")
+        return True
     except glue_client.exceptions.EntityNotFoundException:
         logging.warning(f"Column statistics task schedule not found for {database_name}.{table_name}")
     except Exception as e:
         logging.error(f"Error stopping column statistics for {database_name}.{table_name}: {e}")
+    return False
+ 
+def start_column_statistics(database_name, table_name):
+    """
+    Starts the column statistics task schedule for a given database and table.
+    Returns True if the schedule was started.
+    """
+    try:
+        controller.call(
+            glue_client.start_column_statistics_task_run_schedule,
+            DatabaseName=database_name,
+            TableName=table_name
+        )
+        logging.info(f"Started column statistics schedule for {database_name}.{table_name}")
+        return True
+    except glue_client.exceptions.EntityNotFoundException:
+        logging.warning(f"Column statistics task schedule not found for {database_name}.{table_name}")
+    except Exception as e:
+        logging.error(f"Error starting column statistics for {database_name}.{table_name}: {e}")
+    return False
  
-def process_table_list(file_path):
+def pause_table(database_name, table_name, record, recorded_action=None):
     """
-    Reads the database and table list file and stops column statistics schedules.
+    Read a table's schedule state and stop the schedule if it is active.
+    Before the stop call a SCHEDULED,stopping row is written through record,
+    so a pause killed mid-call still leaves the table for resume. A table
+    recorded as stopping by an interrupted pause is stopped again if still
+    scheduled, and otherwise recorded as stopped. A table left stopping, whose
+    stop may or may not have taken effect, stays stopping when its read or
+    stop fails, so the next pause retries it and resume restarts it. Returns
+    the state file row: database, table, prior state and action taken.
     """
     try:
-        with open(file_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line or ',' not in line:
-                    logging.warning(f"Skipping invalid line: {line}")
-                    continue
- 
-                database_name, table_name = line.split(',', 1)
-                stop_column_statistics(database_name.strip(), table_name.strip())
-#                sleep(0.5)  # Throttle requests to avoid API limits
+        state = schedule_state(database_name, table_name)
+    except Exception as e:
+        logging.error(f"Error reading column statistics schedule for {database_name}.{table_name}: {e}")
+        if recorded_action == 'stopping':
+            return database_name, table_name, 'SCHEDULED', 'stopping'
+        return database_name, table_name, 'UNKNOWN', 'error'
+    # Compare exactly: 'SCHEDULED' is also a substring of 'NOT_SCHEDULED'
+    if state != 'SCHEDULED':
+        if recorded_action == 'stopping':
+            return database_name, table_name, 'SCHEDULED', 'stopped'
+        return database_name, table_name, state or 'NONE', 'skipped'
+    if recorded_action != 'stopping':
+        record((database_name, table_name, state, 'stopping'))
+    action = 'stopped' if stop_column_statistics(database_name, table_name) else 'stopping'
+    return database_name, table_name, state, action
+ 
+def read_state(file_path):
+    """Map each table in the state file to its (prior state, action); later rows win."""
+    if not os.path.exists(file_path):
+        return {}
+    rows = read_rows(file_path, 4, on_invalid=lambda line: logging.warning(f"Skipping invalid state line: {line}"),
+                     header=state_header)
+    return {(database_name, table_name): (prior_state, action) for database_name, table_name, prior_state, action in rows}
+ 
+def run_tables(func, tables, max_threads=None):
+    """Call func(database, table, ...) for each item concurrently under the rate limit, yielding the results."""
+    max_threads = max_threads or controller.max_concurrency
+    with ThreadPoolExecutor(max_threads) as executor:
+        for table, result in bounded_map(executor, func, tables, 2 * max_threads,
+                                         on_error=lambda table, e: logging.error(f"Error processing {table[0]}.{table[1]}: {e}")):
+            yield table, result
+ 
+def open_state_writer(file_path):
+    """
+    Open the state file for appending and return (record, file): record(row)
+    writes one row and flushes it at once, whichever thread calls it.
+    """
+    new_file = not os.path.exists(file_path)
+    f = open(file_path, 'a')
+    lock = threading.Lock()
+ 
+    def record(row):
+        with lock:
+            f.write(",".join(row) + "\n")
+            f.flush()
+ 
+    if new_file:
+        with lock:
+            f.write(f"{state_header}\n")
+            f.flush()
+    return record, f
+ 
+def process_table_list(file_path, max_threads=None):
+    """
+    Reads the database and table list file and stops every active column
+    statistics schedule, appending each table's prior state to the state file.
+    Rows are written straight to the file rather than through the buffered
+    sink, so no stopped table is lost if the pause is killed. Tables the state
+    file already shows as stopped are skipped, so an interrupted pause can
+    simply be run again.
+    """
+    recorded = read_state(state_file)
+    record, f = open_state_writer(state_file)
+    rows = read_rows(file_path, 2, on_invalid=lambda line: logging.warning(f"Skipping invalid line: {line}"),
+                     header="DatabaseName,TableName")
+    tables = ((database_name, table_name, record, recorded.get((database_name, table_name), (None, None))[1])
+              for database_name, table_name in distinct(rows)
+              if recorded.get((database_name, table_name), (None, None))[1] != 'stopped')
+    counts = {}
+    index = open_existing(catalog_index_path or file_path)
+    try:
+        for _, row in run_tables(pause_table, tables, max_threads):
+            if row is None:
+                continue
+            record(row)
+            counts[row[3]] = counts.get(row[3], 0) + 1
+            if row[3] == 'stopped' and index:
+                index.forget_stats_state(row[0], row[1])
     except FileNotFoundError:
         logging.error(f"Input file not found: {file_path}")
     except IOError as e:
         logging.error(f"Error reading input file {file_path}: {e}")
+    finally:
+        f.close()
+        if index:
+            index.close()
+    logging.info(f"Pause results: {counts}")
  
-if __name__ == '__main__':
-    logging.info("Starting to process table list")
-    process_table_list(input_file)
+def resume_tables(max_threads=None):
+    """
+    Restart the schedules the state file records as stopped by a pause,
+    including those a killed pause was stopping; any of those still scheduled
+    need no restart. The state file is then archived with a timestamp and
+    replaced by the tables that could not be restarted, so running resume
+    again retries only those.
+    """
+    recorded = read_state(state_file)
+    tables = [table for table, (_, action) in sorted(recorded.items()) if action in ('stopped', 'stopping')]
+ 
+    def resume_table(database_name, table_name):
+        if recorded[(database_name, table_name)][1] == 'stopping' and \
+                schedule_state(database_name, table_name) == 'SCHEDULED':
+            return True
+        return start_column_statistics(database_name, table_name)
+ 
+    logging.info(f"Resuming {len(tables)} of {len(recorded)} recorded tables")
+    failed = [table for table, started in run_tables(resume_table, tables, max_threads) if not started]
+    index = open_existing(catalog_index_path or input_file)
+    if index:
+        for table in set(tables) - set(failed):
+            index.forget_stats_state(*table)
+        index.close()
+    if os.path.exists(state_file):
+        os.replace(state_file, f"{state_file}.{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}")
+    with open(state_file, 'w') as f:
+        f.write(f"{state_header}\n")
+        for database_name, table_name in sorted(failed):
+            f.write(f"{database_name},{table_name},{recorded[(database_name, table_name)][0]},stopped\n")
+    logging.info(f"Resumed {len(tables) - len(failed)} schedules; {len(failed)} failed and remain in {state_file}")
+ 
+def main(action='pause'):
+    logging.info(f"Starting to {action} column statistics schedules")
+    if action == 'resume':
+        resume_tables()
+    else:
+        process_table_list(input_file)
+    logging.info(connection_report())
+    logging.info(get_metrics().summary())
     logging.info("Processing complete")
+ 
+if __name__ == '__main__':
+    setup_logging()
+    main()
@@ -0,0 +1,149 @@
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+ 
+from inventory import inventory_fields, inventory_format, read_inventory
+ 
+ 
+def bounded_map(executor, func, items, window, on_error=None):
+    """
+    Call func(*item) on the executor for each item with at most `window` calls in
+    flight, yielding (item, result) pairs as they complete. Items are pulled from
+    the iterable only when a slot frees up, so a slow call holds just its own
+    slot instead of stalling a whole batch. If on_error is given, an exception
+    raised by a call is passed to on_error(item, exc) and the item yields None.
+    """
+    items = iter(items)
+    in_flight = {}
+    exhausted = False
+    while True:
+        while not exhausted and len(in_flight) < window:
+            try:
+                item = next(items)
+            except StopIteration:
+                exhausted = True
+                break
+            in_flight[executor.submit(func, *item)] = item
+        if not in_flight:
+            return
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            item = in_flight.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                if on_error is None:
+                    raise
+                on_error(item, e)
+                result = None
+            yield item, result
+ 
+ 
+def read_rows(file_path, field_count, on_invalid=None, header=None):
+    """
+    Stream comma-separated rows from a file as tuples of field_count non-empty
+    fields. Blank lines and a line equal to header are skipped; malformed lines are passed to
+    on_invalid(line) and skipped. Compact and Parquet inventory files (see
+    inventory) are read the same way.
+    """
+    if inventory_format(file_path):
+        fields, _ = inventory_fields(file_path)
+        if len(fields) != field_count:
+            raise ValueError(f"{file_path} has {len(fields)} fields, expected {field_count}")
+        yield from read_inventory(file_path)
+        return
+    with open(file_path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line or (header and line == header):
+                continue
+            fields = tuple(line.split(","))
+            if len(fields) != field_count or not all(fields):
+                if on_invalid:
+                    on_invalid(line)
+                continue
+            yield fields
+ 
+ 
+def distinct(rows):
+    """Yield each row once. Only distinct rows are remembered, not every input line."""
+    seen = set()
+    previous = None
+    for row in rows:
+        # Inputs are usually grouped, so most repeats are caught without a set lookup
+        if row == previous or row in seen:
+            continue
+        seen.add(row)
+        previous = row
+        yield row
+ 
+ 
+class FairScheduler:
+    """
+    Fixed pool of worker threads shared by all work in a run. Tasks are queued
+    per key (for example a database) and workers take them round-robin across
+    keys, so one key with a huge backlog cannot starve the others and no worker
+    sits idle while any key has work. Tasks may submit further tasks.
+    """
+ 
+    def __init__(self, workers, on_error=None):
+        self.on_error = on_error
+        self.queues = {}
+        self.rotation = deque()
+        self.pending = 0
+        self.closed = False
+        lock = threading.Lock()
+        self.condition = threading.Condition(lock)  # Workers wait here for tasks
+        self.finished = threading.Condition(lock)  # join waits here, so a task wakeup always reaches a worker
+        self.threads = [threading.Thread(target=self._work, name=f'scheduler-{i}', daemon=True) for i in range(workers)]
+        for thread in self.threads:
+            thread.start()
+ 
+    def submit(self, key, func, *args):
+        with self.condition:
+            if key not in self.queues:
+                self.queues[key] = deque()
+            if not self.queues[key]:
+                self.rotation.append(key)
+            self.queues[key].append((func, args))
+            self.pending += 1
+            self.condition.notify()
+ 
+    def _next_task(self):
+        key = self.rotation.popleft()
+        queue = self.queues[key]
+        task = queue.popleft()
+        if queue:
+            self.rotation.append(key)
+        else:
+            del self.queues[key]
+        return task
+ 
+    def _work(self):
+        while True:
+            with self.condition:
+                while not self.rotation and not self.closed:
+                    self.condition.wait()
+                if not self.rotation:
+                    return
+                func, args = self._next_task()
+            try:
+                func(*args)
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(args, e)
+            finally:
+                with self.condition:
+                    self.pending -= 1
+                    if not self.pending:
+                        self.finished.notify_all()
+ 
+    def join(self):
+        """Wait until every submitted task, including tasks they submitted, has finished."""
+        with self.condition:
+            while self.pending:
+                self.finished.wait()
+            self.closed = True
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
@@ -0,0 +1,270 @@
+import logging
+import random
+import threading
+import time
+from functools import wraps
+ 
+from metrics import get_metrics
+ 
+# Error codes Glue and Lake Formation return when a caller is being rate limited
+THROTTLE_CODES = {
+    'ThrottlingException',
+    'Throttling',
+    'TooManyRequestsException',
+    'RequestLimitExceeded',
+}
+ 
+# Transient server-side errors and conflicting updates that are safe to retry after a backoff
+RETRYABLE_CODES = {
+    'ConcurrentModificationException',
+    'InternalServiceException',
+    'ServiceUnavailableException',
+    'OperationTimeoutException',
+}
+ 
+# Starting requests per second (rate, burst) for each API; anything not listed uses 'default'
+DEFAULT_RATES = {
+    'default': (20, 40),
+    'get_databases': (10, 20),
+    'get_tables': (10, 20),
+    'get_table': (50, 100),
+    'grant_permissions': (10, 20),
+}
+ 
+# Requests per second each API's rate may grow to while no call is throttled
+DEFAULT_MAX_RATE = 200.0
+ 
+ 
+def error_code(exc):
+    """Return the AWS error code carried by a botocore ClientError, or None."""
+    response = getattr(exc, 'response', None)
+    if isinstance(response, dict):
+        return response.get('Error', {}).get('Code')
+    return None
+ 
+ 
+def is_throttle(exc):
+    """Return True if the exception is a throttling error."""
+    return error_code(exc) in THROTTLE_CODES
+ 
+ 
+def backoff_delay(attempt, base_delay=0.5, max_delay=20.0):
+    """Full-jitter exponential backoff delay for the given attempt (0-based)."""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+ 
+ 
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at `rate` tokens per second up to `burst`.
+    Below max_rate the rate adapts: every successful call raises it by
+    `increase`, so while calls use it fully it grows by half of itself each
+    second, and a throttled call halves it. burst keeps its ratio to the rate.
+    """
+ 
+    def __init__(self, rate, burst, max_rate=None, min_rate=1.0, increase=0.5, cooldown=1.0):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.burst_ratio = self.burst / self.rate
+        self.max_rate = max(self.rate, float(max_rate or 0))
+        self.min_rate = min(self.rate, float(min_rate))
+        self.increase = increase
+        self.cooldown = cooldown
+        self.last_decrease = 0.0
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+ 
+    def acquire(self):
+        """Block until a token is available and take it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+ 
+    def _set_rate(self, rate):
+        self.rate = rate
+        self.burst = max(1.0, rate * self.burst_ratio)
+ 
+    def on_success(self):
+        if self.rate >= self.max_rate:
+            return
+        with self.lock:
+            self._set_rate(min(self.max_rate, self.rate + self.increase))
+ 
+    def on_throttle(self, operation='default'):
+        with self.lock:
+            now = time.monotonic()
+            # A burst of throttles from calls already in flight counts as one signal
+            if now - self.last_decrease < self.cooldown:
+                return
+            self.last_decrease = now
+            self._set_rate(max(self.min_rate, self.rate / 2))
+            self.tokens = min(self.tokens, self.burst)
+        logging.warning(f"Throttled; reducing the {operation} rate to {self.rate:.1f}/s")
+ 
+ 
+class AIMDLimiter:
+    """
+    Concurrency limit that grows by one after a full window of successful calls
+    and halves when a call is throttled.
+    """
+ 
+    def __init__(self, initial=5, minimum=1, maximum=50, cooldown=1.0):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.successes = 0
+        self.last_decrease = 0.0
+        self.condition = threading.Condition()
+ 
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= self.limit:
+                self.condition.wait()
+            self.in_flight += 1
+ 
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify()
+ 
+    def on_success(self):
+        with self.condition:
+            self.successes += 1
+            if self.successes >= self.limit and self.limit < self.maximum:
+                self.limit += 1
+                self.successes = 0
+                self.condition.notify()
+ 
+    def on_throttle(self):
+        with self.condition:
+            now = time.monotonic()
+            # A burst of throttles from calls already in flight counts as one signal
+            if now - self.last_decrease < self.cooldown:
+                return
+            self.last_decrease = now
+            self.successes = 0
+            self.limit = max(self.minimum, self.limit // 2)
+            logging.warning(f"Throttled; reducing concurrency limit to {self.limit}")
+ 
+ 
+class RateController:
+    """
+    Shared gate for Glue and Lake Formation calls: per-API token buckets whose
+    rates adapt between their starting rate and max_rate, an AIMD concurrency
+    limit and jittered exponential retry on throttling.
+    """
+ 
+    def __init__(self, rates=None, initial_concurrency=5, max_concurrency=50,
+                 tries=8, base_delay=0.5, max_delay=20.0, max_rate=DEFAULT_MAX_RATE):
+        self.rates = dict(DEFAULT_RATES)
+        self.rates.update(rates or {})
+        self.max_rate = max_rate
+        self.buckets = {}
+        self.buckets_lock = threading.Lock()
+        self.limiter = AIMDLimiter(initial=initial_concurrency, maximum=max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.tries = tries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+ 
+    def configure(self, rates=None, max_rate=None):
+        """Change starting rates ({operation: (rate, burst)}) and the ceiling; buckets are rebuilt on next use."""
+        with self.buckets_lock:
+            self.rates.update(rates or {})
+            if max_rate is not None:
+                self.max_rate = max_rate
+            self.buckets.clear()
+ 
+    def scale_rates(self, factor):
+        """Scale every starting rate and burst, e.g. to split one account's limits across processes."""
+        with self.buckets_lock:
+            self.rates = {op: (rate * factor, max(1, burst * factor)) for op, (rate, burst) in self.rates.items()}
+            self.buckets.clear()
+ 
+    def settings(self):
+        """Starting rates and ceiling, to configure the controller of another process the same way."""
+        with self.buckets_lock:
+            return {'rates': dict(self.rates), 'max_rate': self.max_rate}
+ 
+    def bucket(self, operation):
+        with self.buckets_lock:
+            if operation not in self.buckets:
+                rate, burst = self.rates.get(operation, self.rates['default'])
+                self.buckets[operation] = TokenBucket(rate, burst, self.max_rate)
+            return self.buckets[operation]
+ 
+    def call(self, func, *args, **kwargs):
+        """
+        Call a boto3 client method under the rate limit, retrying throttling and
+        transient errors. Any other exception is raised to the caller unchanged.
+        """
+        operation = getattr(func, '__name__', 'default')
+        bucket = self.bucket(operation)
+        metrics = get_metrics()
+        for attempt in range(self.tries):
+            waited = time.perf_counter()
+            bucket.acquire()
+            self.limiter.acquire()
+            metrics.record_wait(operation, time.perf_counter() - waited)
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                code = error_code(e)
+                if code in THROTTLE_CODES:
+                    self.limiter.on_throttle()
+                    bucket.on_throttle(operation)
+                elif code not in RETRYABLE_CODES:
+                    raise
+                if attempt == self.tries - 1:
+                    logging.error(f"{operation} failed after {self.tries} attempts: {e}")
+                    raise
+                metrics.record_retry(operation)
+                delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+                logging.warning(f"Retry {attempt + 1}/{self.tries} for {operation} in {delay:.2f}s: {code}")
+            else:
+                self.limiter.on_success()
+                bucket.on_success()
+                return result
+            finally:
+                self.limiter.release()
+            time.sleep(delay)
+ 
+ 
+_controller = None
+_controller_lock = threading.Lock()
+ 
+ 
+def get_controller():
+    """Return the process-wide RateController shared by all scripts."""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = RateController()
+        return _controller
+ 
+ 
+def retry(exception_to_check, tries=3, base_delay=0.5, max_delay=20.0):
+    """Retry decorator with jittered exponential backoff that re-raises the last error."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            for attempt in range(tries):
+                try:
+                    return func(*args, **kwargs)
+                except exception_to_check as e:
+                    if attempt == tries - 1:
+                        logging.error(f"Operation {func.__name__} failed after {tries} retries.")
+                        raise
+                    logging.warning(f"Retry {attempt + 1}/{tries} for {func.__name__}: {e}")
+                    time.sleep(backoff_delay(attempt, base_delay, max_delay))
+        return wrapper
+    return decorator
@@ -1,40 +1,54 @@
-import boto3
 import datetime
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from botocore.exceptions import BotoCoreError, ClientError
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import BotoCoreError, ClientError, ParamValidationError
+from aws_clients import LazyClient, connection_report
+from metrics import get_metrics
+from output_sink import get_sink
+from pipeline import bounded_map, read_rows
+from rate_control import get_controller
+from resume_journal import ResumeJournal
  
 # Paths
 base_path = "/home/ec2-user/columnname/"
 source_file_path = "/home/ec2-user/columnname/database_table_columns_list.txt1"
 log_file_path = os.path.join(base_path, "gluestatlogfile.txt")
-processed_file_path = os.path.join(base_path, "processed_columns.txt")  # Tracks completed entries
+processed_file_path = os.path.join(base_path, "processed_columns.txt")  # Plain-text journal of older runs, imported once
+journal_file_path = os.path.join(base_path, "processed_columns.journal")  # Tracks completed entries
+ 
+def set_base_path(path):
+    """Point the log and resume files at path."""
+    global base_path, log_file_path, processed_file_path, journal_file_path
+    base_path = path
+    log_file_path = os.path.join(base_path, "gluestatlogfile.txt")
+    processed_file_path = os.path.join(base_path, "processed_columns.txt")
+    journal_file_path = os.path.join(base_path, "processed_columns.journal")
  
 # Constants
 catalog_id = ""
+max_columns_per_lookup = 100  # get_column_statistics_for_table accepts at most 100 column names
  
-# Boto3 clients
-glue_client = boto3.client("glue")
+# Boto3 clients, built on first use
+glue_client = LazyClient("glue")
+controller = get_controller()
+sink = get_sink()
  
  
 def log(message):
     """Log a message to both the console and the log file."""
-    try:
-        with open(log_file_path, "a") as log_file:
-            log_file.write(f"{datetime.datetime.now()}: {message}\n")
-    except IOError as e:
-        print(f"Failed to write to log file: {e}")
+    sink.write(log_file_path, f"{datetime.datetime.now()}: {message}\n")
     print(message)
  
  
 def delete_column_statistics(database_name, table_name, column_name):
     """Delete column statistics for the given database, table, and column."""
     try:
-        glue_client.delete_column_statistics_for_table(
-            CatalogId=catalog_id,
+        controller.call(
+            glue_client.delete_column_statistics_for_table,
             DatabaseName=database_name,
             TableName=table_name,
-            ColumnName=column_name
+            ColumnName=column_name,
+            **({'CatalogId': catalog_id} if catalog_id else {})
         )
         log(f"Successfully deleted column statistics for {database_name}.{table_name}.{column_name}")
         return f"{database_name},{table_name},{column_name}"
@@ -45,48 +59,97 @@ def delete_column_statistics(database_name, table_name, column_name):
     return None
  
  
-def process_file(file_path, max_threads=10, batch_size=1000):
-    """Process the file and delete column statistics for each entry."""
-    processed_entries = set()
- 
-    # Load already processed entries if checkpointing
-    if os.path.exists(processed_file_path):
-        with open(processed_file_path, "r") as f:
-            processed_entries = set(line.strip() for line in f)
- 
-    with open(file_path, "r") as file:
-        batch = []
+def columns_with_statistics(database_name, table_name, column_names):
+    """
+    Return the subset of column_names that have statistics, looked up in chunks
+    of 100 columns. If the lookup fails, all columns are returned so that the
+    deletes are still attempted, unless the request itself was invalid: the
+    deletes would be rejected the same way, so none are returned.
+    """
+    found = set()
+    try:
+        for i in range(0, len(column_names), max_columns_per_lookup):
+            response = controller.call(
+                glue_client.get_column_statistics_for_table,
+                DatabaseName=database_name,
+                TableName=table_name,
+                ColumnNames=column_names[i:i + max_columns_per_lookup],
+                **({'CatalogId': catalog_id} if catalog_id else {})
+            )
+            found.update(stat['ColumnName'] for stat in response.get('ColumnStatisticsList', []))
+    except glue_client.exceptions.EntityNotFoundException:
+        log(f"Table {database_name}.{table_name} not found. Skipping its columns.")
+        return set()
+    except ParamValidationError as e:
+        log(f"Invalid column statistics lookup for {database_name}.{table_name}: {e}. Skipping its columns.")
+        return set()
+    except (BotoCoreError, ClientError) as e:
+        log(f"Error looking up column statistics for {database_name}.{table_name}: {e}")
+        return set(column_names)
+    return found
+ 
+ 
+def open_journal():
+    """Open the resume journal, importing a plain-text processed_columns.txt on first use."""
+    if not os.path.exists(journal_file_path) and os.path.exists(processed_file_path):
+        journal = ResumeJournal(journal_file_path)
+        journal.import_lines(processed_file_path)
+        journal.close()
+        log(f"Imported {processed_file_path} into {journal_file_path}")
+    return ResumeJournal(journal_file_path)
+ 
+ 
+def read_entries(file_path, journal):
+    """Yield (db, table, column) rows from the column list that are not in the journal."""
+    rows = read_rows(file_path, 3, on_invalid=lambda line: log(f"Skipping invalid line: {line}"),
+                     header="DatabaseName,TableName,ColumnName")
+    for row in rows:
+        if ",".join(row) not in journal:
+            yield row
+ 
+ 
+def table_chunks(entries):
+    """Group consecutive rows of the same table into (db, table, columns) chunks of up to 100 columns."""
+    current, columns = None, []
+    for database_name, table_name, column_name in entries:
+        if (database_name, table_name) != current or len(columns) >= max_columns_per_lookup:
+            if columns:
+                yield current[0], current[1], columns
+            current, columns = (database_name, table_name), []
+        columns.append(column_name)
+    if columns:
+        yield current[0], current[1], columns
+ 
+ 
+def plan_chunk(database_name, table_name, column_names):
+    """Return the columns of a chunk that have statistics."""
+    with_stats = columns_with_statistics(database_name, table_name, column_names)
+    return [column for column in column_names if column in with_stats]
+ 
+ 
+def process_file_streaming(file_path, max_threads=None, window=None, prefilter=True):
+    """
+    Delete column statistics with a sliding window of in-flight calls,
+    recording completed entries in the compact resume journal.
+    """
+    max_threads = max_threads or controller.max_concurrency
+    window = window or 2 * max_threads
+    journal = open_journal()
+    try:
         with ThreadPoolExecutor(max_threads) as executor:
-            for line in file:
-                if line.strip() in processed_entries:
-                    continue  # Skip already processed entries
- 
-                try:
-                    database_name, table_name, column_name = line.strip().split(",")
-                    batch.append((database_name, table_name, column_name))
-                except ValueError:
-                    log(f"Skipping invalid line: {line.strip()}")
- 
-                # Process batch
-                if len(batch) >= batch_size:
-                    process_batch(batch, executor, processed_entries)
-                    batch.clear()
- 
-            # Process remaining entries in the last batch
-            if batch:
-                process_batch(batch, executor, processed_entries)
- 
- 
-def process_batch(batch, executor, processed_entries):
-    """Process a batch of entries."""
-    futures = [executor.submit(delete_column_statistics, db, table, column) for db, table, column in batch]
-    for future in as_completed(futures):
-        result = future.result()
-        if result:
-            processed_entries.add(result)
-            # Append successfully processed entry to file
-            with open(processed_file_path, "a") as processed_file:
-                processed_file.write(f"{result}\n")
+            entries = read_entries(file_path, journal)
+            if prefilter:
+                entries = (
+                    (db, table, column)
+                    for (db, table, _), columns in bounded_map(executor, plan_chunk, table_chunks(entries), window)
+                    for column in columns
+                )
+            for _, result in bounded_map(executor, delete_column_statistics, entries, window):
+                if result:
+                    journal.add(result)
+    finally:
+        journal.close()
+        sink.flush()
  
  
 def main():
@@ -106,8 +169,10 @@ def main():
         log(f"Error: File {source_file_path} not found!")
         return
  
-    process_file(source_file_path, max_threads=10, batch_size=1000)  # Adjust max_threads and batch_size
+    process_file_streaming(source_file_path)
  
+    log(connection_report())
+    log(get_metrics().summary())
     log(f"Process completed at {datetime.datetime.now()}")
  
  
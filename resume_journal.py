@@ -0,0 +1,118 @@
+import hashlib
+import heapq
+import mmap
+import os
+import struct
+import sys
+from array import array
+ 
+KEY_SIZE = 8
+ 
+ 
+def journal_key(entry):
+    """64-bit hash of a journal entry such as "db,table,column"."""
+    return int.from_bytes(hashlib.blake2b(entry.encode(), digest_size=KEY_SIZE).digest(), 'little')
+ 
+ 
+def _read_keys(path):
+    """
+    Keys of a tail file. A run killed mid-write can leave a partial key at the
+    end; it is dropped, since its entry was never recorded as complete.
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, 'rb') as f:
+        data = f.read()
+    return [key for (key,) in struct.iter_unpack('<Q', data[:len(data) - len(data) % KEY_SIZE])]
+ 
+ 
+def _little_endian(keys):
+    """Bytes of an array('Q') in the journal's little-endian order, whatever the machine's."""
+    if sys.byteorder == 'big':
+        keys = array('Q', keys)
+        keys.byteswap()
+    return keys.tobytes()
+ 
+ 
+class ResumeJournal:
+    """
+    Append-only record of completed entries stored as 64-bit hashes. Completed
+    keys are kept in a sorted file that is memory-mapped and binary searched, so
+    resume checks cost no Python objects per entry. New keys go to a tail file
+    that is merged into the sorted file on close, or on the next open if the
+    previous run did not exit cleanly.
+    """
+ 
+    def __init__(self, path):
+        self.path = path
+        self.tail_path = f"{path}.tail"
+        self._compact()
+        self.size = os.path.getsize(path) if os.path.exists(path) else 0
+        self.file = open(path, 'rb') if self.size else None
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self.count = self.size // KEY_SIZE
+        self.tail = open(self.tail_path, 'ab')
+ 
+    def _compact(self):
+        tail = _read_keys(self.tail_path)
+        if not tail:
+            return
+        tail = sorted(tail)
+        merged_path = f"{self.path}.merge"
+        with open(merged_path, 'wb') as out:
+            main = open(self.path, 'rb') if os.path.exists(self.path) and os.path.getsize(self.path) else None
+            try:
+                existing = ()
+                if main:
+                    main_map = mmap.mmap(main.fileno(), 0, access=mmap.ACCESS_READ)
+                    existing = (key for (key,) in struct.iter_unpack('<Q', main_map))
+                buffer = array('Q')
+                previous = None
+                for key in heapq.merge(existing, tail):
+                    if key != previous:
+                        buffer.append(key)
+                        previous = key
+                    if len(buffer) >= 65536:
+                        out.write(_little_endian(buffer))
+                        del buffer[:]
+                out.write(_little_endian(buffer))
+                if main:
+                    main_map.close()
+            finally:
+                if main:
+                    main.close()
+        os.replace(merged_path, self.path)
+        os.remove(self.tail_path)
+ 
+    def __contains__(self, entry):
+        if not self.count:
+            return False
+        key = journal_key(entry)
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            value = struct.unpack_from('<Q', self.map, mid * KEY_SIZE)[0]
+            if value < key:
+                low = mid + 1
+            elif value > key:
+                high = mid
+            else:
+                return True
+        return False
+ 
+    def add(self, entry):
+        self.tail.write(struct.pack('<Q', journal_key(entry)))
+ 
+    def import_lines(self, path):
+        """Add every line of a plain-text journal, such as a processed_columns.txt file."""
+        with open(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    self.add(line.strip())
+ 
+    def close(self):
+        self.tail.close()
+        if self.map:
+            self.map.close()
+            self.file.close()
+        self._compact()
@@ -0,0 +1,128 @@
+import logging
+import time
+from collections import deque
+ 
+from pipeline import bounded_map
+from rate_control import error_code
+ 
+ACTIVE_STATES = ('STARTING', 'RUNNING')
+TERMINAL_STATES = ('SUCCEEDED', 'FAILED', 'STOPPED')
+ 
+# Glue refuses a start with this code when the account is at its concurrent run limit
+LIMIT_CODES = {'ResourceNumberLimitExceededException'}
+ 
+ 
+class RunScheduler:
+    """
+    Runs on-demand column statistics tasks for a list of tables, keeping at most
+    concurrency runs in progress. One loop polls every in-progress run each
+    poll_interval, the calls for a round fanned out over the executor, and
+    starts the next tables as soon as a round finds runs finished. Each change
+    of a table's run is passed to on_update(database, table, run_id, status,
+    message), so the caller can persist progress.
+    """
+ 
+    def __init__(self, client, controller, executor, concurrency=10, role=None, catalog_id=None,
+                 poll_interval=30.0, window=None, on_update=None):
+        self.client = client
+        self.controller = controller
+        self.executor = executor
+        self.concurrency = concurrency
+        self.role = role
+        self.catalog_id = catalog_id
+        self.poll_interval = poll_interval
+        self.window = window or 2 * concurrency
+        self.on_update = on_update or (lambda *args: None)
+        self.counts = {}
+ 
+    def _update(self, table, run_id, status, message=''):
+        if status in TERMINAL_STATES or status == 'error':
+            self.counts[status] = self.counts.get(status, 0) + 1
+        self.on_update(table[0], table[1], run_id, status, message)
+ 
+    def active_run(self, database_name, table_name):
+        """Id of the table's run in progress, or None."""
+        response = self.controller.call(self.client.get_column_statistics_task_runs,
+                                        DatabaseName=database_name, TableName=table_name)
+        for run in response.get('ColumnStatisticsTaskRuns', []):
+            if run.get('Status') in ACTIVE_STATES:
+                return run['ColumnStatisticsTaskRunId']
+        return None
+ 
+    def start(self, database_name, table_name):
+        """
+        Start a run for the table and return its id. A run already in progress
+        is adopted instead; returns None if Glue is at its concurrent run limit.
+        """
+        kwargs = {'DatabaseName': database_name, 'TableName': table_name}
+        if self.role:
+            kwargs['Role'] = self.role
+        if self.catalog_id:
+            kwargs['CatalogID'] = self.catalog_id
+        try:
+            return self.controller.call(self.client.start_column_statistics_task_run, **kwargs)['ColumnStatisticsTaskRunId']
+        except Exception as e:
+            code = error_code(e)
+            if code in LIMIT_CODES:
+                return None
+            if code == 'ColumnStatisticsTaskRunningException':
+                run_id = self.active_run(database_name, table_name)
+                if run_id:
+                    return run_id
+            raise
+ 
+    def status(self, run_id):
+        response = self.controller.call(self.client.get_column_statistics_task_run, ColumnStatisticsTaskRunId=run_id)
+        return response['ColumnStatisticsTaskRun']
+ 
+    def _start_round(self, pending, running):
+        """Start tables from pending into the free slots; returns False if Glue refused any for its run limit."""
+        starts = [pending.popleft() for _ in range(min(self.concurrency - len(running), len(pending)))]
+        failed = set()
+        refused = set()
+ 
+        def on_error(table, e):
+            failed.add(table)
+            self._update(table, '', 'error', str(e))
+ 
+        for table, run_id in bounded_map(self.executor, self.start, starts, self.window, on_error):
+            if run_id is not None:
+                running[run_id] = table
+                self._update(table, run_id, 'STARTING')
+            elif table not in failed:
+                refused.add(table)
+        # Refused tables go back to the front of the queue in their original order
+        pending.extendleft(reversed([table for table in starts if table in refused]))
+        return not refused
+ 
+    def _poll_round(self, running):
+        """Poll every run in progress and drop the finished ones from running."""
+        def on_error(item, e):
+            logging.warning(f"Failed to poll column statistics run {item[0]}: {e}")
+ 
+        for (run_id,), run in bounded_map(self.executor, self.status, [(run_id,) for run_id in running],
+                                          self.window, on_error):
+            if run is None:
+                continue
+            status = run.get('Status')
+            if status in TERMINAL_STATES:
+                self._update(running.pop(run_id), run_id, status, run.get('ErrorMessage', ''))
+ 
+    def run(self, tables, running=None):
+        """
+        Run statistics for every (database, table) in tables. running maps the
+        ids of runs already in progress, e.g. from an interrupted scheduler, to
+        their tables; they hold slots until they finish. Returns the count of
+        tables per final status.
+        """
+        pending = deque(tables)
+        running = dict(running or {})
+        while pending or running:
+            if pending and len(running) < self.concurrency and not self._start_round(pending, running):
+                logging.info(f"Glue is at its concurrent run limit; waiting with {len(running)} runs in progress")
+            if not running and not pending:
+                break
+            time.sleep(self.poll_interval)
+            self._poll_round(running)
+            logging.info(f"{len(running)} runs in progress, {len(pending)} tables waiting, finished: {self.counts}")
+        return dict(self.counts)
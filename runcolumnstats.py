@@ -0,0 +1,92 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from aws_clients import LazyClient, connection_report
+from metrics import get_metrics
+from output_sink import get_sink
+from pipeline import distinct, read_rows
+from rate_control import get_controller
+from run_scheduler import ACTIVE_STATES, RunScheduler
+ 
+# Setup logging
+log_file = 'statsruns.log'
+ 
+def setup_logging():
+    logging.basicConfig(
+        filename=log_file,
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        filemode='w',
+        force=True
+    )
+ 
+# Initialize Glue client, built on first use
+glue_client = LazyClient('glue')
+controller = get_controller()
+sink = get_sink()
+ 
+# Tables to refresh, e.g. the missing_glue_stats.txt written by crawl
+input_file = "/home/ec2-user/alltablesg/missing_glue_stats.txt"
+ 
+# Every run started and finished, so a restarted scheduler continues where it stopped
+state_file = 'stats_runs_state.txt'
+state_header = "DatabaseName,TableName,RunId,Status"
+ 
+role_arn = "arn:aws:iam::"
+catalog_id = ""
+concurrency = 10  # Column statistics task runs kept in progress
+poll_interval = 30.0  # Seconds between polls of the runs in progress
+ 
+def read_state(file_path):
+    """Map each table in the state file to its latest (run id, status)."""
+    if not os.path.exists(file_path):
+        return {}
+    rows = read_rows(file_path, 4, on_invalid=lambda line: logging.warning(f"Skipping invalid state line: {line}"),
+                     header=state_header)
+    return {(database_name, table_name): (run_id, status) for database_name, table_name, run_id, status in rows}
+ 
+def record(database_name, table_name, run_id, status, message=''):
+    """Append a run's new status to the state file."""
+    sink.write(state_file, f"{database_name},{table_name},{run_id},{status}\n")
+    if status in ('FAILED', 'error'):
+        logging.error(f"Column statistics run for {database_name}.{table_name} {status}: {message}")
+    else:
+        logging.info(f"Column statistics run {run_id} for {database_name}.{table_name}: {status}")
+ 
+def run_table_list(file_path):
+    """
+    Run column statistics for every table in the list, keeping concurrency
+    runs in progress. Tables the state file shows as succeeded are skipped and
+    runs it shows in progress are polled again rather than restarted, so an
+    interrupted scheduler can simply be run again; failed tables are retried.
+    """
+    recorded = read_state(state_file)
+    if not os.path.exists(state_file):
+        sink.write(state_file, f"{state_header}\n")
+    running = {run_id: table for table, (run_id, status) in recorded.items() if status in ACTIVE_STATES}
+    try:
+        rows = read_rows(file_path, 2, on_invalid=lambda line: logging.warning(f"Skipping invalid line: {line}"),
+                         header="DatabaseName,TableName")
+        tables = [table for table in distinct(rows)
+                  if recorded.get(table, (None, None))[1] not in ('SUCCEEDED',) + ACTIVE_STATES]
+    except FileNotFoundError:
+        logging.error(f"Input file not found: {file_path}")
+        return
+    logging.info(f"Running column statistics for {len(tables)} tables; resuming {len(running)} runs in progress")
+    with ThreadPoolExecutor(controller.max_concurrency) as executor:
+        scheduler = RunScheduler(glue_client, controller, executor, concurrency, role_arn, catalog_id,
+                                 poll_interval, on_update=record)
+        counts = scheduler.run(tables, running)
+    sink.flush()
+    logging.info(f"Run results: {counts}")
+ 
+def main():
+    logging.info("Starting column statistics runs")
+    run_table_list(input_file)
+    logging.info(connection_report())
+    logging.info(get_metrics().summary())
+    logging.info("Processing complete")
+ 
+if __name__ == '__main__':
+    setup_logging()
+    main()
@@ -0,0 +1,147 @@
+import hashlib
+import logging
+import math
+ 
+# Days of the month column statistics tasks are scheduled on
+DEFAULT_DAYS = range(5, 26)
+ 
+ 
+def table_size(table):
+    """Data size in bytes of a Glue Table from its sizeKey, totalSize or recordCount parameters; 0 if unknown."""
+    parameters = table.get('Parameters') or {}
+    try:
+        if 'sizeKey' in parameters:
+            return float(parameters['sizeKey'])
+        if 'totalSize' in parameters:
+            return float(parameters['totalSize'])
+        if 'recordCount' in parameters:
+            return float(parameters['recordCount']) * float(parameters.get('averageRecordSize', 100))
+    except ValueError:
+        pass
+    return 0.0
+ 
+ 
+def table_cost(table, columns=None):
+    """
+    Expected relative cost of a stats run for a Glue Table: its column count,
+    or the number of columns the run will cover, scaled up gently by the data
+    size when the table parameters give a hint.
+    """
+    if columns is None:
+        descriptor = table.get('StorageDescriptor') or {}
+        columns = len(descriptor.get('Columns') or []) + len(table.get('PartitionKeys') or [])
+    return max(1, columns) * (1 + math.log2(1 + table_size(table) / 2 ** 30))
+ 
+ 
+MONTHS = ('JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC')
+WEEKDAYS = ('SUN', 'MON', 'TUE', 'WED', 'THU', 'FRI', 'SAT')
+ 
+ 
+def _expand(field, low, high, names=()):
+    """Values matched by one cron field, e.g. '5', '0,30', '10-20', '*/15', '5/10' or 'MON-FRI'."""
+    field = field.upper()
+    for i, name in enumerate(names):
+        field = field.replace(name, str(low + i))
+    values = set()
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/')
+            step = int(step)
+        if part in ('*', '?'):
+            start, end = low, high
+        elif '-' in part:
+            start, end = (int(value) for value in part.split('-'))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        values.update(range(start, end + 1, step))
+    return values
+ 
+ 
+def parse_schedule(expression):
+    """
+    Split a Glue cron(...) expression into (minutes, hours, days, weight): the
+    sets of minutes, hours and days of the month it runs on, and the share of
+    months and weekdays it applies to. Returns None for expressions it cannot
+    read, such as the L, W and # forms.
+    """
+    try:
+        fields = expression.strip()[len('cron('):-1].split()
+        minute, hour, day, month, weekday = fields[:5]
+        weight = len(_expand(month, 1, 12, MONTHS)) / 12 * len(_expand(weekday, 1, 7, WEEKDAYS)) / 7
+        return _expand(minute, 0, 59), _expand(hour, 0, 23), _expand(day, 1, 31), weight
+    except (ValueError, IndexError):
+        return None
+ 
+ 
+class SchedulePlanner:
+    """
+    Spreads stats runs over slots of slot_minutes on the given days of the month.
+    Existing schedules are loaded first; new tables are then placed largest
+    first, each in one of a few candidate slots derived from a hash of its name. The candidates depend only on the table, so a rerun with the
+    same catalog and schedules produces the same plan, and adding tables moves
+    few of the others.
+    """
+ 
+    def __init__(self, days=DEFAULT_DAYS, slot_minutes=15, probes=8):
+        self.days = list(days)
+        self.slot_minutes = slot_minutes
+        self.slots_per_day = 24 * 60 // slot_minutes
+        self.probes = probes
+        self.load = [0.0] * (len(self.days) * self.slots_per_day)
+ 
+    def _slot(self, day, hour, minute):
+        return self.days.index(day) * self.slots_per_day + (hour * 60 + minute) // self.slot_minutes
+ 
+    def add_existing(self, expression, cost=1.0):
+        """Count an existing schedule's load; returns False if the expression could not be read."""
+        parsed = parse_schedule(expression)
+        if parsed is None:
+            logging.warning(f"Ignoring unreadable schedule: {expression}")
+            return False
+        minutes, hours, days, weight = parsed
+        runs = [(day, hour, minute) for day in days if day in self.days for hour in hours for minute in minutes]
+        for day, hour, minute in runs:
+            self.load[self._slot(day, hour, minute)] += cost * weight
+        return True
+ 
+    def _candidates(self, database_name, table_name):
+        for probe in range(self.probes):
+            digest = hashlib.blake2b(f"{database_name}.{table_name}#{probe}".encode(), digest_size=8).digest()
+            yield int.from_bytes(digest, 'big')
+ 
+    def assign(self, database_name, table_name, cost=1.0, capacity=None):
+        """
+        Book a slot for a table and return its cron expression: the first
+        candidate with room for cost under capacity, else the least loaded.
+        """
+        hashes = list(self._candidates(database_name, table_name))
+        candidates = [hash_ % len(self.load) for hash_ in hashes]
+        fits = [slot for slot in candidates if capacity is not None and self.load[slot] + cost <= capacity]
+        slot = fits[0] if fits else min(candidates, key=lambda s: self.load[s])
+        self.load[slot] += cost
+        day = self.days[slot // self.slots_per_day]
+        start = (slot % self.slots_per_day) * self.slot_minutes + hashes[0] % self.slot_minutes
+        return f"cron({start % 60} {start // 60} {day} * ? *)"
+ 
+    def plan(self, tables, slack=0.25):
+        """
+        Assign schedules for (database, table, cost) tuples; returns {(database, table): cron}.
+        Slots are filled up to slack above the mean load, so a table keeps its
+        first fitting candidate unless that slot is already full.
+        """
+        tables = sorted(tables, key=lambda t: (-t[2], t[0], t[1]))
+        if not tables:
+            return {}
+        mean = (sum(self.load) + sum(cost for _, _, cost in tables)) / len(self.load)
+        capacity = max(tables[0][2], mean * (1 + slack))
+        schedules = {}
+        for database_name, table_name, cost in tables:
+            schedules[(database_name, table_name)] = self.assign(database_name, table_name, cost, capacity)
+        return schedules
+ 
+    def peak_ratio(self):
+        """Busiest slot's load relative to the mean, 1.0 being perfectly even."""
+        total = sum(self.load)
+        return max(self.load) * len(self.load) / total if total else 0.0
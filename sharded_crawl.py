@@ -0,0 +1,56 @@
+import heapq
+import logging
+import multiprocessing
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+ 
+ 
+def shard_of(database_name, shards):
+    """Stable shard number for a database, the same across runs and processes."""
+    return zlib.crc32(database_name.encode()) % shards
+ 
+ 
+def shard_path(path, shard):
+    return f"{path}.shard{shard}"
+ 
+ 
+def run_shards(worker, databases, shards, *args):
+    """
+    Hash-shard databases and run worker(shard, shard_databases, *args) for each
+    shard in its own process, returning the workers' results. Workers are
+    spawned rather than forked so they do not inherit the parent's writer and
+    scheduler threads.
+    """
+    groups = [[] for _ in range(shards)]
+    for database_name in databases:
+        groups[shard_of(database_name, shards)].append(database_name)
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(shards, mp_context=context) as pool:
+        futures = [pool.submit(worker, shard, group, *args) for shard, group in enumerate(groups) if group]
+        results = [future.result() for future in futures]
+    logging.info(f"Crawled {len(databases)} databases in {shards} shards")
+    return results
+ 
+ 
+def merge_shards(path, shards, header=None, sort=False):
+    """
+    Append the shard files of path to path and remove them. Lines equal to
+    header are dropped. With sort=True the shard files must be sorted and are
+    merged into one sorted sequence, ordered like the single-process output.
+    """
+    parts = [shard_path(path, shard) for shard in range(shards) if os.path.exists(shard_path(path, shard))]
+    files = [open(part, 'r') for part in parts]
+    try:
+        streams = [(line for line in f if line.rstrip('\n') != header) for f in files]
+        if sort:
+            lines = heapq.merge(*streams, key=lambda line: line.rstrip('\n').split(','))
+        else:
+            lines = (line for stream in streams for line in stream)
+        with open(path, 'a') as out:
+            out.writelines(lines)
+    finally:
+        for f in files:
+            f.close()
+    for part in parts:
+        os.remove(part)
@@ -0,0 +1,101 @@
+"""
+Rules choosing which columns a column statistics task covers and what share
+of the table it samples.
+ 
+A policy file is JSON with an ordered list of rules; the first rule whose
+match fields all hold applies to a table, and a table no rule matches gets the
+full default (every column, no sampling):
+ 
+    {"rules": [
+        {"database": "raw_*", "min_size_gb": 500, "sample_percent": 5,
+         "exclude_types": ["array<*", "map<*", "struct<*"], "max_columns": 50},
+        {"table": "*_audit", "skip": true},
+        {"include_columns": ["id", "*_date"], "sample_percent": 20}
+    ]}
+ 
+Match fields: database, table (glob patterns), min_size_gb, max_size_gb,
+min_columns. Selection fields: include_columns, exclude_columns,
+include_types, exclude_types (glob patterns on names and Glue types),
+max_columns, sample_percent, and skip to leave the table without a task.
+"""
+import json
+from fnmatch import fnmatchcase
+ 
+from schedule_planner import table_size
+ 
+MATCH_FIELDS = {'database', 'table', 'min_size_gb', 'max_size_gb', 'min_columns'}
+SELECT_FIELDS = {'include_columns', 'exclude_columns', 'include_types', 'exclude_types',
+                 'max_columns', 'sample_percent', 'skip'}
+ 
+ 
+def table_columns(table):
+    """(name, type) of every column of a Glue Table, partition keys last."""
+    descriptor = table.get('StorageDescriptor') or {}
+    return [(column['Name'], column.get('Type', '').lower())
+            for column in (descriptor.get('Columns') or []) + (table.get('PartitionKeys') or [])]
+ 
+ 
+def _any_match(value, patterns):
+    return any(fnmatchcase(value, pattern) for pattern in patterns)
+ 
+ 
+class StatsPolicy:
+    """Ordered rules mapping a Glue Table to the settings of its column statistics task."""
+ 
+    def __init__(self, rules=()):
+        self.rules = list(rules)
+        for rule in self.rules:
+            unknown = set(rule) - MATCH_FIELDS - SELECT_FIELDS
+            if unknown:
+                raise ValueError(f"Unknown policy rule fields: {', '.join(sorted(unknown))}")
+ 
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            return cls(json.load(f).get('rules', []))
+ 
+    def rule_for(self, database_name, table):
+        """First rule matching the table, or None."""
+        size_gb = table_size(table) / 2 ** 30
+        column_count = len(table_columns(table))
+        for rule in self.rules:
+            if not fnmatchcase(database_name, rule.get('database', '*')):
+                continue
+            if not fnmatchcase(table['Name'], rule.get('table', '*')):
+                continue
+            if size_gb < rule.get('min_size_gb', 0):
+                continue
+            if 'max_size_gb' in rule and size_gb > rule['max_size_gb']:
+                continue
+            if column_count < rule.get('min_columns', 0):
+                continue
+            return rule
+        return None
+ 
+    def settings(self, database_name, table):
+        """
+        Keyword arguments for create/update_column_statistics_task_settings:
+        ColumnNameList when only some columns are covered and SampleSize when
+        sampling. Returns {} for the full default and None if the table is skipped.
+        """
+        rule = self.rule_for(database_name, table)
+        if rule is None:
+            return {}
+        if rule.get('skip'):
+            return None
+        columns = table_columns(table)
+        selected = [name for name, type_ in columns
+                    if (not rule.get('include_columns') or _any_match(name, rule['include_columns']))
+                    and not _any_match(name, rule.get('exclude_columns', ()))
+                    and (not rule.get('include_types') or _any_match(type_, rule['include_types']))
+                    and not _any_match(type_, rule.get('exclude_types', ()))]
+        if 'max_columns' in rule:
+            selected = selected[:rule['max_columns']]
+        if not selected:
+            return None
+        settings = {}
+        if len(selected) < len(columns):
+            settings['ColumnNameList'] = selected
+        if rule.get('sample_percent', 100) < 100:
+            settings['SampleSize'] = float(rule['sample_percent'])
+        return settings
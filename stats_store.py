@@ -0,0 +1,177 @@
+import datetime
+import decimal
+import sqlite3
+import time
+ 
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS column_statistics (
+    database_name TEXT,
+    table_name TEXT,
+    column_name TEXT,
+    column_type TEXT,
+    statistics_type TEXT,
+    analyzed_time REAL,
+    number_of_nulls INTEGER,
+    number_of_distinct_values INTEGER,
+    minimum_value,
+    maximum_value,
+    maximum_length INTEGER,
+    average_length REAL,
+    number_of_trues INTEGER,
+    number_of_falses INTEGER,
+    exported_at REAL,
+    PRIMARY KEY (database_name, table_name, column_name)
+);
+CREATE TABLE IF NOT EXISTS exported_tables (
+    database_name TEXT,
+    table_name TEXT,
+    column_count INTEGER,
+    statistics_count INTEGER,
+    last_analyzed_time REAL,
+    latest_column TEXT,
+    exported_at REAL,
+    PRIMARY KEY (database_name, table_name)
+);
+"""
+ 
+COLUMNS = ('database_name', 'table_name', 'column_name', 'column_type', 'statistics_type', 'analyzed_time',
+           'number_of_nulls', 'number_of_distinct_values', 'minimum_value', 'maximum_value', 'maximum_length',
+           'average_length', 'number_of_trues', 'number_of_falses', 'exported_at')
+ 
+# StatisticsData member holding each statistics type's values
+DATA_KEYS = {
+    'BOOLEAN': 'BooleanColumnStatisticsData',
+    'DATE': 'DateColumnStatisticsData',
+    'DECIMAL': 'DecimalColumnStatisticsData',
+    'DOUBLE': 'DoubleColumnStatisticsData',
+    'LONG': 'LongColumnStatisticsData',
+    'STRING': 'StringColumnStatisticsData',
+    'BINARY': 'BinaryColumnStatisticsData',
+}
+ 
+ 
+def _timestamp(value):
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    return float(value) if value is not None else None
+ 
+ 
+def _value(value):
+    """A minimum or maximum in a form SQLite and Parquet store: decimals and dates as text."""
+    if isinstance(value, dict) and 'UnscaledValue' in value:
+        unscaled = int.from_bytes(value['UnscaledValue'], 'big', signed=True)
+        return str(decimal.Decimal(unscaled).scaleb(-value.get('Scale', 0)))
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+ 
+ 
+def statistics_row(database_name, table_name, statistics, exported_at):
+    """Flatten one ColumnStatistics from get_column_statistics_for_table into a column_statistics row."""
+    data = statistics.get('StatisticsData', {})
+    statistics_type = data.get('Type')
+    values = data.get(DATA_KEYS.get(statistics_type, ''), {})
+    return (database_name, table_name, statistics['ColumnName'], statistics.get('ColumnType'), statistics_type,
+            _timestamp(statistics.get('AnalyzedTime')), values.get('NumberOfNulls'),
+            values.get('NumberOfDistinctValues'), _value(values.get('MinimumValue')),
+            _value(values.get('MaximumValue')), values.get('MaximumLength'), values.get('AverageLength'),
+            values.get('NumberOfTrues'), values.get('NumberOfFalses'), exported_at)
+ 
+ 
+class StatisticsStore:
+    """
+    SQLite copy of the column statistics Glue has computed, one row per column,
+    with the newest AnalyzedTime of each exported table so a re-export can skip
+    tables that have not been analyzed since.
+    """
+ 
+    def __init__(self, path, commit_every=1000):
+        self.path = path
+        self.commit_every = commit_every
+        self.pending_writes = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+ 
+    def _written(self, count=1):
+        self.pending_writes += count
+        if self.pending_writes >= self.commit_every:
+            self.conn.commit()
+            self.pending_writes = 0
+ 
+    def exported_tables(self):
+        """{(database, table): (last analyzed time, column with that time)} of every exported table."""
+        rows = self.conn.execute("SELECT database_name, table_name, last_analyzed_time, latest_column FROM exported_tables")
+        return {(database_name, table_name): (analyzed, column) for database_name, table_name, analyzed, column in rows}
+ 
+    def save_table(self, database_name, table_name, column_count, statistics):
+        """
+        Replace a table's statistics with the ColumnStatistics just fetched.
+        Rows whose AnalyzedTime is unchanged are left as they are.
+        """
+        now = time.time()
+        rows = [statistics_row(database_name, table_name, stats, now) for stats in statistics]
+        names = [row[2] for row in rows]
+        self.conn.execute(
+            f"DELETE FROM column_statistics WHERE database_name = ? AND table_name = ? "
+            f"AND column_name NOT IN ({','.join('?' * len(names))})", (database_name, table_name, *names))
+        self.conn.executemany(
+            f"INSERT INTO column_statistics ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))}) "
+            f"ON CONFLICT (database_name, table_name, column_name) DO UPDATE SET "
+            + ', '.join(f"{column} = excluded.{column}" for column in COLUMNS[3:])
+            + " WHERE excluded.analyzed_time IS NOT column_statistics.analyzed_time", rows)
+        latest = max(rows, key=lambda row: row[5] or 0, default=None)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO exported_tables (database_name, table_name, column_count, statistics_count, "
+            "last_analyzed_time, latest_column, exported_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (database_name, table_name, column_count, len(rows), latest[5] if latest else None,
+             latest[2] if latest else None, now))
+        self._written(len(rows) + 1)
+ 
+    def touch_table(self, database_name, table_name):
+        """Record that an unchanged table was checked in this export."""
+        self.conn.execute("UPDATE exported_tables SET exported_at = ? WHERE database_name = ? AND table_name = ?",
+                          (time.time(), database_name, table_name))
+        self._written()
+ 
+    def prune(self, tables):
+        """Forget exported tables that are no longer in the inventory; returns how many were removed."""
+        stale = set(self.exported_tables()) - set(tables)
+        for database_name, table_name in stale:
+            for sql in ("DELETE FROM column_statistics WHERE database_name = ? AND table_name = ?",
+                        "DELETE FROM exported_tables WHERE database_name = ? AND table_name = ?"):
+                self.conn.execute(sql, (database_name, table_name))
+        self._written(len(stale))
+        return len(stale)
+ 
+    def write_parquet(self, path, batch_size=100000):
+        """Write every statistics row to a zstd-compressed Parquet file; requires pyarrow."""
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Writing Parquet statistics files requires pyarrow") from None
+        self.conn.commit()
+        cursor = self.conn.execute(f"SELECT {', '.join(COLUMNS)} FROM column_statistics "
+                                   "ORDER BY database_name, table_name, column_name")
+        schema = pyarrow.schema([
+            (column, pyarrow.float64() if column in ('analyzed_time', 'average_length', 'exported_at')
+             else pyarrow.int64() if column.startswith('number_of') or column == 'maximum_length'
+             else pyarrow.string())
+            for column in COLUMNS])
+        count = 0
+        with pyarrow.parquet.ParquetWriter(path, schema, compression='zstd') as writer:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                arrays = [[row[i] if schema.field(i).type != pyarrow.string() or row[i] is None else str(row[i])
+                           for row in rows] for i in range(len(COLUMNS))]
+                writer.write_table(pyarrow.Table.from_arrays(
+                    [pyarrow.array(values, schema.field(i).type) for i, values in enumerate(arrays)], schema=schema))
+                count += len(rows)
+        return count
+ 
+    def close(self):
+        self.conn.commit()
+        self.conn.close()